@@ -0,0 +1,371 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPTS_DIR.parent
+APP_TIER_DIR = REPO_ROOT / "terraform" / "07_app_tier" / "app"
+WEB_TIER_DIR = REPO_ROOT / "terraform" / "09_compute_web" / "app"
+SHARED_APP_DIR = REPO_ROOT / "terraform" / "shared" / "app"
+
+SUITE = [
+    {"tier": "app", "path": "/customers", "upstream": "sql"},
+    {"tier": "app", "path": "/status", "upstream": "sql"},
+    {"tier": "web", "path": "/customers", "upstream": "stub"},
+    {"tier": "web", "path": "/", "upstream": "stub"},
+    {"tier": "web", "path": "/", "upstream": "app"},
+]
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base_url, process=None, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Service exited early with code {process.returncode} ({base_url}).")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    raise RuntimeError(f"Service at {base_url} did not become ready within {timeout}s.")
+
+
+def start_service(app_dir, env_overrides, log_dir, name):
+    env = dict(os.environ)
+    env.update({key: str(value) for key, value in env_overrides.items()})
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SHARED_APP_DIR), env.get("PYTHONPATH")]))
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_handle = open(log_dir / f"{name}.log", "w", encoding="utf-8")
+    process = subprocess.Popen(
+        [sys.executable, str(app_dir / "app.py")],
+        cwd=str(app_dir),
+        env=env,
+        stdout=log_handle,
+        stderr=subprocess.STDOUT,
+    )
+    return process, log_handle
+
+
+def start_app_tier(args, services):
+    port = free_port()
+    env = {
+        "APP_PORT": port,
+        "SQL_SERVER_FQDN": "bench-sql.local",
+        "SQL_DATABASE_NAME": "bench",
+        "SQL_ADMIN_LOGIN": "bench",
+        "SQL_ADMIN_PASSWORD": "bench",
+        "SQL_DRIVER": "bench_sql",
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(SCRIPTS_DIR), os.environ.get("PYTHONPATH")])),
+        "BENCH_SQL_CONNECT_MS": args.sql_connect_ms,
+        "BENCH_SQL_QUERY_MS": args.sql_query_ms,
+        "BENCH_SQL_FETCH_MS": args.sql_fetch_ms,
+        "BENCH_SQL_JITTER_MS": args.sql_jitter_ms,
+        "BENCH_SQL_ERROR_RATE": args.sql_error_rate,
+        "BENCH_SQL_ROWS": args.sql_rows,
+        "TRACE_EXPORTER": "none",
+        "SNAPSHOT_FILE": "",
+    }
+    process, log_handle = start_service(APP_TIER_DIR, env, Path(args.log_dir), "app-tier")
+    services.append((process, log_handle))
+    base_url = f"http://127.0.0.1:{port}"
+    wait_ready(base_url, process)
+    return base_url
+
+
+def start_stub_app_tier(args, services):
+    latency_s = args.stub_latency_ms / 1000
+    items = [
+        {"id": index + 1, "name": f"Customer {index + 1}", "segment": "Bench", "last_update": "2026-01-20T08:00:00"}
+        for index in range(args.sql_rows)
+    ]
+    payloads = {
+        "/health": (b"ok", "text/plain"),
+        "/status": (json.dumps({"service": "app-tier", "status": "ok", "db_status": "ok", "db_detail": "stub"}).encode(), "application/json"),
+        "/customers": (json.dumps({"source": "sql", "items": items, "detail": "stub"}).encode(), "application/json"),
+    }
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            payload = payloads.get(self.path.split("?", 1)[0])
+            if latency_s and self.path != "/health":
+                time.sleep(latency_s)
+            if payload is None:
+                self.send_error(404)
+                return
+            body, content_type = payload
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    services.append((server, None))
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_web_tier(args, upstream_url, services):
+    port = free_port()
+    env = {"WEB_PORT": port, "APP_TIER_URL": upstream_url, "TRACE_EXPORTER": "none", "SNAPSHOT_FILE": ""}
+    process, log_handle = start_service(WEB_TIER_DIR, env, Path(args.log_dir), "web-tier")
+    services.append((process, log_handle))
+    base_url = f"http://127.0.0.1:{port}"
+    wait_ready(base_url, process)
+    return base_url
+
+
+def stop_services(services):
+    for service, log_handle in reversed(services):
+        if isinstance(service, subprocess.Popen):
+            service.terminate()
+            try:
+                service.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                service.kill()
+        else:
+            service.shutdown()
+            service.server_close()
+        if log_handle is not None:
+            log_handle.close()
+    services.clear()
+
+
+def classify(tier, path, status, body):
+    if status is None or status >= 400:
+        return "error"
+    if tier == "app" and path.startswith("/customers"):
+        return "ok" if json.loads(body).get("source") == "sql" else "fallback"
+    if tier == "app" and path == "/status":
+        return "ok" if json.loads(body).get("db_status") == "ok" else "fallback"
+    if tier == "web" and path == "/":
+        return "ok" if b"Data source: SQL " in body else "fallback"
+    if tier == "web" and path.startswith("/customers"):
+        items = json.loads(body)
+        return "ok" if items and all("last_update" in item for item in items) else "fallback"
+    return "ok"
+
+
+def issue(url, timeout):
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as exc:
+        body = exc.read()
+        status = exc.code
+    except (urllib.error.URLError, OSError):
+        body = b""
+        status = None
+    return start, time.perf_counter(), status, body
+
+
+def run_closed_loop(url, concurrency, duration, timeout, record):
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            start, end, status, body = issue(url, timeout)
+            record(start, end, status, body)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(url, rate, duration, timeout, max_inflight, record):
+    interval = 1.0 / rate
+    origin = time.perf_counter()
+    total = int(duration * rate)
+
+    def send(scheduled):
+        _, end, status, body = issue(url, timeout)
+        record(scheduled, end, status, body)
+
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for index in range(total):
+            scheduled = origin + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, scheduled)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return round(sorted_values[min(rank, len(sorted_values) - 1)], 3)
+
+
+def run_scenario(args, scenario):
+    services = []
+    try:
+        if scenario["tier"] == "app":
+            base_url = start_app_tier(args, services)
+        else:
+            if scenario["upstream"] == "app":
+                upstream_url = start_app_tier(args, services)
+            else:
+                upstream_url = start_stub_app_tier(args, services)
+            base_url = start_web_tier(args, upstream_url, services)
+        url = f"{base_url}{scenario['path']}"
+
+        lock = threading.Lock()
+        samples = []
+        counts = {"ok": 0, "fallback": 0, "error": 0}
+        measuring = {"enabled": False}
+
+        def record(start, end, status, body):
+            try:
+                outcome = classify(scenario["tier"], scenario["path"], status, body)
+            except (ValueError, AttributeError):
+                outcome = "error"
+            with lock:
+                if not measuring["enabled"]:
+                    return
+                samples.append((end - start) * 1000)
+                counts[outcome] += 1
+
+        if args.warmup > 0:
+            run_closed_loop(url, args.concurrency, args.warmup, args.timeout, record)
+        measuring["enabled"] = True
+        started = time.perf_counter()
+        if args.rate:
+            run_open_loop(url, args.rate, args.duration, args.timeout, args.max_inflight, record)
+        else:
+            run_closed_loop(url, args.concurrency, args.duration, args.timeout, record)
+        elapsed = time.perf_counter() - started
+        measuring["enabled"] = False
+    finally:
+        stop_services(services)
+
+    latencies = sorted(samples)
+    requests = len(latencies)
+    return {
+        "name": f"{scenario['tier']}:{scenario['path']}:{scenario['upstream']}:{'open' if args.rate else 'closed'}",
+        "tier": scenario["tier"],
+        "path": scenario["path"],
+        "upstream": scenario["upstream"],
+        "mode": "open" if args.rate else "closed",
+        "concurrency": None if args.rate else args.concurrency,
+        "rate": args.rate,
+        "duration_s": round(elapsed, 3),
+        "requests": requests,
+        "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / requests, 3) if requests else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+        "errors": counts["error"],
+        "error_rate": round(counts["error"] / requests, 4) if requests else 0.0,
+        "fallbacks": counts["fallback"],
+        "fallback_rate": round(counts["fallback"] / requests, 4) if requests else 0.0,
+    }
+
+
+def compare(results, baseline, max_regression_pct):
+    previous = {item["name"]: item for item in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before:
+            print(f"{result['name']}: no baseline")
+            continue
+        rps_delta = (result["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        p99_now, p99_before = result["latency_ms"]["p99"], before["latency_ms"]["p99"]
+        p99_delta = (p99_now - p99_before) / p99_before * 100 if p99_now and p99_before else 0.0
+        print(f"{result['name']}: rps {rps_delta:+.1f}%, p99 {p99_delta:+.1f}%")
+        if max_regression_pct is not None and (rps_delta < -max_regression_pct or p99_delta > max_regression_pct):
+            regressions.append(result["name"])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the app-tier and web-tier services locally with fake upstreams.")
+    parser.add_argument("--tier", choices=["app", "web", "all"], default="all", help="Tier to benchmark (all runs the standard suite)")
+    parser.add_argument("--path", default="/customers", help="Request path for a single-tier run")
+    parser.add_argument("--upstream", choices=["stub", "app"], default="stub", help="Web tier upstream: stub app tier or the real app tier")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop concurrent clients")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/second (overrides --concurrency)")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Open-loop cap on in-flight requests")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured warm-up seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sql-connect-ms", type=float, default=15.0, help="Injected SQL connect latency")
+    parser.add_argument("--sql-query-ms", type=float, default=5.0, help="Injected SQL execute latency")
+    parser.add_argument("--sql-fetch-ms", type=float, default=1.0, help="Injected SQL fetch latency")
+    parser.add_argument("--sql-jitter-ms", type=float, default=0.0, help="Random extra latency added to each SQL stage")
+    parser.add_argument("--sql-error-rate", type=float, default=0.0, help="Fraction of SQL calls that fail")
+    parser.add_argument("--sql-rows", type=int, default=12, help="Rows returned by the SQL stand-in")
+    parser.add_argument("--stub-latency-ms", type=float, default=5.0, help="Latency of the stub app tier")
+    parser.add_argument("--log-dir", default=str(REPO_ROOT / ".bench" / "logs"), help="Directory for service logs")
+    parser.add_argument("--output", help="Write the JSON results to this path")
+    parser.add_argument("--baseline", help="Compare against a previous JSON results file")
+    parser.add_argument("--max-regression", type=float, help="Exit non-zero when rps drops or p99 grows by more than this percent")
+    args = parser.parse_args()
+
+    if args.tier == "all":
+        scenarios = SUITE
+    else:
+        scenarios = [{"tier": args.tier, "path": args.path, "upstream": "sql" if args.tier == "app" else args.upstream}]
+
+    results = []
+    for scenario in scenarios:
+        print(f"Running {scenario['tier']} {scenario['path']} (upstream: {scenario['upstream']})...", file=sys.stderr)
+        results.append(run_scenario(args, scenario))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "sql": {
+            "connect_ms": args.sql_connect_ms,
+            "query_ms": args.sql_query_ms,
+            "fetch_ms": args.sql_fetch_ms,
+            "jitter_ms": args.sql_jitter_ms,
+            "error_rate": args.sql_error_rate,
+            "rows": args.sql_rows,
+        },
+        "results": results,
+    }
+    rendered = json.dumps(report, indent=2)
+    print(rendered)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"Regressions beyond {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
@@ -0,0 +1,114 @@
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bench import APP_TIER_DIR, percentile
+
+sys.path.insert(0, str(APP_TIER_DIR))
+
+from customer_index import CustomerIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vi", "an", "so", "del", "mar", "ul", "be", "cor", "ya", "nis", "ho"]
+
+
+def synthetic_name(rng):
+    first = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+    last = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f"{first} {last}"
+
+
+def synthetic_rows(count, segments, rng):
+    base = datetime(2026, 1, 20, 8, 0, 0)
+    return [(index + 1, synthetic_name(rng), rng.choice(segments), base + timedelta(seconds=index)) for index in range(count)]
+
+
+def timed_us(calls):
+    samples = []
+    for call in calls:
+        start = time.perf_counter_ns()
+        call()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return {
+        "count": len(samples),
+        "mean": round(sum(samples) / len(samples), 3) if samples else None,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": round(samples[-1], 3) if samples else None,
+    }
+
+
+def measure_memory(rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    index = CustomerIndex()
+    index.load((customer_id, name.encode().decode(), segment, last_update) for customer_id, name, segment, last_update in rows)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, current - before, peak - before
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the app-tier customer search index with synthetic rows.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of synthetic customers")
+    parser.add_argument("--segments", type=int, default=12, help="Number of distinct segments")
+    parser.add_argument("--queries", type=int, default=20000, help="Searches timed per query kind")
+    parser.add_argument("--updates", type=int, default=2000, help="Single-row incremental updates timed")
+    parser.add_argument("--limit", type=int, default=20, help="Result limit per search")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for the synthetic data")
+    parser.add_argument("--output", help="Write the JSON results to this path")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    segments = [f"Segment {index + 1}" for index in range(args.segments)]
+    print(f"Generating {args.rows} rows...", file=sys.stderr)
+    rows = synthetic_rows(args.rows, segments, rng)
+
+    print("Building index...", file=sys.stderr)
+    start = time.perf_counter()
+    CustomerIndex().load(rows)
+    build_s = time.perf_counter() - start
+    index, retained, peak = measure_memory(rows)
+
+    names = [row[1] for row in rows]
+    prefixes = [rng.choice(names)[: rng.randint(1, 4)] for _ in range(args.queries)]
+    picked = [rng.choice(segments) for _ in range(args.queries)]
+    print("Timing searches and updates...", file=sys.stderr)
+    search_us = {
+        "prefix": timed_us(lambda prefix=prefix: index.search(prefix, None, args.limit) for prefix in prefixes),
+        "prefix_segment": timed_us(
+            lambda prefix=prefix, segment=segment: index.search(prefix, segment, args.limit)
+            for prefix, segment in zip(prefixes, picked)
+        ),
+        "segment": timed_us(lambda segment=segment: index.search("", segment, args.limit) for segment in picked),
+    }
+    updates = [
+        (rng.randint(1, args.rows), synthetic_name(rng), rng.choice(segments), datetime(2026, 2, 1))
+        for _ in range(args.updates)
+    ]
+    apply_us = timed_us(lambda row=row: index.apply([row]) for row in updates)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "rows": args.rows,
+        "segments": args.segments,
+        "limit": args.limit,
+        "build_s": round(build_s, 3),
+        "memory_mb": round(retained / 2**20, 1),
+        "build_peak_mb": round(peak / 2**20, 1),
+        "bytes_per_row": round(retained / args.rows, 1) if args.rows else None,
+        "search_us": search_us,
+        "apply_us": apply_us,
+    }
+    rendered = json.dumps(report, indent=2)
+    print(rendered)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(rendered + "\n", encoding="utf-8")
@@ -0,0 +1,108 @@
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+SEGMENTS = ["Analytics", "Engineering", "Operations", "Platform", "Research"]
+NAMES = ["Ada Lovelace", "Alan Turing", "Katherine Johnson", "Grace Hopper", "Mary Jackson"]
+
+
+class Error(Exception):
+    pass
+
+
+def env_float(name, fallback):
+    try:
+        return float(os.environ.get(name, fallback))
+    except ValueError:
+        return fallback
+
+
+def pause(name):
+    delay_ms = env_float(name, 0.0)
+    jitter_ms = env_float("BENCH_SQL_JITTER_MS", 0.0)
+    if jitter_ms:
+        delay_ms += random.uniform(0, jitter_ms)
+    if delay_ms > 0:
+        time.sleep(delay_ms / 1000)
+
+
+def maybe_fail(stage):
+    if random.random() < env_float("BENCH_SQL_ERROR_RATE", 0.0):
+        raise Error(f"injected {stage} failure")
+
+
+class Cursor:
+    def __init__(self):
+        self.rows = []
+        self.sets = []
+
+    def execute(self, statement, *params):
+        pause("BENCH_SQL_QUERY_MS")
+        maybe_fail("execute")
+        self.sets = []
+        if "SELECT 1" in statement and "FROM" not in statement:
+            self.rows = [(1,)]
+            return self
+        count = int(env_float("BENCH_SQL_ROWS", 12))
+        if "MIN_ACTIVE_ROWVERSION" in statement and "FROM" not in statement:
+            self.rows = [(count + 1,)]
+            return self
+        base = datetime(2026, 1, 20, 8, 0, 0)
+        self.rows = [
+            (index + 1, NAMES[index % len(NAMES)], SEGMENTS[index % len(SEGMENTS)], base + timedelta(minutes=5 * index))
+            for index in range(count)
+        ]
+        if "row_version" in statement:
+            since = params[0] if params else 0
+            changed = [row + (row[0],) for row in self.rows if row[0] > since] if "name" in statement else []
+            self.rows, self.sets = [(count + 1,)], [changed]
+        return self
+
+    def executemany(self, statement, rows):
+        pause("BENCH_SQL_QUERY_MS")
+        maybe_fail("executemany")
+        self.rows = []
+        return self
+
+    def nextset(self):
+        if not self.sets:
+            return None
+        self.rows = self.sets.pop(0)
+        return True
+
+    def fetchone(self):
+        pause("BENCH_SQL_FETCH_MS")
+        return self.rows[0] if self.rows else None
+
+    def fetchmany(self, size=1):
+        pause("BENCH_SQL_FETCH_MS")
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        pause("BENCH_SQL_FETCH_MS")
+        return list(self.rows)
+
+
+class Connection:
+    def cursor(self):
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+def connect(connection_string, timeout=None, **kwargs):
+    pause("BENCH_SQL_CONNECT_MS")
+    maybe_fail("connect")
+    return Connection()
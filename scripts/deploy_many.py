@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+from runner import ENV_DIR_NAME, get_terraform_exe
+
+ENV_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]*")
+
+
+def warm_provider_cache(terraform_root, env):
+    warm_env = dict(env, TF_DATA_DIR=f"{ENV_DIR_NAME}/_providers", TF_IN_AUTOMATION="1")
+    warm_env.pop("TF_WORKSPACE", None)
+    for tf_dir in sorted(path for path in terraform_root.glob("0*") if path.is_dir()):
+        print(f"Warming provider cache: {tf_dir.name}")
+        result = subprocess.run(
+            [get_terraform_exe(), f"-chdir={tf_dir}", "init", "-backend=false", "-input=false", "-no-color"],
+            capture_output=True,
+            text=True,
+            errors="replace",
+            env=warm_env,
+        )
+        if result.returncode != 0:
+            lines = (result.stderr or result.stdout).strip().splitlines()
+            print(f"  warning: {lines[-1] if lines else 'init failed'}")
+
+
+def deploy_environment(name, deploy_script, deploy_args, log_dir, env):
+    log_path = log_dir / name / "deploy.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    child_env = {key: value for key, value in env.items() if key not in ("TF_DATA_DIR", "TF_WORKSPACE")}
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        result = subprocess.run(
+            [sys.executable, "-u", str(deploy_script), "--env", name, *deploy_args],
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            env=child_env,
+        )
+    return {
+        "env": name,
+        "status": "ok" if result.returncode == 0 else "failed",
+        "returncode": result.returncode,
+        "duration_s": round(time.perf_counter() - start, 1),
+        "log": str(log_path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Deploy several isolated environments in parallel (extra arguments are passed to deploy.py)."
+    )
+    parser.add_argument("envs", nargs="+", help="Environment names, e.g. pr-101 pr-102")
+    parser.add_argument("--concurrency", type=int, default=2, help="Number of environments deployed at the same time")
+    parser.add_argument("--skip-warm", action="store_true", help="Skip pre-populating the shared provider cache")
+    parser.add_argument("--output", help="Write the JSON summary to this path")
+    args, deploy_args = parser.parse_known_args()
+
+    invalid = [name for name in args.envs if not ENV_NAME.fullmatch(name)]
+    if invalid:
+        parser.error(f"invalid environment name(s): {', '.join(invalid)}")
+    repo_root = Path(__file__).resolve().parent.parent
+    plugin_cache = Path(os.environ.get("TF_PLUGIN_CACHE_DIR") or repo_root / ".terraform-plugin-cache")
+    plugin_cache.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, TF_PLUGIN_CACHE_DIR=str(plugin_cache.resolve()))
+    if not args.skip_warm:
+        warm_provider_cache(repo_root / "terraform", env)
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    envs = list(dict.fromkeys(args.envs))
+    results = []
+    print(f"Deploying {len(envs)} environment(s), {max(args.concurrency, 1)} at a time")
+    with ThreadPoolExecutor(max_workers=max(args.concurrency, 1)) as pool:
+        futures = [
+            pool.submit(deploy_environment, name, repo_root / "scripts" / "deploy.py", deploy_args, repo_root / ".deploy", env)
+            for name in envs
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"  {result['env']:<20} {result['status']:<7} {result['duration_s']:>7.1f}s  {result['log']}")
+
+    summary = {
+        "started_at": started_at,
+        "wall_s": round(time.perf_counter() - start, 1),
+        "failed": sorted(result["env"] for result in results if result["status"] != "ok"),
+        "environments": sorted(results, key=lambda result: envs.index(result["env"])),
+    }
+    print(f"\n{len(envs) - len(summary['failed'])}/{len(envs)} environment(s) deployed in {summary['wall_s']:.1f}s")
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+    sys.exit(1 if summary["failed"] else 0)
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from runner import INIT_LOCK, configure_environment, environment_state_path, get_terraform_exe, var_file_args
+
+
+def has_state(tf_dir):
+    state_path = environment_state_path(tf_dir) or tf_dir / "terraform.tfstate"
+    if not state_path.exists():
+        return False
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return False
+    return bool(state.get("resources"))
+
+
+def terraform(tf_dir, args, env, timeout):
+    return subprocess.run(
+        [get_terraform_exe(), f"-chdir={tf_dir}"] + args,
+        capture_output=True,
+        text=True,
+        errors="replace",
+        env=env,
+        timeout=timeout,
+    )
+
+
+def last_error(result):
+    lines = [line for line in (result.stderr or result.stdout).splitlines() if line.strip()]
+    return lines[-1].strip() if lines else f"exit code {result.returncode}"
+
+
+def parse_drift(output):
+    drifted = []
+    for line in output.splitlines():
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("type") != "resource_drift":
+            continue
+        change = message.get("change", {})
+        drifted.append({
+            "address": change.get("resource", {}).get("addr"),
+            "action": change.get("action"),
+        })
+    return drifted
+
+
+def check_stack(tf_dir, env, timeout):
+    start = time.perf_counter()
+    deadline = start + timeout
+    result = {"stack": tf_dir.name, "status": "clean", "drifted": []}
+    try:
+        if not (tf_dir / os.environ.get("TF_DATA_DIR", ".terraform")).exists():
+            with INIT_LOCK:
+                init = terraform(tf_dir, ["init", "-input=false", "-no-color"], env, max(deadline - time.perf_counter(), 1))
+            if init.returncode != 0:
+                result.update(status="error", error=last_error(init))
+                return result
+        plan = terraform(
+            tf_dir,
+            ["plan", "-refresh-only", "-detailed-exitcode", "-input=false", "-lock=false", "-json", *var_file_args(tf_dir)],
+            env,
+            max(deadline - time.perf_counter(), 1),
+        )
+        if plan.returncode == 2:
+            result["status"] = "drifted"
+            result["drifted"] = parse_drift(plan.stdout)
+        elif plan.returncode != 0:
+            result.update(status="error", error=last_error(plan))
+    except subprocess.TimeoutExpired:
+        result.update(status="timeout", error=f"no result after {timeout:.0f}s")
+    except OSError as exc:
+        result.update(status="error", error=str(exc))
+    finally:
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def drift_report(terraform_root, timeout, workers):
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    env = dict(os.environ, TF_IN_AUTOMATION="1")
+    stacks = sorted(path for path in terraform_root.glob("0*") if path.is_dir())
+    with_state = [tf_dir for tf_dir in stacks if has_state(tf_dir)]
+    with ThreadPoolExecutor(max_workers=max(min(workers, len(with_state)), 1)) as pool:
+        results = list(pool.map(lambda tf_dir: check_stack(tf_dir, env, timeout), with_state))
+    results += [{"stack": tf_dir.name, "status": "no-state", "drifted": []} for tf_dir in stacks if tf_dir not in with_state]
+    statuses = {result["status"] for result in results}
+    if statuses & {"error", "timeout"}:
+        status = "error"
+    elif "drifted" in statuses:
+        status = "drifted"
+    else:
+        status = "clean"
+    return {
+        "started_at": started_at,
+        "status": status,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "stacks": sorted(results, key=lambda result: result["stack"]),
+    }
+
+
+def print_report(report):
+    for result in report["stacks"]:
+        duration = f"{result['duration_ms'] / 1000:.1f}s" if "duration_ms" in result else "-"
+        print(f"  {result['stack']:<20} {result['status']:<9} {duration:>7}  {result.get('error', '')}".rstrip())
+        for item in result["drifted"]:
+            print(f"      {item['action']}: {item['address']}")
+    print(f"\nOverall: {report['status']} in {report['duration_ms'] / 1000:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect drift between deployed resources and Terraform state for every stack.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-stack timeout in seconds")
+    parser.add_argument("--concurrency", type=int, default=9, help="Number of stacks checked at the same time")
+    parser.add_argument("--env", help="Check the isolated environment created with deploy.py --env NAME")
+    parser.add_argument("--plugin-cache", help="Shared provider plugin cache (default: .terraform-plugin-cache)")
+    parser.add_argument("--json", action="store_true", help="Print the compact JSON report instead of the summary")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parent.parent
+    if args.plugin_cache:
+        os.environ["TF_PLUGIN_CACHE_DIR"] = str(Path(args.plugin_cache).resolve())
+    configure_environment(repo_root, args.env)
+    report = drift_report(repo_root / "terraform", args.timeout, args.concurrency)
+    report["environment"] = args.env or "default"
+    if args.json:
+        print(json.dumps(report, separators=(",", ":")))
+    else:
+        print_report(report)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, separators=(",", ":")) + "\n", encoding="utf-8")
+    sys.exit({"clean": 0, "drifted": 2}.get(report["status"], 1))
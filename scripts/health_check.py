@@ -0,0 +1,281 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+
+from runner import get_az_exe, get_terraform_exe
+
+STACKS = {
+    "rg": "01_resource_group",
+    "sql": "05_private_sql",
+    "app": "07_app_tier",
+    "lb": "08_load_balancer",
+    "web": "09_compute_web",
+}
+
+POWER_STATE_QUERY = "instanceView.statuses[?starts_with(code, 'PowerState/')].displayStatus | [0]"
+CHECK_GRACE_S = 5
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def run_cli(cmd, timeout):
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise CheckFailed(f"timed out after {timeout}s: {' '.join(cmd[:3])}")
+    except OSError as exc:
+        raise CheckFailed(f"{cmd[0]}: {exc}")
+    if result.returncode != 0:
+        detail = (result.stderr or result.stdout).strip().splitlines()
+        raise CheckFailed(detail[-1] if detail else f"{cmd[0]} exited with {result.returncode}")
+    return result.stdout.strip()
+
+
+def read_state_outputs(tf_dir):
+    state_path = tf_dir / "terraform.tfstate"
+    if not state_path.exists():
+        return {}
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+    return {name: item.get("value") for name, item in state.get("outputs", {}).items()}
+
+
+def read_outputs(tf_dir, timeout):
+    try:
+        raw = run_cli([get_terraform_exe(), f"-chdir={tf_dir}", "output", "-json"], timeout)
+        outputs = {name: item.get("value") for name, item in json.loads(raw or "{}").items()}
+    except (CheckFailed, json.JSONDecodeError):
+        outputs = {}
+    return outputs or read_state_outputs(tf_dir)
+
+
+def read_all_outputs(terraform_root, timeout):
+    with ThreadPoolExecutor(max_workers=len(STACKS)) as pool:
+        futures = {key: pool.submit(read_outputs, terraform_root / name, timeout) for key, name in STACKS.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def require(outputs, stack, name):
+    value = outputs.get(stack, {}).get(name)
+    if value in (None, ""):
+        raise CheckFailed(f"missing terraform output '{name}' in {STACKS[stack]}")
+    return value
+
+
+def check_power_state(outputs, timeout, tier):
+    vm_name = require(outputs, tier, "app_vm_name" if tier == "app" else "vm_name")
+    state = run_cli([
+        get_az_exe(),
+        "vm",
+        "get-instance-view",
+        "--resource-group",
+        require(outputs, "rg", "resource_group_name"),
+        "--name",
+        vm_name,
+        "--query",
+        POWER_STATE_QUERY,
+        "-o",
+        "tsv",
+    ], timeout)
+    if state != "VM running":
+        raise CheckFailed(f"{vm_name}: {state or 'unknown power state'}")
+    return f"{vm_name}: {state}"
+
+
+def check_lb_probes(outputs, timeout, tier):
+    lb_name = require(outputs, tier, "app_lb_name" if tier == "app" else "load_balancer_name")
+    raw = run_cli([
+        get_az_exe(),
+        "network",
+        "lb",
+        "probe",
+        "list",
+        "--resource-group",
+        require(outputs, "rg", "resource_group_name"),
+        "--lb-name",
+        lb_name,
+        "-o",
+        "json",
+    ], timeout)
+    probes = json.loads(raw or "[]")
+    if not probes:
+        raise CheckFailed(f"{lb_name}: no health probes configured")
+    summary = ", ".join(
+        f"{probe.get('protocol')}:{probe.get('port')}{probe.get('requestPath') or ''}"
+        for probe in probes
+    )
+    return f"{lb_name}: {summary}"
+
+
+def run_remote(outputs, timeout, vm_key, script):
+    vm_name = require(outputs, vm_key, "app_vm_name" if vm_key == "app" else "vm_name")
+    message = run_cli([
+        get_az_exe(),
+        "vm",
+        "run-command",
+        "invoke",
+        "--resource-group",
+        require(outputs, "rg", "resource_group_name"),
+        "--name",
+        vm_name,
+        "--command-id",
+        "RunShellScript",
+        "--scripts",
+        script,
+        "--query",
+        "value[0].message",
+        "-o",
+        "tsv",
+    ], timeout)
+    if "[stdout]" in message:
+        message = message.split("[stdout]", 1)[1].split("[stderr]", 1)[0]
+    return message.strip()
+
+
+def check_app_lb_from_web(outputs, timeout):
+    app_lb_ip = require(outputs, "app", "app_lb_private_ip")
+    body = run_remote(outputs, timeout, "web", f"curl -sS -m 5 http://{app_lb_ip}:8080/health 2>&1 || true")
+    if body != "ok":
+        raise CheckFailed(f"http://{app_lb_ip}:8080/health -> {body or 'no response'}")
+    return f"http://{app_lb_ip}:8080/health -> ok"
+
+
+def check_sql_from_app(outputs, timeout):
+    body = run_remote(outputs, timeout, "app", "curl -sS -m 8 http://127.0.0.1:8080/status 2>&1 || true")
+    try:
+        status = json.loads(body)
+    except json.JSONDecodeError:
+        raise CheckFailed(f"app tier /status -> {body or 'no response'}")
+    if status.get("db_status") != "ok":
+        raise CheckFailed(f"db_status={status.get('db_status')}: {status.get('db_detail')}")
+    sql_fqdn = outputs.get("sql", {}).get("sql_server_fqdn") or "sql"
+    return f"{sql_fqdn}: {status.get('db_detail', 'reachable')}"
+
+
+def check_public_http(outputs, timeout):
+    url = f"http://{require(outputs, 'lb', 'public_ip_address')}/health"
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            body = resp.read().decode(errors="replace").strip()
+            status = resp.status
+    except urllib.error.HTTPError as exc:
+        raise CheckFailed(f"{url} -> HTTP {exc.code}")
+    except (urllib.error.URLError, OSError) as exc:
+        raise CheckFailed(f"{url} -> {exc}")
+    return f"{url} -> {status} {body}"
+
+
+def build_checks(skip_remote):
+    checks = [
+        ("app-vm-power", lambda outputs, timeout: check_power_state(outputs, timeout, "app")),
+        ("web-vm-power", lambda outputs, timeout: check_power_state(outputs, timeout, "web")),
+        ("app-lb-probes", lambda outputs, timeout: check_lb_probes(outputs, timeout, "app")),
+        ("web-lb-probes", lambda outputs, timeout: check_lb_probes(outputs, timeout, "lb")),
+    ]
+    if not skip_remote:
+        checks += [
+            ("app-lb-http", check_app_lb_from_web),
+            ("public-http", check_public_http),
+            ("sql", check_sql_from_app),
+        ]
+    return checks
+
+
+def timed_check(name, func, outputs, timeout):
+    start = time.perf_counter()
+    try:
+        detail = func(outputs, timeout)
+        status = "ok"
+    except CheckFailed as exc:
+        detail = str(exc)
+        status = "failed"
+    except Exception as exc:
+        detail = f"{type(exc).__name__}: {exc}"
+        status = "error"
+    return {"name": name, "status": status, "latency_ms": round((time.perf_counter() - start) * 1000, 1), "detail": detail}
+
+
+def run_checks(outputs, checks, timeout):
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=len(checks))
+    try:
+        futures = {pool.submit(timed_check, name, func, outputs, timeout): name for name, func in checks}
+        done, pending = wait(futures, timeout=timeout + CHECK_GRACE_S)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        result = future.result()
+        results[result["name"]] = result
+    for future in pending:
+        name = futures[future]
+        results[name] = {"name": name, "status": "failed", "latency_ms": round((timeout + CHECK_GRACE_S) * 1000, 1), "detail": "timed out"}
+    return [results[name] for name, _ in checks]
+
+
+def health_report(repo_root, timeout, skip_remote):
+    started_at = datetime.now(timezone.utc).isoformat()
+    start = time.perf_counter()
+    outputs = read_all_outputs(repo_root / "terraform", timeout)
+    outputs_ms = round((time.perf_counter() - start) * 1000, 1)
+    checks = run_checks(outputs, build_checks(skip_remote), timeout)
+    failed = [check["name"] for check in checks if check["status"] != "ok"]
+    return {
+        "started_at": started_at,
+        "status": "ok" if not failed else "failed",
+        "failed": failed,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "outputs_ms": outputs_ms,
+        "resources": {
+            "resource_group": outputs["rg"].get("resource_group_name"),
+            "app_vm": outputs["app"].get("app_vm_name"),
+            "web_vm": outputs["web"].get("vm_name"),
+            "app_lb": outputs["app"].get("app_lb_name"),
+            "app_lb_ip": outputs["app"].get("app_lb_private_ip"),
+            "web_lb": outputs["lb"].get("load_balancer_name"),
+            "web_lb_ip": outputs["lb"].get("public_ip_address"),
+        },
+        "checks": checks,
+    }
+
+
+def print_report(report):
+    resources = report["resources"]
+    print(f"Resource group: {resources['resource_group']}")
+    print(f"App VM: {resources['app_vm']}  Web VM: {resources['web_vm']}")
+    print(f"App LB: {resources['app_lb']} ({resources['app_lb_ip']})  Web LB: {resources['web_lb']} ({resources['web_lb_ip']})")
+    print("")
+    width = max(len(check["name"]) for check in report["checks"])
+    for check in report["checks"]:
+        print(f"  {check['name']:<{width}}  {check['status']:<6}  {check['latency_ms']:>8.1f} ms  {check['detail']}")
+    print(f"\nOverall: {report['status']} in {report['duration_ms']:.0f} ms (outputs {report['outputs_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run concurrent post-deploy health checks for the VNets & Subnets project.")
+    parser.add_argument("--skip-remote-checks", action="store_true", help="Skip HTTP and SQL checks that run on the VMs or hit the public IP")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-check timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the JSON report instead of the summary table")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    repo_root = Path(__file__).resolve().parent.parent
+    report = health_report(repo_root, args.timeout, args.skip_remote_checks)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    sys.exit(0 if report["status"] == "ok" else 1)
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+JOURNAL = {
+    "path": None,
+    "resume": False,
+    "steps": {},
+    "current_run": set(),
+}
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def ignored(relative):
+    first = relative.parts[0]
+    return first.startswith(".terraform") or first.startswith("terraform.tfstate") or relative.suffix == ".tfplan"
+
+
+def fingerprint(*paths, exclude=()):
+    digest = hashlib.sha256()
+    exclude = {Path(item) for item in exclude}
+    for path in paths:
+        path = Path(path)
+        files = [path] if path.is_file() else sorted(item for item in path.rglob("*") if item.is_file())
+        for item in files:
+            relative = item.relative_to(path) if item != path else Path(item.name)
+            if ignored(relative) or item in exclude:
+                continue
+            digest.update(relative.as_posix().encode("utf-8") + b"\0")
+            digest.update(item.read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+def configure_journal(path, resume, reset=False):
+    JOURNAL["path"] = Path(path)
+    JOURNAL["resume"] = resume
+    JOURNAL["steps"] = {}
+    if JOURNAL["path"].exists() and not reset:
+        try:
+            JOURNAL["steps"] = json.loads(JOURNAL["path"].read_text(encoding="utf-8")).get("steps", {})
+        except json.JSONDecodeError:
+            print(f"Ignoring unreadable deploy journal: {JOURNAL['path']}")
+    if resume and not JOURNAL["steps"]:
+        print("No deploy journal found; --resume starts from the first stack.")
+    save_journal()
+
+
+def save_journal():
+    if JOURNAL["path"] is None:
+        return
+    JOURNAL["path"].parent.mkdir(parents=True, exist_ok=True)
+    temp_path = JOURNAL["path"].with_suffix(".tmp")
+    temp_path.write_text(json.dumps({"updated_at": now(), "steps": JOURNAL["steps"]}, indent=2) + "\n", encoding="utf-8")
+    os.replace(temp_path, JOURNAL["path"])
+
+
+def trusted_step(name):
+    step = JOURNAL["steps"].get(name)
+    if not step or step.get("status") != "applied":
+        return None
+    if name not in JOURNAL["current_run"] and not JOURNAL["resume"]:
+        return None
+    return step
+
+
+def step_complete(name, inputs):
+    step = trusted_step(name)
+    return step is not None and step.get("fingerprint") == inputs
+
+
+def step_outputs(name):
+    step = trusted_step(name)
+    return step.get("outputs") if step else None
+
+
+def mark_step(name, status, inputs=None, outputs=None):
+    if JOURNAL["path"] is None:
+        return
+    step = JOURNAL["steps"].setdefault(name, {})
+    step["status"] = status
+    step["updated_at"] = now()
+    if inputs is not None:
+        step["fingerprint"] = inputs
+    if status == "applied":
+        step["outputs"] = outputs
+        JOURNAL["current_run"].add(name)
+    else:
+        step.pop("outputs", None)
+    save_journal()
+
+
+def forget_step(name):
+    if JOURNAL["path"] is None or name not in JOURNAL["steps"]:
+        return
+    del JOURNAL["steps"][name]
+    JOURNAL["current_run"].discard(name)
+    save_journal()
+
+
+def default_journal_path(state_dir):
+    return state_dir / "journal.json"
@@ -0,0 +1,332 @@
+import ipaddress
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from runner import get_az_exe, get_terraform_exe, init_stack, phase, run_capture_optional, run_detailed
+from snat import nat_address_count
+from stacks import load_tfvars, upstream_stacks
+
+PET_SUFFIX_LENGTH = 27
+AZURE_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+RESOURCE_GROUP_NAME = re.compile(r"[A-Za-z0-9_.()-]+")
+SQL_SERVER_NAME = re.compile(r"[a-z0-9][a-z0-9-]*")
+VM_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9.-]*")
+SERVERLESS_SKU = re.compile(r"GP_S_Gen5_(\d+)")
+NO_ACCELERATED_NETWORKING = re.compile(r"Standard_[AB]\d")
+
+VM_CAPABILITIES = {}
+
+NAME_RULES = {
+    "resource_group_name": (90, RESOURCE_GROUP_NAME, PET_SUFFIX_LENGTH),
+    "vnet_name": (64, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "subnet_name": (80, AZURE_NAME, len("-web")),
+    "nsg_name": (80, AZURE_NAME, len("-web") + PET_SUFFIX_LENGTH),
+    "sql_server_name": (63, SQL_SERVER_NAME, 0),
+    "private_endpoint_name": (64, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "private_dns_zone_link_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "nat_gateway_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "public_ip_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "public_ip_prefix_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "lb_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "vm_name": (64, VM_NAME, PET_SUFFIX_LENGTH),
+    "proximity_placement_group_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+    "nic_name": (80, AZURE_NAME, PET_SUFFIX_LENGTH),
+}
+
+VALUE_RANGES = {
+    "app_port": (1, 65535),
+    "frontend_port": (1, 65535),
+    "backend_port": (1, 65535),
+    "idle_timeout_in_minutes": (4, 120),
+    "public_ip_count": (0, 16),
+    "public_ip_prefix_length": (28, 31),
+    "lb_probe_interval_in_seconds": (5, 300),
+    "lb_probe_threshold": (1, 100),
+    "lb_idle_timeout_in_minutes": (4, 30),
+    "outbound_ports_per_instance": (0, 64000),
+    "outbound_idle_timeout_in_minutes": (4, 120),
+    "probe_interval_seconds": (1, 3600),
+    "dns_cache_ttl_seconds": (1, 3600),
+    "single_flight_max_wait_seconds": (0.1, 60),
+    "admission_max_concurrency": (1, 1000),
+    "admission_target_latency_ms": (10, 60000),
+    "events_poll_interval_seconds": (1, 300),
+    "events_max_clients": (1, 10000),
+    "changes_poll_interval_seconds": (1, 300),
+    "search_refresh_seconds": (1, 3600),
+    "trace_sample_rate": (0, 1),
+}
+
+URL_KEYS = ["app_tier_url"]
+
+LOAD_DISTRIBUTIONS = ["Default", "SourceIP", "SourceIPProtocol"]
+
+NUMERIC_ENV = {
+    "APP_PORT": int,
+    "LB_FRONTEND_PORT": int,
+    "LB_BACKEND_PORT": int,
+    "NAT_IDLE_TIMEOUT_IN_MINUTES": int,
+    "APP_LB_PROBE_INTERVAL_IN_SECONDS": int,
+    "APP_LB_PROBE_THRESHOLD": int,
+    "APP_LB_IDLE_TIMEOUT_IN_MINUTES": int,
+    "LB_PROBE_INTERVAL_IN_SECONDS": int,
+    "LB_PROBE_THRESHOLD": int,
+    "LB_IDLE_TIMEOUT_IN_MINUTES": int,
+    "LB_OUTBOUND_PORTS_PER_INSTANCE": int,
+    "LB_OUTBOUND_IDLE_TIMEOUT_IN_MINUTES": int,
+    "NAT_PUBLIC_IP_COUNT": int,
+    "NAT_PUBLIC_IP_PREFIX_LENGTH": int,
+    "NAT_SNAT_FAILURE_ALERT_THRESHOLD": int,
+    "PROBE_INTERVAL_SECONDS": int,
+    "DNS_CACHE_TTL_SECONDS": int,
+    "SINGLE_FLIGHT_MAX_WAIT_SECONDS": float,
+    "ADMISSION_MAX_CONCURRENCY": int,
+    "ADMISSION_TARGET_LATENCY_MS": int,
+    "EVENTS_POLL_INTERVAL_SECONDS": int,
+    "EVENTS_MAX_CLIENTS": int,
+    "CHANGES_POLL_INTERVAL_SECONDS": int,
+    "SEARCH_REFRESH_SECONDS": int,
+    "SQL_MAX_SIZE_GB": int,
+    "SQL_AUTO_PAUSE_DELAY_IN_MINUTES": int,
+    "SQL_MIN_CAPACITY": float,
+    "TRACE_SAMPLE_RATE": float,
+}
+
+REQUIRED_VALUES = {
+    "05_private_sql": {
+        "sql_admin_password": "SQL_ADMIN_PASSWORD",
+        "azuread_admin_login": "AZUREAD_ADMIN_LOGIN (or sign in with az login)",
+        "azuread_admin_object_id": "AZUREAD_ADMIN_OBJECT_ID (or sign in with az login)",
+    },
+    "07_app_tier": {"admin_password": "APP_VM_ADMIN_PASSWORD"},
+    "09_compute_web": {"admin_password": "VM_ADMIN_PASSWORD"},
+}
+
+
+def check_environment():
+    errors = []
+    for name, parse in NUMERIC_ENV.items():
+        value = os.environ.get(name)
+        if value is None:
+            continue
+        try:
+            parse(value)
+        except ValueError:
+            errors.append(f"{name}={value!r} is not a valid {parse.__name__}")
+    return errors
+
+
+def check_name(key, value, rule, reserve):
+    limit, pattern, _ = NAME_RULES[rule]
+    errors = []
+    if not pattern.fullmatch(value):
+        errors.append(f"{key} {value!r} contains characters not allowed in Azure names")
+    elif not reserve and value[-1] in ".-":
+        errors.append(f"{key} {value!r} must not end with '.' or '-'")
+    if len(value) + reserve > limit:
+        room = f"{limit - reserve} characters (the generated suffix takes {reserve})" if reserve else f"{limit} characters"
+        errors.append(f"{key} {value!r} is {len(value)} characters; at most {room}")
+    return errors
+
+
+def check_names(values):
+    errors = []
+    for key, value in values.items():
+        if not isinstance(value, str):
+            continue
+        rule = key[:-len("_prefix")] if key.endswith("_prefix") else key
+        if rule in NAME_RULES:
+            errors += check_name(key, value, rule, NAME_RULES[rule][2] if rule != key else 0)
+    return errors
+
+
+def check_settings(values):
+    errors = []
+    for key, (low, high) in VALUE_RANGES.items():
+        value = values.get(key)
+        if value is not None and not low <= value <= high:
+            errors.append(f"{key} {value} is outside {low}-{high}")
+    if "public_ip_count" in values:
+        addresses = nat_address_count(values["public_ip_count"], values.get("public_ip_prefix_length"))
+        if not 1 <= addresses <= 16:
+            errors.append(f"NAT gateway would have {addresses} public addresses; it needs 1-16 (public_ip_count plus the prefix size)")
+    distribution = values.get("lb_load_distribution")
+    if distribution is not None and distribution not in LOAD_DISTRIBUTIONS:
+        errors.append(f"lb_load_distribution {distribution!r} must be one of {', '.join(LOAD_DISTRIBUTIONS)}")
+    if values.get("outbound_ports_per_instance") is not None and values["outbound_ports_per_instance"] % 8:
+        errors.append(f"outbound_ports_per_instance {values['outbound_ports_per_instance']} must be a multiple of 8")
+    auto_pause = values.get("auto_pause_delay_in_minutes")
+    if auto_pause is not None and auto_pause != -1 and not 15 <= auto_pause <= 10080:
+        errors.append(f"auto_pause_delay_in_minutes {auto_pause} must be -1 (disabled) or 15-10080")
+    serverless = SERVERLESS_SKU.fullmatch(values.get("database_sku_name") or "")
+    if serverless and values.get("min_capacity") is not None and values["min_capacity"] > int(serverless.group(1)):
+        errors.append(f"min_capacity {values['min_capacity']} exceeds the {serverless.group(1)} vCores of {serverless.group(0)}")
+    probe_path = values.get("probe_path")
+    if probe_path is not None and (not probe_path.startswith("/") or any(char.isspace() for char in probe_path)):
+        errors.append(f"probe_path {probe_path!r} must start with '/' and contain no whitespace")
+    for key in URL_KEYS:
+        value = values.get(key)
+        if value and not re.match(r"https?://[^/\s]+", value):
+            errors.append(f"{key} {value!r} is not an http(s) URL")
+    return errors
+
+
+def parse_networks(label, cidrs):
+    networks = {}
+    errors = []
+    for key, cidr in cidrs.items():
+        try:
+            networks[key] = ipaddress.ip_network(cidr)
+        except ValueError as exc:
+            errors.append(f"{label}.{key} {cidr!r} is not a valid network CIDR ({exc})")
+    return networks, errors
+
+
+def check_subnet_cidrs(tf_dir, values):
+    if "subnet_cidrs" not in values:
+        return []
+    subnets, errors = parse_networks("subnet_cidrs", values["subnet_cidrs"])
+    keys = sorted(subnets)
+    for index, key in enumerate(keys):
+        for other in keys[index + 1:]:
+            if subnets[key].overlaps(subnets[other]):
+                errors.append(f"subnet_cidrs.{key} {subnets[key]} overlaps subnet_cidrs.{other} {subnets[other]}")
+    address_space = next(
+        (load_tfvars(upstream)["address_space"] for upstream in upstream_stacks(tf_dir) if load_tfvars(upstream).get("address_space")),
+        None,
+    )
+    if not address_space:
+        return errors
+    vnet, vnet_errors = parse_networks("address_space", dict(enumerate(address_space)))
+    errors += vnet_errors
+    for key in keys:
+        if vnet and not any(subnets[key].version == space.version and subnets[key].subnet_of(space) for space in vnet.values()):
+            spaces = ", ".join(str(space) for space in vnet.values())
+            errors.append(f"subnet_cidrs.{key} {subnets[key]} is outside address_space {spaces}")
+    return errors
+
+
+def check_required(tf_dir, values):
+    required = REQUIRED_VALUES.get(tf_dir.name, {})
+    return [f"{key} is not set; set {source}" for key, source in required.items() if not values.get(key)]
+
+
+def check_values(tf_dir):
+    values = load_tfvars(tf_dir)
+    errors = check_names(values) + check_settings(values) + check_required(tf_dir, values)
+    if "address_space" in values:
+        errors += parse_networks("address_space", dict(enumerate(values["address_space"])))[1]
+    return errors + check_subnet_cidrs(tf_dir, values)
+
+
+def parse_vm_capabilities(output, size):
+    try:
+        skus = json.loads(output)
+    except json.JSONDecodeError:
+        return None
+    sku = next((item for item in skus if item.get("name", "").lower() == size.lower()), None)
+    if sku is None:
+        return {"available": False}
+    capabilities = {item.get("name"): item.get("value") for item in sku.get("capabilities", [])}
+    zones = {zone for info in sku.get("locationInfo", []) for zone in info.get("zones", [])}
+    for restriction in sku.get("restrictions", []):
+        if restriction.get("type") == "Location":
+            return {"available": False}
+        if restriction.get("type") == "Zone":
+            zones -= set(restriction.get("restrictionInfo", {}).get("zones", []))
+    return {
+        "available": True,
+        "accelerated_networking": capabilities.get("AcceleratedNetworkingEnabled") == "True",
+        "zones": zones,
+    }
+
+
+def vm_capabilities(location, size):
+    key = (location.lower(), size.lower())
+    if key not in VM_CAPABILITIES:
+        output = run_capture_optional([
+            get_az_exe(),
+            "vm",
+            "list-skus",
+            "--location",
+            location,
+            "--size",
+            size,
+            "--resource-type",
+            "virtualMachines",
+            "-o",
+            "json",
+        ])
+        VM_CAPABILITIES[key] = parse_vm_capabilities(output, size) if output else None
+    return VM_CAPABILITIES[key]
+
+
+def check_vm_size(values):
+    size = values["vm_size"]
+    capabilities = vm_capabilities(values.get("location") or "", size)
+    if capabilities is None:
+        if values.get("accelerated_networking_enabled") and NO_ACCELERATED_NETWORKING.match(size):
+            return [f"vm_size {size} does not support accelerated networking"]
+        return []
+    if not capabilities["available"]:
+        return [f"vm_size {size} is not available in {values.get('location')} for this subscription"]
+    errors = []
+    if values.get("accelerated_networking_enabled") and not capabilities["accelerated_networking"]:
+        errors.append(f"vm_size {size} does not support accelerated networking")
+    if values.get("zone") and values["zone"] not in capabilities["zones"]:
+        offered = ", ".join(sorted(capabilities["zones"])) or "none"
+        errors.append(f"vm_size {size} is not offered in zone {values['zone']} of {values.get('location')} (zones: {offered})")
+    return errors
+
+
+def validation_errors(output):
+    try:
+        diagnostics = json.loads(output).get("diagnostics", [])
+    except (json.JSONDecodeError, AttributeError):
+        return [output.splitlines()[-1] if output else "terraform validate failed"]
+    errors = []
+    for diagnostic in diagnostics:
+        if diagnostic.get("severity") != "error":
+            continue
+        location = diagnostic.get("range") or {}
+        where = f" ({location['filename']}:{location['start']['line']})" if location.get("filename") else ""
+        errors.append(f"{diagnostic.get('summary')}{where}")
+    return errors
+
+
+def validate_stack(tf_dir):
+    with phase(tf_dir, "validate"):
+        try:
+            if not (tf_dir / os.environ.get("TF_DATA_DIR", ".terraform")).exists():
+                init_stack(tf_dir, quiet=True, extra_args=["-backend=false", "-input=false"])
+            returncode, output = run_detailed(
+                [get_terraform_exe(), f"-chdir={tf_dir}", "validate", "-json", "-no-color"],
+                allowed=(0, 1),
+            )
+        except subprocess.CalledProcessError as exc:
+            lines = (exc.stderr or "").strip().splitlines()
+            return [f"terraform init failed: {lines[-1] if lines else f'exit code {exc.returncode}'}"]
+    return validation_errors(output) if returncode else []
+
+
+def preflight(steps, workers):
+    start = time.perf_counter()
+    errors = {"environment": check_environment()}
+    with ThreadPoolExecutor(max_workers=max(min(workers, len(steps)), 1)) as pool:
+        checks = [(tf_dir.name, pool.submit(validate_stack, tf_dir)) for tf_dir, _, _ in steps]
+        for tf_dir, prepare, _ in steps:
+            try:
+                prepare()
+            except (RuntimeError, ValueError) as exc:
+                errors[tf_dir.name] = [f"could not resolve tfvars: {exc}"]
+                continue
+            errors[tf_dir.name] = check_values(tf_dir)
+            if load_tfvars(tf_dir).get("vm_size"):
+                checks.append((tf_dir.name, pool.submit(check_vm_size, load_tfvars(tf_dir))))
+        for name, future in checks:
+            errors.setdefault(name, []).extend(future.result())
+    return {name: items for name, items in errors.items() if items}, time.perf_counter() - start
@@ -0,0 +1,444 @@
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+
+TIMING = {
+    "label": None,
+    "path": None,
+    "baseline": None,
+    "started": time.perf_counter(),
+    "started_at": datetime.now(timezone.utc).isoformat(),
+    "phases": [],
+    "commands": [],
+}
+
+RETRY = {
+    "attempts": 4,
+    "budget": 6,
+    "base_s": float(os.environ.get("RETRY_BASE_SECONDS") or 5.0),
+    "max_s": 120.0,
+    "used": {},
+}
+
+RETRYABLE_PATTERNS = [
+    ("throttled", re.compile(r"(?:StatusCode=|status )429\b|TooManyRequests|Too Many Requests|ServerBusy|throttl", re.IGNORECASE)),
+    ("retryable", re.compile(r"RetryableError|AnotherOperationInProgress|OperationNotAllowed.*in progress", re.IGNORECASE)),
+    ("provisioning", re.compile(r"ReferencedResourceNotProvisioned|PrivateEndpoint.*(?:Provisioning|InProgress)|is in (?:Updating|Provisioning) state", re.IGNORECASE)),
+    ("server", re.compile(r"(?:StatusCode=|status )50[234]\b|InternalServerError|ServiceUnavailable|GatewayTimeout", re.IGNORECASE)),
+    ("network", re.compile(r"connection reset by peer|TLS handshake timeout|i/o timeout|context deadline exceeded|unexpected EOF", re.IGNORECASE)),
+]
+
+FATAL_RETURNCODES = {None, 130, -2}
+
+ENVIRONMENT = {
+    "name": None,
+}
+
+ENV_DIR_NAME = ".terraform-env"
+DEFAULT_TFVARS = "deploy.tfvars.json"
+AUTO_TFVARS = "terraform.auto.tfvars.json"
+PLAN_FILE = "deploy.tfplan"
+
+_active = threading.local()
+INIT_LOCK = threading.Lock()
+RETRY_LOCK = threading.Lock()
+
+
+def get_terraform_exe():
+    return os.environ.get("TERRAFORM_BIN") or "terraform"
+
+
+def get_az_exe():
+    return os.environ.get("AZ_BIN") or ("az.cmd" if os.name == "nt" else "az")
+
+
+def configure_environment(repo_root, name):
+    ENVIRONMENT["name"] = name
+    plugin_cache = Path(os.environ.get("TF_PLUGIN_CACHE_DIR") or repo_root / ".terraform-plugin-cache")
+    plugin_cache.mkdir(parents=True, exist_ok=True)
+    os.environ["TF_PLUGIN_CACHE_DIR"] = str(plugin_cache)
+    if name:
+        os.environ["TF_DATA_DIR"] = f"{ENV_DIR_NAME}/{name}"
+        os.environ["TF_WORKSPACE"] = name
+
+
+def tfvars_path(tf_dir):
+    if ENVIRONMENT["name"]:
+        return Path(tf_dir) / ENV_DIR_NAME / ENVIRONMENT["name"] / "terraform.tfvars.json"
+    return Path(tf_dir) / DEFAULT_TFVARS
+
+
+def legacy_tfvars_path(tf_dir):
+    return tfvars_path(tf_dir).with_name("terraform.tfvars")
+
+
+def default_tfvars_files(tf_dir):
+    if ENVIRONMENT["name"]:
+        return [Path(tf_dir) / name for name in (DEFAULT_TFVARS, AUTO_TFVARS, "terraform.tfvars")]
+    return []
+
+
+def var_file_args(tf_dir):
+    path = tfvars_path(tf_dir)
+    return [f"-var-file={path.resolve()}"] if path.exists() else []
+
+
+def environment_state_path(tf_dir):
+    if ENVIRONMENT["name"]:
+        return Path(tf_dir) / "terraform.tfstate.d" / ENVIRONMENT["name"] / "terraform.tfstate"
+    return None
+
+
+def plan_path(tf_dir):
+    data_dir = f"{ENV_DIR_NAME}/{ENVIRONMENT['name']}" if ENVIRONMENT["name"] else ".terraform"
+    return (Path(tf_dir) / data_dir / PLAN_FILE).resolve()
+
+
+def init_stack(tf_dir, quiet=False, extra_args=()):
+    state_path = environment_state_path(tf_dir)
+    if state_path:
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+    call = run_capture if quiet else run
+    with INIT_LOCK:
+        call([get_terraform_exe(), f"-chdir={tf_dir}", "init", *extra_args])
+
+
+def acquire_environment_lock(lock_dir):
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    lock_path = lock_dir / "deploy.lock"
+    try:
+        handle = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        owner = lock_path.read_text(encoding="utf-8").strip() or "another run"
+        raise RuntimeError(f"Environment is locked by {owner} ({lock_path}). Remove the lock file if that run is gone.")
+    with os.fdopen(handle, "w", encoding="utf-8") as lock_file:
+        lock_file.write(f"pid {os.getpid()} since {datetime.now(timezone.utc).isoformat()}\n")
+    return lock_path
+
+
+def release_environment_lock(lock_path):
+    if lock_path:
+        Path(lock_path).unlink(missing_ok=True)
+
+
+def environment_dir(repo_root):
+    if ENVIRONMENT["name"]:
+        return repo_root / ".deploy" / ENVIRONMENT["name"]
+    return repo_root / ".deploy"
+
+
+def active_phases():
+    phases = getattr(_active, "phases", None)
+    if phases is None:
+        phases = []
+        _active.phases = phases
+    return phases
+
+
+def stack_name(tf_dir):
+    return Path(tf_dir).name if tf_dir else None
+
+
+def command_stack(cmd):
+    for arg in cmd:
+        if arg.startswith("-chdir="):
+            return stack_name(arg.split("=", 1)[1])
+    phases = active_phases()
+    return phases[-1]["stack"] if phases else None
+
+
+def command_label(cmd):
+    words = [arg for arg in cmd[1:] if not arg.startswith("-")]
+    return " ".join([Path(cmd[0]).stem] + words[:1])
+
+
+def elapsed():
+    return round(time.perf_counter() - TIMING["started"], 3)
+
+
+def execute(cmd, capture, allowed=(0,)):
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE if capture else None,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    stderr_tail = deque(maxlen=200)
+
+    def pump():
+        for line in proc.stderr:
+            sys.stderr.write(line)
+            stderr_tail.append(line)
+
+    reader = threading.Thread(target=pump, daemon=True)
+    reader.start()
+    stdout = proc.stdout.read() if capture else None
+    proc.wait()
+    reader.join()
+    if proc.returncode not in allowed:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr="".join(stderr_tail))
+    return proc.returncode, stdout
+
+
+def classify_failure(returncode, stderr):
+    if returncode in FATAL_RETURNCODES:
+        return None
+    for reason, pattern in RETRYABLE_PATTERNS:
+        if pattern.search(stderr or ""):
+            return reason
+    return None
+
+
+def backoff_delay(attempt):
+    ceiling = min(RETRY["max_s"], RETRY["base_s"] * 2 ** (attempt - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def configure_retries(attempts=None, budget=None, base_s=None, max_s=None):
+    for key, value in (("attempts", attempts), ("budget", budget), ("base_s", base_s), ("max_s", max_s)):
+        if value is not None:
+            RETRY[key] = value
+
+
+def timed_attempt(cmd, capture, display_cmd, attempt, allowed):
+    print("\n$ " + " ".join(display_cmd or cmd) + (f"  (attempt {attempt})" if attempt > 1 else ""))
+    phases = active_phases()
+    entry = {
+        "stack": command_stack(cmd),
+        "phase": phases[-1]["phase"] if phases else None,
+        "command": command_label(cmd),
+        "start_s": elapsed(),
+        "attempt": attempt,
+        "returncode": 0,
+    }
+    start = time.perf_counter()
+    try:
+        returncode, stdout = execute(cmd, capture, allowed)
+        entry["returncode"] = returncode
+        return returncode, stdout
+    except subprocess.CalledProcessError as exc:
+        entry["returncode"] = exc.returncode
+        entry["failure"] = classify_failure(exc.returncode, exc.stderr) or "fatal"
+        raise
+    except OSError:
+        entry["returncode"] = None
+        entry["failure"] = "fatal"
+        raise
+    finally:
+        entry["duration_s"] = round(time.perf_counter() - start, 3)
+        TIMING["commands"].append(entry)
+
+
+def timed_call(cmd, capture=False, display_cmd=None, allowed=(0,)):
+    attempt = 1
+    while True:
+        try:
+            return timed_attempt(cmd, capture, display_cmd, attempt, allowed)
+        except subprocess.CalledProcessError as exc:
+            reason = classify_failure(exc.returncode, exc.stderr)
+            stack = command_stack(cmd)
+            with RETRY_LOCK:
+                used = RETRY["used"].get(stack, 0)
+                retry = reason is not None and attempt < RETRY["attempts"] and used < RETRY["budget"]
+                if retry:
+                    RETRY["used"][stack] = used + 1
+            if not retry:
+                if reason is not None:
+                    print(f"Giving up on {command_label(cmd)} after {attempt} attempt(s) ({reason}; {used}/{RETRY['budget']} retries used for {stack or 'this run'}).")
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Retryable failure ({reason}) from {command_label(cmd)}; retrying in {delay:.1f}s (attempt {attempt + 1}/{RETRY['attempts']}).")
+            time.sleep(delay)
+            attempt += 1
+
+
+def run(cmd):
+    timed_call(cmd)
+
+
+def run_capture(cmd):
+    return timed_call(cmd, capture=True)[1].strip()
+
+
+def run_detailed(cmd, allowed):
+    returncode, stdout = timed_call(cmd, capture=True, allowed=allowed)
+    return returncode, stdout.strip()
+
+
+def run_capture_optional(cmd):
+    try:
+        return run_capture(cmd)
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def run_sensitive(cmd, redacted_indices):
+    display_cmd = cmd[:]
+    for index in redacted_indices:
+        if 0 <= index < len(display_cmd):
+            display_cmd[index] = "***"
+    timed_call(cmd, display_cmd=display_cmd)
+
+
+@contextmanager
+def phase(tf_dir, name):
+    entry = {"stack": stack_name(tf_dir), "phase": name, "start_s": elapsed(), "child_s": 0.0, "status": "ok"}
+    phases = active_phases()
+    phases.append(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except Exception:
+        entry["status"] = "failed"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        phases.pop()
+        if phases:
+            phases[-1]["child_s"] += duration
+        entry["duration_s"] = round(duration, 3)
+        entry["self_s"] = round(duration - entry.pop("child_s"), 3)
+        TIMING["phases"].append(entry)
+
+
+def timed_phase(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(tf_dir, *args, **kwargs):
+            with phase(tf_dir, name):
+                return func(tf_dir, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_timing(label, path, baseline=None):
+    TIMING["label"] = label
+    TIMING["path"] = Path(path) if path else None
+    TIMING["baseline"] = Path(baseline) if baseline else None
+
+
+def build_timing_report(status):
+    stacks = {}
+    for entry in TIMING["phases"]:
+        stack = stacks.setdefault(entry["stack"], {"phases": {}, "total_s": 0.0, "commands": 0})
+        stack["phases"][entry["phase"]] = round(stack["phases"].get(entry["phase"], 0.0) + entry["self_s"], 3)
+        stack["total_s"] = round(stack["total_s"] + entry["self_s"], 3)
+    for entry in TIMING["commands"]:
+        stack = stacks.setdefault(entry["stack"], {"phases": {}, "total_s": 0.0, "commands": 0})
+        stack["commands"] += 1
+    return {
+        "label": TIMING["label"],
+        "status": status,
+        "started_at": TIMING["started_at"],
+        "wall_s": elapsed(),
+        "retries": {str(stack): count for stack, count in RETRY["used"].items()},
+        "stacks": stacks,
+        "critical_path": critical_path(TIMING["commands"]),
+        "phases": TIMING["phases"],
+        "commands": TIMING["commands"],
+    }
+
+
+def critical_path(commands):
+    finished = [entry for entry in commands if "duration_s" in entry]
+    if not finished:
+        return []
+    end = lambda entry: entry["start_s"] + entry["duration_s"]
+    chain = [max(finished, key=end)]
+    while True:
+        earlier = [entry for entry in finished if end(entry) <= chain[-1]["start_s"] + 0.001 and entry is not chain[-1]]
+        if not earlier:
+            break
+        chain.append(max(earlier, key=end))
+    segments = []
+    for entry in reversed(chain):
+        if segments and segments[-1]["stack"] == entry["stack"]:
+            segment = segments[-1]
+        else:
+            segment = {"stack": entry["stack"], "start_s": entry["start_s"], "busy_s": 0.0, "commands": 0}
+            segments.append(segment)
+        segment["end_s"] = round(end(entry), 3)
+        segment["busy_s"] = round(segment["busy_s"] + entry["duration_s"], 3)
+        segment["commands"] += 1
+    return segments
+
+
+def format_seconds(value):
+    if value is None:
+        return "-"
+    return f"{value:.1f}s"
+
+
+def print_timing_report(report, baseline=None):
+    stacks = report["stacks"]
+    if not stacks:
+        return
+    phase_names = []
+    for entry in report["phases"]:
+        if entry["phase"] not in phase_names:
+            phase_names.append(entry["phase"])
+    headers = ["stack"] + phase_names + ["total", "cmds"]
+    if baseline:
+        headers.append("vs baseline")
+    rows = []
+    for name, stack in stacks.items():
+        row = [name or "-"]
+        row += [format_seconds(stack["phases"].get(phase_name)) for phase_name in phase_names]
+        row += [format_seconds(stack["total_s"]), str(stack["commands"])]
+        if baseline:
+            previous = baseline.get("stacks", {}).get(name)
+            row.append(f"{stack['total_s'] - previous['total_s']:+.1f}s" if previous else "new")
+        rows.append(row)
+    widths = [max(len(str(row[index])) for row in rows + [headers]) for index in range(len(headers))]
+    print(f"\nTiming summary ({report['label']}, {report['status']}):")
+    print(("  " + "  ".join(header.ljust(width) for header, width in zip(headers, widths))).rstrip())
+    for row in rows:
+        print(("  " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths))).rstrip())
+
+    wall = report["wall_s"] or 0.0
+    path = report.get("critical_path") or []
+    busy = sum(segment["busy_s"] for segment in path)
+    print(f"\nCritical path ({format_seconds(wall)} wall clock, {format_seconds(busy)} in commands on the path):")
+    for segment in path:
+        share = segment["busy_s"] / wall * 100 if wall else 0.0
+        span = f"{format_seconds(segment['start_s'])} -> {format_seconds(segment['end_s'])}"
+        print(f"  {segment['stack'] or '-':<20} {span:>17} {format_seconds(segment['busy_s']):>9} {share:5.1f}%  ({segment['commands']} cmds)")
+    print(f"  {'between commands':<20} {'':>17} {format_seconds(max(wall - busy, 0.0)):>9}")
+    slowest = sorted(report["phases"], key=lambda entry: entry["self_s"], reverse=True)[:5]
+    print("Slowest steps:")
+    for entry in slowest:
+        print(f"  {entry['stack'] or '-'}/{entry['phase']}: {format_seconds(entry['self_s'])}")
+
+
+def finish_timing():
+    if TIMING["path"] is None:
+        return
+    error = sys.exc_info()[1]
+    failed = error is not None and not (isinstance(error, SystemExit) and error.code in (0, None))
+    report = build_timing_report("failed" if failed else "ok")
+    baseline = None
+    if TIMING["baseline"] and TIMING["baseline"].exists():
+        try:
+            baseline = json.loads(TIMING["baseline"].read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            baseline = None
+    print_timing_report(report, baseline)
+    TIMING["path"].parent.mkdir(parents=True, exist_ok=True)
+    TIMING["path"].write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Timing report written to {TIMING['path']}")
+
+
+def default_timing_path(repo_root, label):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return repo_root / ".timings" / f"{label}-{stamp}.json"
@@ -0,0 +1,41 @@
+import math
+
+from stacks import PROFILE, nat_public_ip_settings
+
+SNAT_PORTS_PER_IP = 64512
+SNAT_PORT_HOLD_S = 65
+
+
+def nat_address_count(public_ip_count, prefix_length):
+    return public_ip_count + (2 ** (32 - prefix_length) if prefix_length else 0)
+
+
+def snat_estimate(concurrency, connection_rate=0.0, destinations=1, headroom=1.25):
+    flows = concurrency + connection_rate * SNAT_PORT_HOLD_S
+    ports = math.ceil(flows / max(destinations, 1) * headroom)
+    return {
+        "flows": math.ceil(flows),
+        "ports_per_destination": ports,
+        "required_addresses": max(math.ceil(ports / SNAT_PORTS_PER_IP), 1),
+    }
+
+
+def print_snat_estimate(concurrency, connection_rate, destinations, headroom):
+    estimate = snat_estimate(concurrency, connection_rate, destinations, headroom)
+    public_ip_count, prefix_length = nat_public_ip_settings()
+    addresses = nat_address_count(public_ip_count, prefix_length)
+    capacity = addresses * SNAT_PORTS_PER_IP
+    prefix = f" + /{prefix_length} prefix" if prefix_length else ""
+    print(f"SNAT estimate (profile {PROFILE['name']}):")
+    print(f"  outbound flows        {concurrency} concurrent + {connection_rate:g}/s x {SNAT_PORT_HOLD_S}s port hold = {estimate['flows']}")
+    print(f"  ports per destination {estimate['ports_per_destination']} ({destinations} destination(s), x{headroom:g} headroom)")
+    print(f"  required addresses    {estimate['required_addresses']} ({SNAT_PORTS_PER_IP} ports each)")
+    print(f"  configured            {public_ip_count} IP(s){prefix} = {addresses} address(es), {capacity} ports per destination")
+    if estimate["required_addresses"] > 16:
+        print("  status                exceeds one NAT gateway (16 addresses); spread the flows over more destinations or subnets")
+        return False
+    if estimate["required_addresses"] > addresses:
+        print(f"  status                insufficient: set NAT_PUBLIC_IP_COUNT={estimate['required_addresses']} or use a profile with more NAT addresses")
+        return False
+    print(f"  status                ok ({capacity / estimate['ports_per_destination']:.1f}x the estimated ports)")
+    return True
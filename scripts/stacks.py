@@ -0,0 +1,1012 @@
+import json
+import os
+import secrets
+import string
+from pathlib import Path
+
+from journal import step_outputs
+from runner import (
+    AUTO_TFVARS,
+    DEFAULT_TFVARS,
+    ENVIRONMENT,
+    environment_state_path,
+    get_az_exe,
+    get_terraform_exe,
+    legacy_tfvars_path,
+    run_capture_optional,
+    tfvars_path,
+    timed_phase,
+)
+
+DEFAULTS = {
+    "resource_group_name_prefix": "rg-vnet",
+    "location": "eastus2",
+    "vnet_name_prefix": "vnet-main",
+    "vnet_address_space": ["10.10.0.0/16"],
+    "subnet_name_prefix": "snet",
+    "subnet_cidrs": {
+        "web": "10.10.1.0/24",
+        "app": "10.10.2.0/24",
+        "db": "10.10.3.0/24",
+    },
+    "nsg_name_prefix": "nsg",
+    "nat_gateway_name_prefix": "nat-vnet",
+    "nat_public_ip_name_prefix": "pip-nat",
+    "nat_public_ip_sku": "Standard",
+    "nat_gateway_sku": "Standard",
+    "nat_idle_timeout_in_minutes": 10,
+    "nat_public_ip_count": 1,
+    "nat_public_ip_prefix_length": None,
+    "nat_public_ip_prefix_name_prefix": "ippre-nat",
+    "nat_snat_failure_alert_threshold": None,
+    "nat_subnet_keys": ["app", "web"],
+    "app_lb_name_prefix": "lb-app",
+    "app_lb_sku": "Standard",
+    "app_port": 8080,
+    "app_probe_path": "/health",
+    "app_lb_probe_interval_in_seconds": 15,
+    "app_lb_probe_threshold": 1,
+    "app_lb_idle_timeout_in_minutes": 4,
+    "app_lb_enable_tcp_reset": False,
+    "app_lb_load_distribution": "Default",
+    "app_vm_name_prefix": "vm-app",
+    "app_nic_name_prefix": "nic-app",
+    "app_vm_size": "Standard_D2s_v3",
+    "app_admin_username": "azureuser",
+    "app_subnet_key": "app",
+    "app_accelerated_networking_enabled": False,
+    "app_vm_zone": None,
+    "app_proximity_placement_group_enabled": False,
+    "proximity_placement_group_name_prefix": "ppg-vnet",
+    "sql_server_name_prefix": "sql-vnet",
+    "sql_admin_login": "sqladmin",
+    "sql_database_name": "vnet-demo",
+    "sql_database_sku_name": "GP_S_Gen5_1",
+    "sql_max_size_gb": 1,
+    "sql_min_capacity": 0.5,
+    "sql_auto_pause_delay_in_minutes": 60,
+    "sql_public_network_access_enabled": True,
+    "sql_zone_redundant": False,
+    "sql_allow_azure_services": True,
+    "sql_private_dns_zone_name": "privatelink.database.windows.net",
+    "sql_private_endpoint_name_prefix": "pe-sql",
+    "sql_private_dns_zone_link_name_prefix": "link-sql",
+    "sql_private_dns_zone_group_name": "sql-dns",
+    "sql_subnet_key": "db",
+    "lb_name_prefix": "lb-public",
+    "public_ip_name_prefix": "pip-lb",
+    "lb_sku": "Standard",
+    "public_ip_sku": "Standard",
+    "frontend_port": 80,
+    "backend_port": 80,
+    "probe_path": "/health",
+    "lb_probe_interval_in_seconds": 15,
+    "lb_probe_threshold": 1,
+    "lb_idle_timeout_in_minutes": 4,
+    "lb_enable_tcp_reset": False,
+    "lb_load_distribution": "Default",
+    "lb_outbound_rule_enabled": False,
+    "lb_outbound_ports_per_instance": 1024,
+    "lb_outbound_idle_timeout_in_minutes": 4,
+    "vm_name_prefix": "vm-web",
+    "nic_name_prefix": "nic-web",
+    "vm_size": "Standard_D2s_v3",
+    "admin_username": "azureuser",
+    "accelerated_networking_enabled": False,
+    "vm_zone": None,
+    "join_app_proximity_placement_group": False,
+    "trace_exporter": "jsonl",
+    "trace_sample_rate": 0.1,
+    "probe_interval_seconds": 30,
+    "app_dns_cache_ttl_seconds": 30,
+    "app_changes_poll_interval_seconds": 2,
+    "app_search_refresh_seconds": 5,
+    "single_flight_max_wait_seconds": 5.0,
+    "admission_max_concurrency": 32,
+    "admission_target_latency_ms": 1000,
+    "events_poll_interval_seconds": 5,
+    "events_max_clients": 100,
+    "tags": {
+        "project": "vnets-subnets",
+        "env": "dev",
+        "owner": "unknown",
+    },
+}
+
+
+PROFILES = {
+    "default": {},
+    "dev": {
+        "vm_size": "Standard_B2s",
+        "app_vm_size": "Standard_B2s",
+        "sql_database_sku_name": "GP_S_Gen5_1",
+        "sql_min_capacity": 0.5,
+        "sql_max_size_gb": 1,
+        "sql_auto_pause_delay_in_minutes": 60,
+        "nat_idle_timeout_in_minutes": 10,
+    },
+    "loadtest": {
+        "extends": "dev",
+        "vm_size": "Standard_D4s_v5",
+        "app_vm_size": "Standard_D4s_v5",
+        "sql_database_sku_name": "GP_S_Gen5_4",
+        "sql_min_capacity": 1.0,
+        "sql_max_size_gb": 32,
+        "sql_auto_pause_delay_in_minutes": -1,
+        "nat_idle_timeout_in_minutes": 4,
+        "nat_public_ip_count": 2,
+        "nat_snat_failure_alert_threshold": 0,
+        "app_lb_probe_interval_in_seconds": 5,
+        "app_lb_probe_threshold": 2,
+        "app_lb_enable_tcp_reset": True,
+        "lb_probe_interval_in_seconds": 5,
+        "lb_probe_threshold": 2,
+        "lb_enable_tcp_reset": True,
+        "app_accelerated_networking_enabled": True,
+        "app_proximity_placement_group_enabled": True,
+        "accelerated_networking_enabled": True,
+        "join_app_proximity_placement_group": True,
+        "admission_max_concurrency": 64,
+        "trace_sample_rate": 0.01,
+    },
+    "prod": {
+        "extends": "loadtest",
+        "sql_database_sku_name": "GP_S_Gen5_8",
+        "sql_min_capacity": 2.0,
+        "sql_max_size_gb": 64,
+        "sql_zone_redundant": True,
+        "nat_public_ip_count": 1,
+        "nat_public_ip_prefix_length": 30,
+        "app_lb_idle_timeout_in_minutes": 10,
+        "app_vm_zone": "1",
+        "trace_sample_rate": 0.05,
+    },
+}
+
+PROFILE = {
+    "name": "default",
+    "settings": dict(DEFAULTS),
+}
+
+STACK_DEPENDENCIES = {
+    "02_vnet": {"required": ["01_resource_group"]},
+    "03_subnets": {"required": ["01_resource_group", "02_vnet"]},
+    "04_nsg": {"required": ["01_resource_group", "03_subnets"]},
+    "05_private_sql": {"required": ["01_resource_group", "02_vnet", "03_subnets"]},
+    "06_nat_gateway": {"required": ["01_resource_group", "03_subnets"]},
+    "07_app_tier": {"required": ["01_resource_group", "03_subnets"], "optional": ["05_private_sql"]},
+    "08_load_balancer": {"required": ["01_resource_group"]},
+    "09_compute_web": {"required": ["01_resource_group", "03_subnets", "08_load_balancer"], "optional": ["07_app_tier"]},
+}
+
+MODEL = {
+    "tfvars": {},
+    "outputs": {},
+}
+
+
+def resolve_profile(name, chain=()):
+    if name not in PROFILES:
+        raise RuntimeError(f"Unknown profile '{name}'. Available profiles: {', '.join(sorted(PROFILES))}.")
+    if name in chain:
+        raise RuntimeError(f"Profile inheritance loop: {' -> '.join(chain + (name,))}.")
+    profile = PROFILES[name]
+    settings = resolve_profile(profile["extends"], chain + (name,)) if "extends" in profile else dict(DEFAULTS)
+    for key, value in profile.items():
+        if key == "extends":
+            continue
+        if key not in DEFAULTS:
+            raise RuntimeError(f"Profile '{name}' sets unknown setting '{key}'.")
+        expected = type(DEFAULTS[key])
+        if DEFAULTS[key] is not None and type(value) is not expected and not (expected is float and type(value) is int):
+            raise RuntimeError(f"Profile '{name}' sets '{key}' to {value!r}; expected {expected.__name__}.")
+        settings[key] = value
+    return settings
+
+
+def configure_profile(name):
+    PROFILE["name"] = name or "default"
+    PROFILE["settings"] = resolve_profile(PROFILE["name"])
+
+
+def select_profile(name, state_dir):
+    path = Path(state_dir) / "profile"
+    name = name or os.environ.get("DEPLOY_PROFILE")
+    if not name and path.exists():
+        name = path.read_text(encoding="utf-8").strip()
+    configure_profile(name)
+    if name:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(PROFILE["name"] + "\n", encoding="utf-8")
+    return PROFILE["name"]
+
+
+def setting(key):
+    return PROFILE["settings"][key]
+
+
+def parse_legacy_tfvars(path):
+    values = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#") or "=" not in stripped:
+            continue
+        name, value = (part.strip() for part in stripped.split("=", 1))
+        if name in values:
+            continue
+        if value == "null":
+            values[name] = None
+        elif value.startswith("\"") and value.endswith("\""):
+            values[name] = value[1:-1].replace("\\\"", "\"")
+        else:
+            values[name] = value
+    return values
+
+
+def retire_auto_tfvars(tf_dir):
+    auto_path = Path(tf_dir) / AUTO_TFVARS
+    if not auto_path.exists():
+        return
+    target = Path(tf_dir) / DEFAULT_TFVARS
+    if target.exists():
+        target = auto_path.with_name(f"{AUTO_TFVARS}.migrated")
+    try:
+        auto_path.replace(target)
+    except FileNotFoundError:
+        return
+    print(f"Renamed {auto_path} to {target.name} so Terraform no longer loads it into every environment.")
+
+
+def load_tfvars(tf_dir):
+    path = tfvars_path(tf_dir)
+    if path not in MODEL["tfvars"]:
+        retire_auto_tfvars(tf_dir)
+        legacy_path = legacy_tfvars_path(tf_dir)
+        if path.exists():
+            try:
+                MODEL["tfvars"][path] = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError as exc:
+                raise RuntimeError(f"Unreadable tfvars file {path}: {exc}")
+        elif legacy_path.exists():
+            MODEL["tfvars"][path] = parse_legacy_tfvars(legacy_path)
+        else:
+            MODEL["tfvars"][path] = {}
+    return MODEL["tfvars"][path]
+
+
+def tfvars_value(tf_dir, key):
+    return load_tfvars(tf_dir).get(key)
+
+
+def write_tfvars(tf_dir, items):
+    path = tfvars_path(tf_dir)
+    values = dict(items)
+    retire_auto_tfvars(tf_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(values, indent=2) + "\n", encoding="utf-8")
+    MODEL["tfvars"][path] = values
+    legacy_path = legacy_tfvars_path(tf_dir)
+    if legacy_path.exists():
+        legacy_path.replace(legacy_path.with_name("terraform.tfvars.migrated"))
+        print(f"Migrated {legacy_path} to {path.name}; the old file was kept as terraform.tfvars.migrated.")
+
+
+def format_output(value):
+    if value is None or value == "null":
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def current_workspace(tf_dir):
+    if os.environ.get("TF_WORKSPACE"):
+        return os.environ["TF_WORKSPACE"]
+    environment_file = Path(tf_dir) / os.environ.get("TF_DATA_DIR", ".terraform") / "environment"
+    if environment_file.exists():
+        return environment_file.read_text(encoding="utf-8").strip() or "default"
+    return "default"
+
+
+def get_tfstate_path(tf_dir):
+    environment_state = environment_state_path(tf_dir)
+    if environment_state:
+        return environment_state if environment_state.exists() else None
+    workspace = current_workspace(tf_dir)
+    if workspace != "default":
+        workspace_state = tf_dir / "terraform.tfstate.d" / workspace / "terraform.tfstate"
+        if workspace_state.exists():
+            return workspace_state
+    default_state = tf_dir / "terraform.tfstate"
+    if default_state.exists():
+        return default_state
+    return None
+
+
+def read_state_outputs(tf_dir):
+    state_path = get_tfstate_path(tf_dir)
+    if not state_path:
+        return {}
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return {}
+    return {name: item.get("value") for name, item in state.get("outputs", {}).items()}
+
+
+@timed_phase("outputs")
+def read_terraform_outputs(tf_dir):
+    output = run_capture_optional([get_terraform_exe(), f"-chdir={tf_dir}", "output", "-json"])
+    try:
+        return {name: item.get("value") for name, item in json.loads(output or "").items()}
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def stack_outputs(tf_dir):
+    if tf_dir not in MODEL["outputs"]:
+        outputs = step_outputs(tf_dir.name)
+        if outputs is None:
+            outputs = read_terraform_outputs(tf_dir)
+        if outputs is None:
+            outputs = read_state_outputs(tf_dir)
+        MODEL["outputs"][tf_dir] = outputs
+    return MODEL["outputs"][tf_dir]
+
+
+def refresh_outputs(tf_dir):
+    outputs = read_terraform_outputs(tf_dir)
+    if outputs is None:
+        MODEL["outputs"].pop(tf_dir, None)
+    else:
+        MODEL["outputs"][tf_dir] = outputs
+    return outputs
+
+
+def forget_outputs(tf_dir):
+    MODEL["outputs"].pop(tf_dir, None)
+
+
+def get_output_optional(tf_dir, output_name):
+    return format_output(stack_outputs(tf_dir).get(output_name))
+
+
+def get_output(tf_dir, output_name):
+    value = get_output_optional(tf_dir, output_name)
+    if value is None:
+        raise RuntimeError(f"Terraform output '{output_name}' not found in {tf_dir}.")
+    return value
+
+
+def remote_state_items(tf_dir):
+    return [
+        ("remote_state_root", str(Path(tf_dir).resolve().parent)),
+        ("remote_state_workspace", ENVIRONMENT["name"] or "default"),
+    ]
+
+
+def upstream_stacks(tf_dir):
+    dependencies = STACK_DEPENDENCIES.get(Path(tf_dir).name, {})
+    return [Path(tf_dir).parent / name for name in dependencies.get("required", []) + dependencies.get("optional", [])]
+
+
+def upstream_outputs(tf_dir):
+    return {upstream.name: stack_outputs(upstream) for upstream in upstream_stacks(tf_dir)}
+
+
+def missing_upstream(tf_dir):
+    required = STACK_DEPENDENCIES.get(Path(tf_dir).name, {}).get("required", [])
+    return [name for name in required if not stack_outputs(Path(tf_dir).parent / name)]
+
+
+def resolve_signed_in_user():
+    if "signed_in_user" in MODEL:
+        return MODEL["signed_in_user"]
+    az_exe = get_az_exe()
+    user_login = run_capture_optional([
+        az_exe,
+        "account",
+        "show",
+        "--query",
+        "user.name",
+        "-o",
+        "tsv",
+    ])
+    user_object_id = run_capture_optional([
+        az_exe,
+        "ad",
+        "signed-in-user",
+        "show",
+        "--query",
+        "id",
+        "-o",
+        "tsv",
+    ])
+    MODEL["signed_in_user"] = (user_login or None, user_object_id or None)
+    return MODEL["signed_in_user"]
+
+
+def parse_csv(value, fallback):
+    if not value:
+        return fallback
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_bool(value, fallback):
+    if value is None:
+        return fallback
+    normalized = value.strip().lower()
+    if normalized in ("1", "true", "yes", "y", "on"):
+        return True
+    if normalized in ("0", "false", "no", "n", "off"):
+        return False
+    return fallback
+
+
+def parse_int(value, fallback):
+    if value is None:
+        return fallback
+    try:
+        return int(value)
+    except ValueError:
+        return fallback
+
+
+def parse_float(value, fallback):
+    if value is None:
+        return fallback
+    try:
+        return float(value)
+    except ValueError:
+        return fallback
+
+
+def load_env_file(path):
+    if not path.exists():
+        return
+    for line in path.read_text(encoding="utf-8").splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#") or "=" not in stripped:
+            continue
+        key, value = stripped.split("=", 1)
+        key = key.strip()
+        value = value.strip()
+        if key and key not in os.environ:
+            os.environ[key] = value
+
+
+def resolve_tags():
+    tags = dict(setting("tags"))
+    project = os.environ.get("TAG_PROJECT")
+    env_name = os.environ.get("TAG_ENV")
+    owner = os.environ.get("TAG_OWNER")
+    if project:
+        tags["project"] = project
+    if env_name:
+        tags["env"] = env_name
+    if owner:
+        tags["owner"] = owner
+    return tags
+
+
+def generate_password(length=20):
+    symbols = "!@#$%^&*_-+=?"
+    alphabet = string.ascii_letters + string.digits + symbols
+    while True:
+        password = "".join(secrets.choice(alphabet) for _ in range(length))
+        if (
+            any(char.islower() for char in password)
+            and any(char.isupper() for char in password)
+            and any(char.isdigit() for char in password)
+            and any(char in symbols for char in password)
+        ):
+            return password
+
+
+def get_vm_admin_password(vm_dir, allow_generate=True):
+    env_password = os.environ.get("VM_ADMIN_PASSWORD")
+    if env_password:
+        return env_password, False
+    existing = tfvars_value(vm_dir, "admin_password")
+    if existing:
+        return existing, False
+    if allow_generate:
+        return generate_password(), True
+    raise RuntimeError("VM admin password not found. Set VM_ADMIN_PASSWORD.")
+
+
+def get_app_admin_password(app_dir, allow_generate=True):
+    env_password = os.environ.get("APP_VM_ADMIN_PASSWORD")
+    if env_password:
+        return env_password, False
+    existing = tfvars_value(app_dir, "admin_password")
+    if existing:
+        return existing, False
+    if allow_generate:
+        return generate_password(), True
+    raise RuntimeError("App VM admin password not found. Set APP_VM_ADMIN_PASSWORD.")
+
+
+def get_sql_admin_password(sql_dir, allow_generate=True):
+    env_password = os.environ.get("SQL_ADMIN_PASSWORD")
+    if env_password:
+        return env_password, False
+    existing = tfvars_value(sql_dir, "sql_admin_password")
+    if existing:
+        return existing, False
+    if allow_generate:
+        return generate_password(), True
+    raise RuntimeError("SQL admin password not found. Set SQL_ADMIN_PASSWORD.")
+
+
+def get_sql_admin_login(sql_dir):
+    env_login = os.environ.get("SQL_ADMIN_LOGIN")
+    if env_login:
+        return env_login
+    existing = tfvars_value(sql_dir, "sql_admin_login")
+    if existing:
+        return existing
+    return setting("sql_admin_login")
+
+
+def get_sql_client_ip(sql_dir):
+    env_ip = os.environ.get("SQL_CLIENT_IP_ADDRESS")
+    if env_ip:
+        return env_ip
+    return tfvars_value(sql_dir, "client_ip_address")
+
+
+def get_sql_azuread_admin_login(sql_dir):
+    env_login = os.environ.get("AZUREAD_ADMIN_LOGIN")
+    if env_login:
+        return env_login
+    existing = tfvars_value(sql_dir, "azuread_admin_login")
+    if existing:
+        return existing
+    user_login, _ = resolve_signed_in_user()
+    return user_login
+
+
+def get_sql_azuread_admin_object_id(sql_dir):
+    env_object_id = os.environ.get("AZUREAD_ADMIN_OBJECT_ID")
+    if env_object_id:
+        return env_object_id
+    existing = tfvars_value(sql_dir, "azuread_admin_object_id")
+    if existing:
+        return existing
+    _, user_object_id = resolve_signed_in_user()
+    return user_object_id
+
+
+@timed_phase("tfvars")
+def write_rg_tfvars(rg_dir):
+    resource_group_name = os.environ.get("RESOURCE_GROUP_NAME")
+    resource_group_name_prefix = os.environ.get("RESOURCE_GROUP_NAME_PREFIX", setting("resource_group_name_prefix"))
+    location = os.environ.get("LOCATION", setting("location"))
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", resource_group_name),
+        ("resource_group_name_prefix", resource_group_name_prefix),
+        ("location", location),
+        ("tags", tags),
+    ]
+    write_tfvars(rg_dir, items)
+
+
+@timed_phase("tfvars")
+def write_vnet_tfvars(vnet_dir):
+    location = os.environ.get("LOCATION", setting("location"))
+    vnet_name = os.environ.get("VNET_NAME")
+    vnet_name_prefix = os.environ.get("VNET_NAME_PREFIX", setting("vnet_name_prefix"))
+    address_space = parse_csv(os.environ.get("VNET_ADDRESS_SPACE"), setting("vnet_address_space"))
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("vnet_name", vnet_name),
+        ("vnet_name_prefix", vnet_name_prefix),
+        ("address_space", address_space),
+        ("tags", tags),
+        *remote_state_items(vnet_dir),
+    ]
+    write_tfvars(vnet_dir, items)
+
+
+@timed_phase("tfvars")
+def write_subnet_tfvars(subnet_dir):
+    subnet_name_prefix = os.environ.get("SUBNET_NAME_PREFIX", setting("subnet_name_prefix"))
+    subnet_name_suffix = os.environ.get("SUBNET_NAME_SUFFIX")
+    subnet_cidrs = dict(setting("subnet_cidrs"))
+    subnet_cidrs["web"] = os.environ.get("SUBNET_WEB_CIDR", subnet_cidrs["web"])
+    subnet_cidrs["app"] = os.environ.get("SUBNET_APP_CIDR", subnet_cidrs["app"])
+    subnet_cidrs["db"] = os.environ.get("SUBNET_DB_CIDR", subnet_cidrs["db"])
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("virtual_network_name", os.environ.get("VNET_NAME")),
+        ("subnet_name_prefix", subnet_name_prefix),
+        ("subnet_name_suffix", subnet_name_suffix),
+        ("subnet_cidrs", subnet_cidrs),
+        *remote_state_items(subnet_dir),
+    ]
+    write_tfvars(subnet_dir, items)
+
+
+@timed_phase("tfvars")
+def write_nsg_tfvars(nsg_dir):
+    location = os.environ.get("LOCATION", setting("location"))
+    subnet_cidrs = dict(setting("subnet_cidrs"))
+    subnet_cidrs["web"] = os.environ.get("SUBNET_WEB_CIDR", subnet_cidrs["web"])
+    subnet_cidrs["app"] = os.environ.get("SUBNET_APP_CIDR", subnet_cidrs["app"])
+    subnet_cidrs["db"] = os.environ.get("SUBNET_DB_CIDR", subnet_cidrs["db"])
+    nsg_name_prefix = os.environ.get("NSG_NAME_PREFIX", setting("nsg_name_prefix"))
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("subnet_cidrs", subnet_cidrs),
+        ("nsg_name_prefix", nsg_name_prefix),
+        ("tags", tags),
+        *remote_state_items(nsg_dir),
+    ]
+    write_tfvars(nsg_dir, items)
+
+
+def nat_public_ip_settings():
+    public_ip_count = parse_int(os.environ.get("NAT_PUBLIC_IP_COUNT"), setting("nat_public_ip_count"))
+    public_ip_prefix_length = parse_int(
+        os.environ.get("NAT_PUBLIC_IP_PREFIX_LENGTH"),
+        setting("nat_public_ip_prefix_length"),
+    )
+    return public_ip_count, public_ip_prefix_length
+
+
+@timed_phase("tfvars")
+def write_nat_tfvars(nat_dir):
+    location = os.environ.get("LOCATION", setting("location"))
+    nat_gateway_name = os.environ.get("NAT_GATEWAY_NAME")
+    nat_gateway_name_prefix = os.environ.get("NAT_GATEWAY_NAME_PREFIX", setting("nat_gateway_name_prefix"))
+    public_ip_name = os.environ.get("NAT_PUBLIC_IP_NAME")
+    public_ip_name_prefix = os.environ.get("NAT_PUBLIC_IP_NAME_PREFIX", setting("nat_public_ip_name_prefix"))
+    public_ip_sku = os.environ.get("NAT_PUBLIC_IP_SKU", setting("nat_public_ip_sku"))
+    nat_gateway_sku = os.environ.get("NAT_GATEWAY_SKU", setting("nat_gateway_sku"))
+    idle_timeout = parse_int(
+        os.environ.get("NAT_IDLE_TIMEOUT_IN_MINUTES"),
+        setting("nat_idle_timeout_in_minutes"),
+    )
+    public_ip_count, public_ip_prefix_length = nat_public_ip_settings()
+    public_ip_prefix_name_prefix = os.environ.get(
+        "NAT_PUBLIC_IP_PREFIX_NAME_PREFIX",
+        setting("nat_public_ip_prefix_name_prefix"),
+    )
+    snat_failure_alert_threshold = parse_int(
+        os.environ.get("NAT_SNAT_FAILURE_ALERT_THRESHOLD"),
+        setting("nat_snat_failure_alert_threshold"),
+    )
+    subnet_keys = parse_csv(os.environ.get("NAT_SUBNET_KEYS"), setting("nat_subnet_keys"))
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("nat_gateway_name", nat_gateway_name),
+        ("nat_gateway_name_prefix", nat_gateway_name_prefix),
+        ("public_ip_name", public_ip_name),
+        ("public_ip_name_prefix", public_ip_name_prefix),
+        ("public_ip_sku", public_ip_sku),
+        ("public_ip_count", public_ip_count),
+        ("public_ip_prefix_length", public_ip_prefix_length),
+        ("public_ip_prefix_name_prefix", public_ip_prefix_name_prefix),
+        ("snat_failure_alert_threshold", snat_failure_alert_threshold),
+        ("nat_gateway_sku", nat_gateway_sku),
+        ("idle_timeout_in_minutes", idle_timeout),
+        ("subnet_keys", subnet_keys),
+        ("tags", tags),
+        *remote_state_items(nat_dir),
+    ]
+    write_tfvars(nat_dir, items)
+
+
+def lb_tuning_items(env_prefix, setting_prefix):
+    return [
+        ("lb_probe_interval_in_seconds", parse_int(
+            os.environ.get(f"{env_prefix}_PROBE_INTERVAL_IN_SECONDS"),
+            setting(f"{setting_prefix}_probe_interval_in_seconds"),
+        )),
+        ("lb_probe_threshold", parse_int(
+            os.environ.get(f"{env_prefix}_PROBE_THRESHOLD"),
+            setting(f"{setting_prefix}_probe_threshold"),
+        )),
+        ("lb_idle_timeout_in_minutes", parse_int(
+            os.environ.get(f"{env_prefix}_IDLE_TIMEOUT_IN_MINUTES"),
+            setting(f"{setting_prefix}_idle_timeout_in_minutes"),
+        )),
+        ("lb_enable_tcp_reset", parse_bool(
+            os.environ.get(f"{env_prefix}_ENABLE_TCP_RESET"),
+            setting(f"{setting_prefix}_enable_tcp_reset"),
+        )),
+        ("lb_load_distribution", os.environ.get(
+            f"{env_prefix}_LOAD_DISTRIBUTION",
+            setting(f"{setting_prefix}_load_distribution"),
+        )),
+    ]
+
+
+@timed_phase("tfvars")
+def write_app_tfvars(app_dir, sql_dir=None, allow_generate=True):
+    location = os.environ.get("LOCATION", setting("location"))
+    app_port = parse_int(os.environ.get("APP_PORT"), setting("app_port"))
+    probe_path = os.environ.get("APP_PROBE_PATH", setting("app_probe_path"))
+    lb_name = os.environ.get("APP_LB_NAME")
+    lb_name_prefix = os.environ.get("APP_LB_NAME_PREFIX", setting("app_lb_name_prefix"))
+    lb_sku = os.environ.get("APP_LB_SKU", setting("app_lb_sku"))
+    lb_settings = lb_tuning_items("APP_LB", "app_lb")
+    vm_name = os.environ.get("APP_VM_NAME")
+    vm_name_prefix = os.environ.get("APP_VM_NAME_PREFIX", setting("app_vm_name_prefix"))
+    nic_name_prefix = os.environ.get("APP_NIC_NAME_PREFIX", setting("app_nic_name_prefix"))
+    vm_size = os.environ.get("APP_VM_SIZE", setting("app_vm_size"))
+    admin_username = os.environ.get("APP_VM_ADMIN_USERNAME", setting("app_admin_username"))
+    accelerated_networking = parse_bool(
+        os.environ.get("APP_ACCELERATED_NETWORKING_ENABLED"),
+        setting("app_accelerated_networking_enabled"),
+    )
+    zone = os.environ.get("APP_VM_ZONE", setting("app_vm_zone"))
+    proximity_placement_group = parse_bool(
+        os.environ.get("APP_PROXIMITY_PLACEMENT_GROUP_ENABLED"),
+        setting("app_proximity_placement_group_enabled"),
+    )
+    proximity_placement_group_name_prefix = os.environ.get(
+        "PROXIMITY_PLACEMENT_GROUP_NAME_PREFIX",
+        setting("proximity_placement_group_name_prefix"),
+    )
+    trace_exporter = os.environ.get("TRACE_EXPORTER", setting("trace_exporter"))
+    trace_sample_rate = parse_float(os.environ.get("TRACE_SAMPLE_RATE"), setting("trace_sample_rate"))
+    subnet_key = os.environ.get("APP_SUBNET_KEY", setting("app_subnet_key"))
+    probe_interval_seconds = parse_int(os.environ.get("PROBE_INTERVAL_SECONDS"), setting("probe_interval_seconds"))
+    dns_cache_ttl_seconds = parse_int(os.environ.get("DNS_CACHE_TTL_SECONDS"), setting("app_dns_cache_ttl_seconds"))
+    single_flight_max_wait_seconds = parse_float(
+        os.environ.get("SINGLE_FLIGHT_MAX_WAIT_SECONDS"),
+        setting("single_flight_max_wait_seconds"),
+    )
+    admission_max_concurrency = parse_int(os.environ.get("ADMISSION_MAX_CONCURRENCY"), setting("admission_max_concurrency"))
+    admission_target_latency_ms = parse_int(
+        os.environ.get("ADMISSION_TARGET_LATENCY_MS"),
+        setting("admission_target_latency_ms"),
+    )
+    changes_poll_interval_seconds = parse_int(
+        os.environ.get("CHANGES_POLL_INTERVAL_SECONDS"),
+        setting("app_changes_poll_interval_seconds"),
+    )
+    search_refresh_seconds = parse_int(os.environ.get("SEARCH_REFRESH_SECONDS"), setting("app_search_refresh_seconds"))
+    admin_password, generated = get_app_admin_password(app_dir, allow_generate)
+    sql_admin_login = get_sql_admin_login(sql_dir) if sql_dir else None
+    sql_admin_password = None
+    if sql_dir:
+        try:
+            sql_admin_password, _ = get_sql_admin_password(sql_dir, allow_generate=False)
+        except RuntimeError:
+            sql_admin_password = None
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("subnet_key", subnet_key),
+        ("app_port", app_port),
+        ("probe_path", probe_path),
+        ("lb_name", lb_name),
+        ("lb_name_prefix", lb_name_prefix),
+        ("lb_sku", lb_sku),
+        *lb_settings,
+        ("vm_name", vm_name),
+        ("vm_name_prefix", vm_name_prefix),
+        ("nic_name_prefix", nic_name_prefix),
+        ("vm_size", vm_size),
+        ("admin_username", admin_username),
+        ("admin_password", admin_password),
+        ("accelerated_networking_enabled", accelerated_networking),
+        ("zone", zone),
+        ("proximity_placement_group_enabled", proximity_placement_group),
+        ("proximity_placement_group_name_prefix", proximity_placement_group_name_prefix),
+        ("sql_admin_login", sql_admin_login),
+        ("sql_admin_password", sql_admin_password),
+        ("trace_exporter", trace_exporter),
+        ("trace_sample_rate", trace_sample_rate),
+        ("probe_interval_seconds", probe_interval_seconds),
+        ("dns_cache_ttl_seconds", dns_cache_ttl_seconds),
+        ("single_flight_max_wait_seconds", single_flight_max_wait_seconds),
+        ("admission_max_concurrency", admission_max_concurrency),
+        ("admission_target_latency_ms", admission_target_latency_ms),
+        ("changes_poll_interval_seconds", changes_poll_interval_seconds),
+        ("search_refresh_seconds", search_refresh_seconds),
+        ("tags", tags),
+        *remote_state_items(app_dir),
+    ]
+    write_tfvars(app_dir, items)
+    if generated:
+        print(f"Generated app VM admin password and stored it in {tfvars_path(app_dir)}")
+
+
+@timed_phase("tfvars")
+def write_sql_tfvars(sql_dir, allow_generate=True):
+    location = os.environ.get("LOCATION", setting("location"))
+    sql_server_name = os.environ.get("SQL_SERVER_NAME")
+    sql_server_name_prefix = os.environ.get("SQL_SERVER_NAME_PREFIX", setting("sql_server_name_prefix"))
+    sql_admin_login = get_sql_admin_login(sql_dir)
+    sql_admin_password, generated = get_sql_admin_password(sql_dir, allow_generate)
+    azuread_admin_login = get_sql_azuread_admin_login(sql_dir)
+    azuread_admin_object_id = get_sql_azuread_admin_object_id(sql_dir)
+    database_name = os.environ.get("SQL_DATABASE_NAME", setting("sql_database_name"))
+    database_sku_name = os.environ.get("SQL_DATABASE_SKU_NAME", setting("sql_database_sku_name"))
+    max_size_gb = parse_int(os.environ.get("SQL_MAX_SIZE_GB"), setting("sql_max_size_gb"))
+    min_capacity = parse_float(os.environ.get("SQL_MIN_CAPACITY"), setting("sql_min_capacity"))
+    auto_pause_delay = parse_int(
+        os.environ.get("SQL_AUTO_PAUSE_DELAY_IN_MINUTES"),
+        setting("sql_auto_pause_delay_in_minutes"),
+    )
+    public_network_access_enabled = parse_bool(
+        os.environ.get("SQL_PUBLIC_NETWORK_ACCESS_ENABLED"),
+        setting("sql_public_network_access_enabled"),
+    )
+    zone_redundant = parse_bool(os.environ.get("SQL_ZONE_REDUNDANT"), setting("sql_zone_redundant"))
+    allow_azure_services = parse_bool(
+        os.environ.get("SQL_ALLOW_AZURE_SERVICES"),
+        setting("sql_allow_azure_services"),
+    )
+    client_ip_address = get_sql_client_ip(sql_dir)
+    subnet_key = os.environ.get("SQL_SUBNET_KEY", setting("sql_subnet_key"))
+    private_dns_zone_name = os.environ.get(
+        "SQL_PRIVATE_DNS_ZONE_NAME",
+        setting("sql_private_dns_zone_name"),
+    )
+    private_endpoint_name_prefix = os.environ.get(
+        "SQL_PRIVATE_ENDPOINT_NAME_PREFIX",
+        setting("sql_private_endpoint_name_prefix"),
+    )
+    private_dns_zone_link_name_prefix = os.environ.get(
+        "SQL_PRIVATE_DNS_ZONE_LINK_NAME_PREFIX",
+        setting("sql_private_dns_zone_link_name_prefix"),
+    )
+    private_dns_zone_group_name = os.environ.get(
+        "SQL_PRIVATE_DNS_ZONE_GROUP_NAME",
+        setting("sql_private_dns_zone_group_name"),
+    )
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("subnet_key", subnet_key),
+        ("sql_server_name", sql_server_name),
+        ("sql_server_name_prefix", sql_server_name_prefix),
+        ("sql_admin_login", sql_admin_login),
+        ("sql_admin_password", sql_admin_password),
+        ("azuread_admin_login", azuread_admin_login),
+        ("azuread_admin_object_id", azuread_admin_object_id),
+        ("database_name", database_name),
+        ("database_sku_name", database_sku_name),
+        ("max_size_gb", max_size_gb),
+        ("min_capacity", min_capacity),
+        ("auto_pause_delay_in_minutes", auto_pause_delay),
+        ("public_network_access_enabled", public_network_access_enabled),
+        ("allow_azure_services", allow_azure_services),
+        ("client_ip_address", client_ip_address),
+        ("zone_redundant", zone_redundant),
+        ("private_dns_zone_name", private_dns_zone_name),
+        ("private_endpoint_name_prefix", private_endpoint_name_prefix),
+        ("private_dns_zone_link_name_prefix", private_dns_zone_link_name_prefix),
+        ("private_dns_zone_group_name", private_dns_zone_group_name),
+        ("tags", tags),
+        *remote_state_items(sql_dir),
+    ]
+    write_tfvars(sql_dir, items)
+    if generated:
+        print(f"Generated SQL admin password and stored it in {tfvars_path(sql_dir)}")
+    return sql_admin_login, sql_admin_password
+
+
+@timed_phase("tfvars")
+def write_lb_tfvars(lb_dir):
+    location = os.environ.get("LOCATION", setting("location"))
+    lb_name = os.environ.get("LB_NAME")
+    lb_name_prefix = os.environ.get("LB_NAME_PREFIX", setting("lb_name_prefix"))
+    public_ip_name = os.environ.get("PUBLIC_IP_NAME")
+    public_ip_name_prefix = os.environ.get("PUBLIC_IP_NAME_PREFIX", setting("public_ip_name_prefix"))
+    lb_sku = os.environ.get("LB_SKU", setting("lb_sku"))
+    public_ip_sku = os.environ.get("PUBLIC_IP_SKU", setting("public_ip_sku"))
+    frontend_port = int(os.environ.get("LB_FRONTEND_PORT", setting("frontend_port")))
+    backend_port = int(os.environ.get("LB_BACKEND_PORT", setting("backend_port")))
+    probe_path = os.environ.get("LB_PROBE_PATH", setting("probe_path"))
+    lb_settings = lb_tuning_items("LB", "lb")
+    outbound_rule_enabled = parse_bool(
+        os.environ.get("LB_OUTBOUND_RULE_ENABLED"),
+        setting("lb_outbound_rule_enabled"),
+    )
+    outbound_ports_per_instance = parse_int(
+        os.environ.get("LB_OUTBOUND_PORTS_PER_INSTANCE"),
+        setting("lb_outbound_ports_per_instance"),
+    )
+    outbound_idle_timeout = parse_int(
+        os.environ.get("LB_OUTBOUND_IDLE_TIMEOUT_IN_MINUTES"),
+        setting("lb_outbound_idle_timeout_in_minutes"),
+    )
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("lb_name", lb_name),
+        ("lb_name_prefix", lb_name_prefix),
+        ("public_ip_name", public_ip_name),
+        ("public_ip_name_prefix", public_ip_name_prefix),
+        ("lb_sku", lb_sku),
+        ("public_ip_sku", public_ip_sku),
+        ("frontend_port", frontend_port),
+        ("backend_port", backend_port),
+        ("probe_path", probe_path),
+        *lb_settings,
+        ("outbound_rule_enabled", outbound_rule_enabled),
+        ("outbound_ports_per_instance", outbound_ports_per_instance),
+        ("outbound_idle_timeout_in_minutes", outbound_idle_timeout),
+        ("tags", tags),
+        *remote_state_items(lb_dir),
+    ]
+    write_tfvars(lb_dir, items)
+
+
+@timed_phase("tfvars")
+def write_compute_tfvars(compute_dir, allow_generate=True):
+    location = os.environ.get("LOCATION", setting("location"))
+    vm_name = os.environ.get("VM_NAME")
+    vm_name_prefix = os.environ.get("VM_NAME_PREFIX", setting("vm_name_prefix"))
+    nic_name_prefix = os.environ.get("NIC_NAME_PREFIX", setting("nic_name_prefix"))
+    vm_size = os.environ.get("VM_SIZE", setting("vm_size"))
+    admin_username = os.environ.get("VM_ADMIN_USERNAME", setting("admin_username"))
+    accelerated_networking = parse_bool(
+        os.environ.get("ACCELERATED_NETWORKING_ENABLED"),
+        setting("accelerated_networking_enabled"),
+    )
+    zone = os.environ.get("VM_ZONE", setting("vm_zone"))
+    join_app_proximity_placement_group = parse_bool(
+        os.environ.get("JOIN_APP_PROXIMITY_PLACEMENT_GROUP"),
+        setting("join_app_proximity_placement_group"),
+    )
+    trace_exporter = os.environ.get("TRACE_EXPORTER", setting("trace_exporter"))
+    trace_sample_rate = parse_float(os.environ.get("TRACE_SAMPLE_RATE"), setting("trace_sample_rate"))
+    single_flight_max_wait_seconds = parse_float(
+        os.environ.get("SINGLE_FLIGHT_MAX_WAIT_SECONDS"),
+        setting("single_flight_max_wait_seconds"),
+    )
+    admission_max_concurrency = parse_int(os.environ.get("ADMISSION_MAX_CONCURRENCY"), setting("admission_max_concurrency"))
+    admission_target_latency_ms = parse_int(
+        os.environ.get("ADMISSION_TARGET_LATENCY_MS"),
+        setting("admission_target_latency_ms"),
+    )
+    events_poll_interval_seconds = parse_int(
+        os.environ.get("EVENTS_POLL_INTERVAL_SECONDS"),
+        setting("events_poll_interval_seconds"),
+    )
+    events_max_clients = parse_int(os.environ.get("EVENTS_MAX_CLIENTS"), setting("events_max_clients"))
+    admin_password, generated = get_vm_admin_password(compute_dir, allow_generate)
+    tags = resolve_tags()
+    items = [
+        ("resource_group_name", os.environ.get("RESOURCE_GROUP_NAME")),
+        ("location", location),
+        ("app_tier_url", os.environ.get("APP_TIER_URL")),
+        ("vm_name", vm_name),
+        ("vm_name_prefix", vm_name_prefix),
+        ("nic_name_prefix", nic_name_prefix),
+        ("vm_size", vm_size),
+        ("admin_username", admin_username),
+        ("admin_password", admin_password),
+        ("accelerated_networking_enabled", accelerated_networking),
+        ("zone", zone),
+        ("join_app_proximity_placement_group", join_app_proximity_placement_group),
+        ("trace_exporter", trace_exporter),
+        ("trace_sample_rate", trace_sample_rate),
+        ("single_flight_max_wait_seconds", single_flight_max_wait_seconds),
+        ("admission_max_concurrency", admission_max_concurrency),
+        ("admission_target_latency_ms", admission_target_latency_ms),
+        ("events_poll_interval_seconds", events_poll_interval_seconds),
+        ("events_max_clients", events_max_clients),
+        ("tags", tags),
+        *remote_state_items(compute_dir),
+    ]
+    write_tfvars(compute_dir, items)
+    if generated:
+        print(f"Generated VM admin password and stored it in {tfvars_path(compute_dir)}")
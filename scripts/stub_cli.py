@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def matches(pattern, argv):
+    position = 0
+    for token in pattern:
+        while position < len(argv) and token not in argv[position]:
+            position += 1
+        if position == len(argv):
+            return False
+        position += 1
+    return True
+
+
+def next_response(index, entry, state_path):
+    responses = entry.get("responses")
+    if not responses:
+        return entry
+    state = {}
+    if state_path.exists():
+        state = json.loads(state_path.read_text(encoding="utf-8") or "{}")
+    count = state.get(str(index), 0)
+    state[str(index)] = count + 1
+    state_path.write_text(json.dumps(state), encoding="utf-8")
+    return responses[min(count, len(responses) - 1)]
+
+
+def log_call(argv, exit_code):
+    log_path = os.environ.get("STUB_CLI_LOG")
+    if not log_path:
+        return
+    with open(log_path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps({"argv": argv, "exit_code": exit_code, "time": time.time()}) + "\n")
+
+
+if __name__ == "__main__":
+    fixture_path = os.environ.get("STUB_CLI_FIXTURE")
+    if not fixture_path:
+        print("STUB_CLI_FIXTURE is not set.", file=sys.stderr)
+        sys.exit(2)
+    fixture_path = Path(fixture_path)
+    fixture = json.loads(fixture_path.read_text(encoding="utf-8"))
+    state_path = Path(os.environ.get("STUB_CLI_STATE", str(fixture_path) + ".state"))
+    argv = sys.argv[1:]
+
+    for index, entry in enumerate(fixture.get("commands", [])):
+        if not matches(entry.get("match", []), argv):
+            continue
+        response = next_response(index, entry, state_path)
+        time.sleep(float(response.get("delay_s", 0)))
+        stdout = response.get("stdout", "")
+        if not isinstance(stdout, str):
+            stdout = json.dumps(stdout)
+        if stdout:
+            print(stdout)
+        if response.get("stderr"):
+            print(response["stderr"], file=sys.stderr)
+        exit_code = int(response.get("exit_code", 0))
+        log_call(argv, exit_code)
+        sys.exit(exit_code)
+
+    default = fixture.get("default", {"exit_code": 1, "stderr": "stub_cli: no fixture entry matched"})
+    if default.get("stderr"):
+        print(f"{default['stderr']}: {' '.join(argv)}", file=sys.stderr)
+    log_call(argv, int(default.get("exit_code", 1)))
+    sys.exit(int(default.get("exit_code", 1)))
@@ -2,6 +2,8 @@ param(
   [switch]$SeedSql,
   [switch]$SkipHealth,
   [switch]$SkipRemoteChecks,
+  [switch]$Bench,
+  [string]$BenchOutput,
   [string]$SqlUser,
   [string]$SqlPassword
 )
@@ -10,6 +12,7 @@ $ErrorActionPreference = "Stop"
 
 $healthScript = Join-Path $PSScriptRoot "health_check.ps1"
 $seedScript = Join-Path $PSScriptRoot "seed_sql.ps1"
+$benchScript = Join-Path $PSScriptRoot "bench.py"
 
 if (-not $SkipHealth) {
   if (-not (Test-Path $healthScript)) {
@@ -35,3 +38,14 @@ if ($SeedSql) {
   }
   & powershell @seedArgs
 }
+
+if ($Bench) {
+  if (-not (Test-Path $benchScript)) {
+    throw "bench.py not found at $benchScript."
+  }
+  $benchArgs = @($benchScript)
+  if ($BenchOutput) {
+    $benchArgs += @("--output", $BenchOutput)
+  }
+  & python @benchArgs
+}
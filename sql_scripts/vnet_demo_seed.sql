@@ -8,6 +8,16 @@ CREATE TABLE dbo.demo_customers (
 );
 END
 
+IF COL_LENGTH('dbo.demo_customers', 'row_version') IS NULL
+BEGIN
+ALTER TABLE dbo.demo_customers ADD row_version ROWVERSION;
+END
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_demo_customers_row_version' AND object_id = OBJECT_ID('dbo.demo_customers'))
+BEGIN
+EXEC('CREATE INDEX IX_demo_customers_row_version ON dbo.demo_customers (row_version);');
+END
+
 IF NOT EXISTS (SELECT 1 FROM dbo.demo_customers)
 BEGIN
 INSERT INTO dbo.demo_customers (name, segment, last_update) VALUES ('Ada Lovelace', 'Analytics', '2026-01-20T08:00:00Z');
@@ -23,10 +33,16 @@ CREATE TABLE dbo.NetworkChecks (
     check_id INT IDENTITY(1,1) PRIMARY KEY,
     component VARCHAR(50) NOT NULL,
     status VARCHAR(12) NOT NULL,
-    checked_at DATETIME2 NOT NULL
+    checked_at DATETIME2 NOT NULL,
+    latency_ms FLOAT NULL
 );
 END
 
+IF COL_LENGTH('dbo.NetworkChecks', 'latency_ms') IS NULL
+BEGIN
+ALTER TABLE dbo.NetworkChecks ADD latency_ms FLOAT NULL;
+END
+
 IF NOT EXISTS (SELECT 1 FROM dbo.NetworkChecks)
 BEGIN
 INSERT INTO dbo.NetworkChecks (component, status, checked_at) VALUES ('web-tier', 'OK', '2026-01-20T08:00:00Z');
@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the virtual network."
+  default     = null
 }
 
 variable "location" {
@@ -56,6 +57,40 @@ variable "tags" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
 resource "random_pet" "vnet" {
   length    = 2
   separator = "-"
@@ -68,7 +103,7 @@ locals {
 resource "azurerm_virtual_network" "main" {
   name                = local.vnet_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   address_space       = var.address_space
   tags                = var.tags
 }
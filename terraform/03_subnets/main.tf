@@ -16,11 +16,13 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the subnets."
+  default     = null
 }
 
 variable "virtual_network_name" {
   type        = string
   description = "Virtual network name for the subnets."
+  default     = null
 }
 
 variable "subnet_name_prefix" {
@@ -45,15 +47,68 @@ variable "subnet_cidrs" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+locals {
+  remote_state_root    = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name  = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  virtual_network_name = var.virtual_network_name != null ? var.virtual_network_name : try(data.terraform_remote_state.vnet.outputs.virtual_network_name, null)
+  subnet_name_suffix   = var.subnet_name_suffix != null ? var.subnet_name_suffix : try(data.terraform_remote_state.vnet.outputs.vnet_name_suffix, null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "vnet" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/02_vnet/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/02_vnet/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.virtual_network_name != null || can(self.outputs.virtual_network_name)
+      error_message = "Virtual network name not found: apply 02_vnet first or set virtual_network_name."
+    }
+  }
+}
+
 locals {
-  subnet_suffix = var.subnet_name_suffix != null && length(trimspace(var.subnet_name_suffix)) > 0 ? "-${var.subnet_name_suffix}" : ""
+  subnet_suffix = local.subnet_name_suffix != null && length(trimspace(local.subnet_name_suffix)) > 0 ? "-${local.subnet_name_suffix}" : ""
 }
 
 resource "azurerm_subnet" "main" {
   for_each             = var.subnet_cidrs
   name                 = "${var.subnet_name_prefix}-${each.key}${local.subnet_suffix}"
-  resource_group_name  = var.resource_group_name
-  virtual_network_name = var.virtual_network_name
+  resource_group_name  = local.resource_group_name
+  virtual_network_name = local.virtual_network_name
   private_endpoint_network_policies_enabled = each.key == "db" ? false : true
   address_prefixes     = [each.value]
 }
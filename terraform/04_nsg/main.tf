@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the network security groups."
+  default     = null
 }
 
 variable "location" {
@@ -31,6 +32,7 @@ variable "location" {
 variable "subnet_ids_by_key" {
   type        = map(string)
   description = "Map of subnet keys to subnet IDs."
+  default     = null
 }
 
 variable "subnet_cidrs" {
@@ -59,6 +61,58 @@ variable "tags" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  subnet_ids_by_key   = var.subnet_ids_by_key != null ? var.subnet_ids_by_key : try(tomap(data.terraform_remote_state.subnets.outputs.subnet_ids_by_key), null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "subnets" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/03_subnets/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/03_subnets/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.subnet_ids_by_key != null || can(self.outputs.subnet_ids_by_key)
+      error_message = "Subnet IDs not found: apply 03_subnets first or set subnet_ids_by_key."
+    }
+  }
+}
+
 resource "random_pet" "nsg" {
   length    = 2
   separator = "-"
@@ -76,12 +130,12 @@ resource "azurerm_network_security_group" "main" {
   for_each            = local.nsg_names
   name                = each.value
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   tags                = var.tags
 }
 
 resource "azurerm_subnet_network_security_group_association" "main" {
-  for_each                  = var.subnet_ids_by_key
+  for_each                  = local.subnet_ids_by_key
   subnet_id                 = each.value
   network_security_group_id = azurerm_network_security_group.main[each.key].id
 }
@@ -96,7 +150,7 @@ resource "azurerm_network_security_rule" "web_https_in" {
   destination_port_range      = "443"
   source_address_prefix       = "Internet"
   destination_address_prefix  = var.subnet_cidrs["web"]
-  resource_group_name         = var.resource_group_name
+  resource_group_name         = local.resource_group_name
   network_security_group_name = azurerm_network_security_group.main["web"].name
 }
 
@@ -110,7 +164,7 @@ resource "azurerm_network_security_rule" "web_http_in" {
   destination_port_range      = "80"
   source_address_prefix       = "Internet"
   destination_address_prefix  = var.subnet_cidrs["web"]
-  resource_group_name         = var.resource_group_name
+  resource_group_name         = local.resource_group_name
   network_security_group_name = azurerm_network_security_group.main["web"].name
 }
 
@@ -124,7 +178,7 @@ resource "azurerm_network_security_rule" "app_8080_in" {
   destination_port_range      = "8080"
   source_address_prefix       = var.subnet_cidrs["web"]
   destination_address_prefix  = var.subnet_cidrs["app"]
-  resource_group_name         = var.resource_group_name
+  resource_group_name         = local.resource_group_name
   network_security_group_name = azurerm_network_security_group.main["app"].name
 }
 
@@ -138,6 +192,6 @@ resource "azurerm_network_security_rule" "db_1433_in" {
   destination_port_range      = "1433"
   source_address_prefix       = var.subnet_cidrs["app"]
   destination_address_prefix  = var.subnet_cidrs["db"]
-  resource_group_name         = var.resource_group_name
+  resource_group_name         = local.resource_group_name
   network_security_group_name = azurerm_network_security_group.main["db"].name
 }
@@ -17,11 +17,88 @@ provider "azurerm" {
   features {}
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+variable "subnet_key" {
+  type        = string
+  description = "Key in the subnet stack's subnet_ids_by_key output used when subnet_id is not set."
+  default     = "db"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  virtual_network_id  = var.virtual_network_id != null ? var.virtual_network_id : try(data.terraform_remote_state.vnet.outputs.virtual_network_id, null)
+  subnet_id           = var.subnet_id != null ? var.subnet_id : try(data.terraform_remote_state.subnets.outputs.subnet_ids_by_key[var.subnet_key], null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "vnet" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/02_vnet/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/02_vnet/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.virtual_network_id != null || can(self.outputs.virtual_network_id)
+      error_message = "Virtual network ID not found: apply 02_vnet first or set virtual_network_id."
+    }
+  }
+}
+
+data "terraform_remote_state" "subnets" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/03_subnets/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/03_subnets/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.subnet_id != null || can(self.outputs.subnet_ids_by_key[var.subnet_key])
+      error_message = "Subnet ID for subnet_key not found: apply 03_subnets first or set subnet_id."
+    }
+  }
+}
+
 data "azurerm_client_config" "current" {}
 
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the SQL resources."
+  default     = null
 }
 
 variable "location" {
@@ -33,11 +110,13 @@ variable "location" {
 variable "virtual_network_id" {
   type        = string
   description = "Virtual network ID for the private DNS zone link."
+  default     = null
 }
 
 variable "subnet_id" {
   type        = string
   description = "Subnet ID for the SQL private endpoint."
+  default     = null
 }
 
 variable "sql_server_name" {
@@ -179,7 +258,7 @@ locals {
 resource "azurerm_mssql_server" "main" {
   name                          = local.server_name
   location                      = var.location
-  resource_group_name           = var.resource_group_name
+  resource_group_name           = local.resource_group_name
   version                       = "12.0"
   administrator_login           = var.sql_admin_login
   administrator_login_password  = var.sql_admin_password
@@ -226,15 +305,15 @@ resource "azurerm_mssql_database" "main" {
 
 resource "azurerm_private_dns_zone" "sql" {
   name                = var.private_dns_zone_name
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   tags                = var.tags
 }
 
 resource "azurerm_private_dns_zone_virtual_network_link" "sql" {
   name                  = local.dns_link_name
-  resource_group_name   = var.resource_group_name
+  resource_group_name   = local.resource_group_name
   private_dns_zone_name = azurerm_private_dns_zone.sql.name
-  virtual_network_id    = var.virtual_network_id
+  virtual_network_id    = local.virtual_network_id
   registration_enabled  = false
   tags                  = var.tags
 }
@@ -242,8 +321,8 @@ resource "azurerm_private_dns_zone_virtual_network_link" "sql" {
 resource "azurerm_private_endpoint" "sql" {
   name                = local.private_endpoint_name
   location            = var.location
-  resource_group_name = var.resource_group_name
-  subnet_id           = var.subnet_id
+  resource_group_name = local.resource_group_name
+  subnet_id           = local.subnet_id
   tags                = var.tags
 
   private_service_connection {
@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the NAT gateway."
+  default     = null
 }
 
 variable "location" {
@@ -58,6 +59,40 @@ variable "public_ip_sku" {
   default     = "Standard"
 }
 
+variable "public_ip_count" {
+  type        = number
+  description = "Number of individual public IPs attached to the NAT gateway. Each adds 64,512 SNAT ports."
+  default     = 1
+
+  validation {
+    condition     = var.public_ip_count >= 0 && var.public_ip_count <= 16 && floor(var.public_ip_count) == var.public_ip_count
+    error_message = "public_ip_count must be a whole number between 0 and 16."
+  }
+}
+
+variable "public_ip_prefix_length" {
+  type        = number
+  description = "Length of an optional public IP prefix attached to the NAT gateway (28-31, i.e. 16-2 addresses). Null disables the prefix."
+  default     = null
+
+  validation {
+    condition     = var.public_ip_prefix_length == null ? true : var.public_ip_prefix_length >= 28 && var.public_ip_prefix_length <= 31
+    error_message = "public_ip_prefix_length must be between 28 and 31."
+  }
+}
+
+variable "public_ip_prefix_name_prefix" {
+  type        = string
+  description = "Prefix used to build the NAT public IP prefix name."
+  default     = "ippre-nat"
+}
+
+variable "snat_failure_alert_threshold" {
+  type        = number
+  description = "Raise a metric alert when failed SNAT connections over 5 minutes exceed this value. Null disables the alert."
+  default     = null
+}
+
 variable "nat_gateway_sku" {
   type        = string
   description = "SKU name for the NAT gateway."
@@ -73,6 +108,7 @@ variable "idle_timeout_in_minutes" {
 variable "subnet_ids" {
   type        = list(string)
   description = "Subnet IDs that should use the NAT gateway for outbound traffic."
+  default     = null
 }
 
 variable "tags" {
@@ -85,6 +121,64 @@ variable "tags" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+variable "subnet_keys" {
+  type        = list(string)
+  description = "Keys in the subnet stack's subnet_ids_by_key output used when subnet_ids is not set."
+  default     = ["app", "web"]
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  subnet_ids          = var.subnet_ids != null ? var.subnet_ids : try([for key in var.subnet_keys : data.terraform_remote_state.subnets.outputs.subnet_ids_by_key[key]], null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "subnets" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/03_subnets/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/03_subnets/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.subnet_ids != null || alltrue([for key in var.subnet_keys : can(self.outputs.subnet_ids_by_key[key])])
+      error_message = "Subnet IDs for subnet_keys not found: apply 03_subnets first or set subnet_ids."
+    }
+  }
+}
+
 resource "random_pet" "nat" {
   length    = 2
   separator = "-"
@@ -93,33 +187,100 @@ resource "random_pet" "nat" {
 locals {
   nat_gateway_name = var.nat_gateway_name != null ? var.nat_gateway_name : "${var.nat_gateway_name_prefix}-${random_pet.nat.id}"
   public_ip_name   = var.public_ip_name != null ? var.public_ip_name : "${var.public_ip_name_prefix}-${random_pet.nat.id}"
+  prefix_addresses = var.public_ip_prefix_length != null ? pow(2, 32 - var.public_ip_prefix_length) : 0
+  snat_ports       = (var.public_ip_count + local.prefix_addresses) * 64512
+}
+
+resource "terraform_data" "nat_ip_capacity" {
+  input = local.snat_ports
+
+  lifecycle {
+    precondition {
+      condition     = var.public_ip_count + local.prefix_addresses >= 1 && var.public_ip_count + local.prefix_addresses <= 16
+      error_message = "The NAT gateway needs between 1 and 16 public IP addresses in total (public_ip_count plus the prefix size)."
+    }
+  }
+}
+
+moved {
+  from = azurerm_public_ip.nat
+  to   = azurerm_public_ip.nat[0]
+}
+
+moved {
+  from = azurerm_nat_gateway_public_ip_association.main
+  to   = azurerm_nat_gateway_public_ip_association.main[0]
 }
 
 resource "azurerm_public_ip" "nat" {
-  name                = local.public_ip_name
+  count               = var.public_ip_count
+  name                = count.index == 0 ? local.public_ip_name : "${local.public_ip_name}-${count.index + 1}"
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   allocation_method   = "Static"
   sku                 = var.public_ip_sku
   tags                = var.tags
 }
 
+resource "azurerm_public_ip_prefix" "nat" {
+  count               = var.public_ip_prefix_length != null ? 1 : 0
+  name                = "${var.public_ip_prefix_name_prefix}-${random_pet.nat.id}"
+  location            = var.location
+  resource_group_name = local.resource_group_name
+  prefix_length       = var.public_ip_prefix_length
+  sku                 = "Standard"
+  tags                = var.tags
+}
+
 resource "azurerm_nat_gateway" "main" {
   name                    = local.nat_gateway_name
   location                = var.location
-  resource_group_name     = var.resource_group_name
+  resource_group_name     = local.resource_group_name
   sku_name                = var.nat_gateway_sku
   idle_timeout_in_minutes = var.idle_timeout_in_minutes
   tags                    = var.tags
 }
 
 resource "azurerm_nat_gateway_public_ip_association" "main" {
+  count                = var.public_ip_count
   nat_gateway_id       = azurerm_nat_gateway.main.id
-  public_ip_address_id = azurerm_public_ip.nat.id
+  public_ip_address_id = azurerm_public_ip.nat[count.index].id
+}
+
+resource "azurerm_nat_gateway_public_ip_prefix_association" "main" {
+  count               = length(azurerm_public_ip_prefix.nat)
+  nat_gateway_id      = azurerm_nat_gateway.main.id
+  public_ip_prefix_id = azurerm_public_ip_prefix.nat[0].id
+}
+
+resource "azurerm_monitor_metric_alert" "snat_failures" {
+  count               = var.snat_failure_alert_threshold != null ? 1 : 0
+  name                = "${local.nat_gateway_name}-snat-failures"
+  resource_group_name = local.resource_group_name
+  scopes              = [azurerm_nat_gateway.main.id]
+  description         = "Failed SNAT connections on the NAT gateway: outbound flows are exhausting SNAT ports."
+  frequency           = "PT1M"
+  window_size         = "PT5M"
+  severity            = 2
+  tags                = var.tags
+
+  criteria {
+    metric_namespace = "Microsoft.Network/natGateways"
+    metric_name      = "SNATConnectionCount"
+    aggregation      = "Total"
+    operator         = "GreaterThan"
+    threshold        = var.snat_failure_alert_threshold
+
+    dimension {
+      name     = "ConnectionState"
+      operator = "Include"
+      values   = ["Failed"]
+    }
+  }
 }
 
 resource "azurerm_subnet_nat_gateway_association" "main" {
-  for_each       = toset(var.subnet_ids)
+  for_each       = toset(local.subnet_ids)
   subnet_id      = each.value
   nat_gateway_id = azurerm_nat_gateway.main.id
 }
@@ -7,9 +7,21 @@ output "nat_gateway_name" {
 }
 
 output "nat_public_ip_id" {
-  value = azurerm_public_ip.nat.id
+  value = try(azurerm_public_ip.nat[0].id, null)
 }
 
 output "nat_public_ip_address" {
-  value = azurerm_public_ip.nat.ip_address
+  value = try(azurerm_public_ip.nat[0].ip_address, null)
+}
+
+output "nat_public_ip_addresses" {
+  value = azurerm_public_ip.nat[*].ip_address
+}
+
+output "nat_public_ip_prefix" {
+  value = try(azurerm_public_ip_prefix.nat[0].ip_prefix, null)
+}
+
+output "nat_snat_ports" {
+  value = local.snat_ports
 }
@@ -0,0 +1,537 @@
+from flask import Flask, g, jsonify, request
+import collections
+import gzip
+import importlib
+import itertools
+import json
+import math
+import os
+import socket
+import threading
+import time
+
+import customer_index
+import tracing
+from resilience import AdmissionControl, SingleFlight, Snapshot
+
+SQL_DRIVER = os.environ.get("SQL_DRIVER", "pyodbc")
+
+try:
+    pyodbc = importlib.import_module(SQL_DRIVER)
+except Exception as exc:
+    pyodbc = None
+    PYODBC_ERROR = str(exc)
+else:
+    PYODBC_ERROR = ""
+
+app = Flask(__name__)
+tracer = tracing.tracer_from_env("appservice")
+tracing.init_app(app, tracer)
+
+SQL_SERVER = os.environ.get("SQL_SERVER_FQDN")
+SQL_DATABASE = os.environ.get("SQL_DATABASE_NAME")
+SQL_USER = os.environ.get("SQL_ADMIN_LOGIN")
+SQL_PASSWORD = os.environ.get("SQL_ADMIN_PASSWORD")
+SQL_PORT = 1433
+DNS_CACHE_TTL_S = float(os.environ.get("DNS_CACHE_TTL_SECONDS", "30"))
+DNS_RETRY_S = 5
+SINGLE_FLIGHT_MAX_WAIT_S = float(os.environ.get("SINGLE_FLIGHT_MAX_WAIT_SECONDS", "5"))
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_TARGET_LATENCY_MS = float(os.environ.get("ADMISSION_TARGET_LATENCY_MS", "1000"))
+ADMISSION_PROBE_CONCURRENCY = int(os.environ.get("ADMISSION_PROBE_CONCURRENCY", "4"))
+ADMISSION_RETRY_AFTER_S = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+PROBE_ROUTES = {"/health", "/ready"}
+STREAM_ROUTES = {"/changes"}
+CHANGES_POLL_INTERVAL_S = float(os.environ.get("CHANGES_POLL_INTERVAL_SECONDS", "2"))
+CHANGES_HISTORY_SIZE = int(os.environ.get("CHANGES_HISTORY_SIZE", "10000"))
+CHANGES_MAX_WAITERS = 64
+CHANGES_MAX_WAIT_S = 30
+SQL_FETCH_BATCH = 10000
+CHANGED_CUSTOMERS_SQL = (
+    "SET NOCOUNT ON; "
+    "DECLARE @bound BINARY(8) = MIN_ACTIVE_ROWVERSION(); "
+    "SELECT CAST(@bound AS BIGINT); "
+    "SELECT {columns}, CAST(row_version AS BIGINT) FROM dbo.demo_customers "
+    "WHERE row_version > CONVERT(BINARY(8), ?) AND row_version < @bound ORDER BY row_version"
+)
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", "/var/lib/appservice/snapshot.json")
+DEGRADED_SOURCES = {"error", "fallback", "timeout"}
+SEARCH_REFRESH_S = float(os.environ.get("SEARCH_REFRESH_SECONDS", "5"))
+SEARCH_REBUILD_BATCH = 5000
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+COLUMNAR_MEDIA_TYPE = "application/vnd.customers.columnar+json"
+CUSTOMER_FIELDS = ["id", "name", "segment", "last_update"]
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+FALLBACK_CUSTOMERS = [
+    {"id": 1, "name": "Ada Lovelace", "segment": "Analytics"},
+    {"id": 2, "name": "Alan Turing", "segment": "Engineering"},
+    {"id": 3, "name": "Katherine Johnson", "segment": "Operations"},
+]
+
+class ResolvedEndpoint:
+    def __init__(self, host, port, ttl):
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.addresses = []
+        self.resolved_at = None
+        self.expires_at = 0.0
+        self.checked_at = None
+        self.resolving = False
+        self.last_ms = None
+        self.resolves = 0
+        self.failures = 0
+        self.forced = 0
+        self.error = ""
+
+    def resolve(self):
+        start = time.perf_counter()
+        try:
+            with tracer.span("dns.resolve", host=self.host):
+                infos = socket.getaddrinfo(self.host, self.port, proto=socket.IPPROTO_TCP)
+        except (OSError, UnicodeError) as exc:
+            addresses, error = None, str(exc)
+        else:
+            addresses, error = sorted({info[4][0] for info in infos}), ""
+        with self.lock:
+            if addresses is None:
+                self.failures += 1
+                self.expires_at = time.monotonic() + min(self.ttl, DNS_RETRY_S)
+            else:
+                self.addresses = addresses
+                self.resolved_at = time.time()
+                self.expires_at = time.monotonic() + self.ttl
+            self.error = error
+            self.checked_at = time.monotonic()
+            self.resolves += 1
+            self.last_ms = round((time.perf_counter() - start) * 1000, 2)
+            self.resolving = False
+
+    def refresh(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if force:
+                self.forced += 1
+            recent = self.checked_at is not None and now - self.checked_at < DNS_RETRY_S
+            due = not self.resolving and (now >= self.expires_at or force and not recent)
+            if due:
+                self.resolving = True
+        if due:
+            self.resolve()
+        with self.lock:
+            return self.addresses
+
+    def status(self):
+        with self.lock:
+            return {
+                "host": self.host,
+                "addresses": self.addresses,
+                "ttl_s": self.ttl,
+                "age_s": round(time.time() - self.resolved_at, 1) if self.resolved_at else None,
+                "last_resolve_ms": self.last_ms,
+                "resolves": self.resolves,
+                "forced_refreshes": self.forced,
+                "failures": self.failures,
+                "error": self.error,
+            }
+
+class ChangeFeed:
+    def __init__(self, interval, history, max_waiters):
+        self.interval = interval
+        self.max_waiters = max_waiters
+        self.condition = threading.Condition()
+        self.changes = collections.deque(maxlen=history)
+        self.cursor = None
+        self.floor = None
+        self.thread = None
+        self.waiters = 0
+        self.polls = 0
+        self.error = ""
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="change-feed", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+                self.error = ""
+            except Exception as exc:
+                self.error = str(exc)
+            with self.condition:
+                self.polls += 1
+            time.sleep(self.interval)
+
+    def poll(self):
+        conn = connect()
+        with conn:
+            cursor = conn.cursor()
+            if self.cursor is None:
+                with tracer.span("sql.execute", statement="min_active_rowversion"):
+                    cursor.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT)")
+                rows = []
+                watermark = int(cursor.fetchone()[0]) - 1
+            else:
+                rows, watermark = changed_customers(cursor, "customer_id", self.cursor, "changed_customers")
+        with self.condition:
+            if self.cursor is None:
+                self.cursor = self.floor = watermark
+                self.condition.notify_all()
+            for customer_id, version in rows:
+                if len(self.changes) == self.changes.maxlen:
+                    self.floor = self.changes[0][0]
+                self.changes.append((int(version), int(customer_id)))
+            self.cursor = max(self.cursor, watermark)
+            if rows:
+                self.condition.notify_all()
+
+    def collect(self, since):
+        if self.cursor is None:
+            return None
+        if since is None or since < self.floor or since > self.cursor:
+            return {"cursor": self.cursor, "ids": [], "reset": True}
+        ids = set()
+        for version, customer_id in reversed(self.changes):
+            if version <= since:
+                break
+            ids.add(customer_id)
+        return {"cursor": self.cursor, "ids": sorted(ids), "reset": False}
+
+    def wait(self, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            if self.waiters >= self.max_waiters:
+                return "busy"
+            self.waiters += 1
+            try:
+                while True:
+                    result = self.collect(since)
+                    remaining = deadline - time.monotonic()
+                    if result and (result["ids"] or result["reset"]) or remaining <= 0:
+                        return result
+                    self.condition.wait(remaining)
+            finally:
+                self.waiters -= 1
+
+    def status(self):
+        with self.condition:
+            return {
+                "running": self.thread is not None,
+                "poll_interval_s": self.interval,
+                "cursor": self.cursor,
+                "floor": self.floor,
+                "retained": len(self.changes),
+                "waiters": self.waiters,
+                "polls": self.polls,
+                "error": self.error,
+            }
+
+class CustomerSearch:
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.index = None
+        self.watermark = 0
+        self.thread = None
+        self.refreshed_at = None
+        self.refreshes = 0
+        self.last_rows = 0
+        self.last_ms = None
+        self.error = ""
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="customer-search", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+                self.error = ""
+            except Exception as exc:
+                self.error = str(exc)
+            time.sleep(self.interval)
+
+    def refresh(self):
+        start = time.perf_counter()
+        conn = connect()
+        with conn:
+            rows, watermark = changed_customers(
+                conn.cursor(), "customer_id, name, segment, last_update", self.watermark, "customers_since_version"
+            )
+        changes = [(int(row[0]), str(row[1]), str(row[2]), row[3]) for row in rows]
+        if self.index is None or len(changes) > SEARCH_REBUILD_BATCH:
+            index = customer_index.CustomerIndex()
+            index.load(itertools.chain(self.index.rows() if self.index else [], changes))
+            with self.lock:
+                self.index = index
+        elif changes:
+            with self.lock:
+                self.index.apply(changes)
+        with self.lock:
+            self.watermark = max(self.watermark, watermark)
+            self.refreshed_at = time.time()
+            self.refreshes += 1
+            self.last_rows = len(rows)
+            self.last_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def search(self, prefix, segment, limit):
+        with self.lock:
+            if self.index is None:
+                return None
+            return self.index.search(prefix, segment, limit)
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.thread is not None,
+                "rows": len(self.index) if self.index is not None else None,
+                "segments": len(self.index.segments) if self.index is not None else None,
+                "watermark": self.watermark,
+                "age_s": round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+                "refreshes": self.refreshes,
+                "last_refresh_rows": self.last_rows,
+                "last_refresh_ms": self.last_ms,
+                "error": self.error,
+            }
+
+sql_endpoint = ResolvedEndpoint(SQL_SERVER, SQL_PORT, DNS_CACHE_TTL_S) if SQL_SERVER else None
+single_flight = SingleFlight(SINGLE_FLIGHT_MAX_WAIT_S, tracer)
+admission = AdmissionControl(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_TARGET_LATENCY_MS,
+    ADMISSION_PROBE_CONCURRENCY,
+    ADMISSION_RETRY_AFTER_S,
+    PROBE_ROUTES,
+)
+change_feed = ChangeFeed(CHANGES_POLL_INTERVAL_S, CHANGES_HISTORY_SIZE, CHANGES_MAX_WAITERS)
+snapshot = Snapshot(SNAPSHOT_FILE)
+customer_search = CustomerSearch(SEARCH_REFRESH_S)
+
+def db_configured():
+    return all([SQL_SERVER, SQL_DATABASE, SQL_USER, SQL_PASSWORD])
+
+def connection_string(address=None):
+    if not address:
+        server, user, pinned = SQL_SERVER, SQL_USER, ""
+    else:
+        server = f"tcp:[{address}],{SQL_PORT}" if ":" in address else f"tcp:{address},{SQL_PORT}"
+        user = SQL_USER if "@" in SQL_USER else f"{SQL_USER}@{SQL_SERVER.split('.')[0]}"
+        pinned = f"HostNameInCertificate={SQL_SERVER};"
+    return (
+        "Driver={ODBC Driver 18 for SQL Server};"
+        f"Server={server};"
+        f"Database={SQL_DATABASE};"
+        f"UID={user};"
+        f"PWD={SQL_PASSWORD};"
+        "Encrypt=yes;TrustServerCertificate=no;Connection Timeout=5;"
+        f"{pinned}"
+    )
+
+def connect():
+    addresses = sql_endpoint.refresh()
+    address = addresses[0] if addresses else None
+    try:
+        with tracer.span("sql.connect", server=SQL_SERVER, address=address):
+            return pyodbc.connect(connection_string(address), timeout=5)
+    except Exception:
+        sql_endpoint.refresh(force=True)
+        raise
+
+def check_db():
+    if not db_configured():
+        return "not-configured", "missing SQL settings"
+    if pyodbc is None:
+        return "driver-missing", PYODBC_ERROR
+    try:
+        conn = connect()
+        with conn:
+            cursor = conn.cursor()
+            with tracer.span("sql.execute", statement="select_1"):
+                cursor.execute("SELECT 1")
+            with tracer.span("sql.fetch"):
+                cursor.fetchone()
+        return "ok", "reachable"
+    except Exception as exc:
+        return "error", str(exc)
+
+def fetch_customers():
+    if not db_configured() or pyodbc is None:
+        reason = "missing SQL settings" if not db_configured() else PYODBC_ERROR
+        return "fallback", FALLBACK_CUSTOMERS, reason
+    try:
+        conn = connect()
+        with conn:
+            cursor = conn.cursor()
+            with tracer.span("sql.execute", statement="select_top_customers"):
+                cursor.execute(
+                    "SELECT TOP (12) customer_id, name, segment, last_update "
+                    "FROM dbo.demo_customers ORDER BY customer_id"
+                )
+            with tracer.span("sql.fetch") as span:
+                rows = cursor.fetchall()
+                span["attrs"]["rows"] = len(rows)
+        items = []
+        for row in rows:
+            items.append(
+                {
+                    "id": int(row[0]),
+                    "name": str(row[1]),
+                    "segment": str(row[2]),
+                    "last_update": row[3].isoformat() if row[3] else None,
+                }
+            )
+        if not items:
+            return "empty", FALLBACK_CUSTOMERS, "no rows returned"
+        return "sql", items, "ok"
+    except Exception as exc:
+        return "error", FALLBACK_CUSTOMERS, str(exc)
+
+def changed_customers(cursor, columns, watermark, statement):
+    with tracer.span("sql.execute", statement=statement):
+        cursor.execute(CHANGED_CUSTOMERS_SQL.format(columns=columns), watermark)
+        bound = int(cursor.fetchone()[0])
+        cursor.nextset()
+    rows = []
+    with tracer.span("sql.fetch") as span:
+        batch = cursor.fetchmany(SQL_FETCH_BATCH)
+        while batch:
+            rows.extend(batch)
+            batch = cursor.fetchmany(SQL_FETCH_BATCH)
+        span["attrs"]["rows"] = len(rows)
+    return rows, bound - 1
+
+def shared_customers():
+    try:
+        source, items, detail = single_flight.do("customers", fetch_customers)
+    except TimeoutError as exc:
+        source, items, detail = "timeout", FALLBACK_CUSTOMERS, str(exc)
+    if source == "sql":
+        snapshot.save("customers", items)
+    elif source in DEGRADED_SOURCES:
+        saved = snapshot.get("customers")
+        if saved:
+            return "snapshot", saved["payload"], f"{detail} (last good data from {saved['age_s']}s ago)"
+    return source, items, detail
+
+def wants_columnar():
+    return request.accept_mimetypes.best_match(["application/json", COLUMNAR_MEDIA_TYPE]) == COLUMNAR_MEDIA_TYPE
+
+def customers_response(payload, items):
+    if not wants_columnar():
+        return jsonify(dict(payload, items=items))
+    columns = [[item.get(field) for item in items] for field in CUSTOMER_FIELDS]
+    return app.response_class(
+        json.dumps(dict(payload, fields=CUSTOMER_FIELDS, columns=columns), separators=(",", ":")),
+        mimetype=COLUMNAR_MEDIA_TYPE,
+    )
+
+def shed(route, error="overloaded"):
+    response = jsonify({"error": error, "route": route})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(admission.retry_after)
+    return response
+
+@app.before_request
+def admit():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if route in STREAM_ROUTES:
+        return
+    if not admission.acquire(route):
+        return shed(route)
+    g.admission = (route, time.perf_counter())
+
+@app.after_request
+def compress(response):
+    if response.direct_passthrough or not response.is_json:
+        return response
+    response.vary.update(("Accept", "Accept-Encoding"))
+    if "Content-Encoding" in response.headers or request.accept_encodings["gzip"] <= 0:
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@app.teardown_request
+def release(exc):
+    admitted = g.pop("admission", None)
+    if admitted:
+        route, start = admitted
+        admission.release(route, (time.perf_counter() - start) * 1000)
+
+@app.get("/health")
+def health():
+    return "ok", 200
+
+@app.get("/ready")
+def ready():
+    saturated = admission.saturated()
+    return jsonify({"status": "busy" if saturated else "ready", "saturated": saturated}), 503 if saturated else 200
+
+@app.get("/status")
+def status():
+    db_status, db_detail = check_db()
+    return jsonify(
+        {
+            "service": "app-tier",
+            "status": "ok",
+            "db_status": db_status,
+            "db_detail": db_detail,
+            "dns": sql_endpoint.status() if sql_endpoint else None,
+            "single_flight": single_flight.status(),
+            "admission": admission.status(),
+            "changes": change_feed.status(),
+            "snapshot": snapshot.status(),
+            "search": customer_search.status(),
+        }
+    )
+
+@app.get("/customers")
+def customers():
+    source, items, detail = shared_customers()
+    return customers_response({"source": source, "detail": detail}, items)
+
+@app.get("/changes")
+def changes():
+    if not db_configured() or pyodbc is None:
+        return shed("/changes", "database not configured")
+    change_feed.start()
+    since = request.args.get("since", type=int)
+    wait = request.args.get("wait", 0.0, type=float)
+    wait = min(max(wait, 0.0), CHANGES_MAX_WAIT_S) if math.isfinite(wait) else 0.0
+    result = change_feed.wait(since, wait)
+    if result == "busy":
+        return shed("/changes")
+    if result is None:
+        return shed("/changes", change_feed.error or "change feed not ready")
+    return jsonify(result)
+
+@app.get("/customers/search")
+def search_customers():
+    if not db_configured() or pyodbc is None:
+        return shed("/customers/search", "database not configured")
+    customer_search.start()
+    limit = min(max(request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    start = time.perf_counter()
+    result = customer_search.search(request.args.get("q", ""), request.args.get("segment") or None, limit)
+    if result is None:
+        return shed("/customers/search", customer_search.error or "search index not ready")
+    matches, items = result
+    return customers_response({"matches": matches, "took_us": round((time.perf_counter() - start) * 1e6, 1)}, items)
+
+if __name__ == "__main__":
+    if db_configured() and pyodbc is not None:
+        customer_search.start()
+    app.run(host="0.0.0.0", port=int(os.environ.get("APP_PORT", "8080")))
@@ -0,0 +1,106 @@
+import bisect
+from array import array
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+PREFIX_END = "\U0010ffff"
+
+
+class CustomerIndex:
+    def __init__(self):
+        self.slots = {}
+        self.ids = array("q")
+        self.names = []
+        self.segment_codes = array("I")
+        self.updated = array("d")
+        self.segments = []
+        self.segment_lookup = {}
+        self.order = array("q")
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sort_key(self, slot):
+        return self.names[slot].casefold(), self.ids[slot]
+
+    def segment_code(self, segment):
+        code = self.segment_lookup.get(segment)
+        if code is None:
+            code = len(self.segments)
+            self.segments.append(segment)
+            self.segment_lookup[segment] = code
+            self.postings[code] = array("q")
+        return code
+
+    def store(self, row):
+        customer_id, name, segment, last_update = row
+        code = self.segment_code(segment)
+        seconds = (last_update - EPOCH).total_seconds() if last_update else float("nan")
+        slot = self.slots.get(customer_id)
+        if slot is None:
+            slot = len(self.ids)
+            self.slots[customer_id] = slot
+            self.ids.append(customer_id)
+            self.names.append(name)
+            self.segment_codes.append(code)
+            self.updated.append(seconds)
+        else:
+            self.names[slot] = name
+            self.segment_codes[slot] = code
+            self.updated[slot] = seconds
+        return slot
+
+    def load(self, rows):
+        for row in rows:
+            self.store(row)
+        self.order = array("q", sorted(range(len(self.ids)), key=self.sort_key))
+        self.postings = {code: array("q") for code in range(len(self.segments))}
+        for slot in self.order:
+            self.postings[self.segment_codes[slot]].append(slot)
+
+    def unlink(self, slot):
+        key = self.sort_key(slot)
+        del self.order[bisect.bisect_left(self.order, key, key=self.sort_key)]
+        posting = self.postings[self.segment_codes[slot]]
+        del posting[bisect.bisect_left(posting, key, key=self.sort_key)]
+
+    def link(self, slot):
+        key = self.sort_key(slot)
+        self.order.insert(bisect.bisect_left(self.order, key, key=self.sort_key), slot)
+        posting = self.postings[self.segment_codes[slot]]
+        posting.insert(bisect.bisect_left(posting, key, key=self.sort_key), slot)
+
+    def apply(self, rows):
+        for row in rows:
+            slot = self.slots.get(row[0])
+            if slot is not None:
+                self.unlink(slot)
+            self.link(self.store(row))
+
+    def rows(self):
+        for slot, customer_id in enumerate(self.ids):
+            seconds = self.updated[slot]
+            last_update = EPOCH + timedelta(seconds=seconds) if seconds == seconds else None
+            yield customer_id, self.names[slot], self.segments[self.segment_codes[slot]], last_update
+
+    def item(self, slot):
+        seconds = self.updated[slot]
+        return {
+            "id": self.ids[slot],
+            "name": self.names[slot],
+            "segment": self.segments[self.segment_codes[slot]],
+            "last_update": (EPOCH + timedelta(seconds=seconds)).isoformat() if seconds == seconds else None,
+        }
+
+    def search(self, prefix, segment=None, limit=20):
+        if segment is None:
+            entries = self.order
+        elif segment in self.segment_lookup:
+            entries = self.postings[self.segment_lookup[segment]]
+        else:
+            return 0, []
+        folded = prefix.casefold()
+        start = bisect.bisect_left(entries, (folded,), key=self.sort_key) if folded else 0
+        end = bisect.bisect_left(entries, (folded + PREFIX_END,), key=self.sort_key) if folded else len(entries)
+        return end - start, [self.item(slot) for slot in entries[start:min(end, start + limit)]]
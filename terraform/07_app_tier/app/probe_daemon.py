@@ -0,0 +1,227 @@
+import collections
+import importlib
+import ipaddress
+import os
+import random
+import socket
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+SQL_DRIVER = os.environ.get("SQL_DRIVER", "pyodbc")
+
+try:
+    pyodbc = importlib.import_module(SQL_DRIVER)
+except Exception as exc:
+    pyodbc = None
+    PYODBC_ERROR = str(exc)
+else:
+    PYODBC_ERROR = ""
+
+SQL_SERVER = os.environ.get("SQL_SERVER_FQDN")
+SQL_DATABASE = os.environ.get("SQL_DATABASE_NAME")
+SQL_USER = os.environ.get("SQL_ADMIN_LOGIN")
+SQL_PASSWORD = os.environ.get("SQL_ADMIN_PASSWORD")
+SQL_PORT = 1433
+
+APP_URL = f"http://127.0.0.1:{os.environ.get('APP_PORT', '8080')}/health"
+WEB_URL = os.environ.get("PROBE_WEB_URL", "").rstrip("/")
+TARGET_FILE = os.environ.get("PROBE_TARGET_FILE", "/etc/appservice/probe-target")
+
+
+def env_float(name, fallback):
+    try:
+        return float(os.environ.get(name, fallback))
+    except ValueError:
+        return fallback
+
+
+INTERVAL_S = env_float("PROBE_INTERVAL_SECONDS", 30.0)
+JITTER_S = env_float("PROBE_JITTER_SECONDS", 5.0)
+TIMEOUT_S = env_float("PROBE_TIMEOUT_SECONDS", 5.0)
+FLUSH_S = env_float("PROBE_FLUSH_SECONDS", 60.0)
+BATCH_SIZE = int(env_float("PROBE_BATCH_SIZE", 100))
+BUFFER_SIZE = int(env_float("PROBE_BUFFER_SIZE", 5000))
+
+SCHEMA_SQL = """
+IF OBJECT_ID('dbo.NetworkChecks','U') IS NULL
+CREATE TABLE dbo.NetworkChecks (
+    check_id INT IDENTITY(1,1) PRIMARY KEY,
+    component VARCHAR(50) NOT NULL,
+    status VARCHAR(12) NOT NULL,
+    checked_at DATETIME2 NOT NULL,
+    latency_ms FLOAT NULL
+);
+IF COL_LENGTH('dbo.NetworkChecks', 'latency_ms') IS NULL
+ALTER TABLE dbo.NetworkChecks ADD latency_ms FLOAT NULL;
+"""
+
+INSERT_SQL = "INSERT INTO dbo.NetworkChecks (component, status, checked_at, latency_ms) VALUES (?, ?, ?, ?)"
+
+
+class ProbeFailed(Exception):
+    pass
+
+
+def db_configured():
+    return all([SQL_SERVER, SQL_DATABASE, SQL_USER, SQL_PASSWORD])
+
+
+def connection_string():
+    return (
+        "Driver={ODBC Driver 18 for SQL Server};"
+        f"Server={SQL_SERVER};"
+        f"Database={SQL_DATABASE};"
+        f"UID={SQL_USER};"
+        f"PWD={SQL_PASSWORD};"
+        "Encrypt=yes;TrustServerCertificate=no;Connection Timeout=5;"
+    )
+
+
+def connect():
+    if not db_configured():
+        raise ProbeFailed("missing SQL settings")
+    if pyodbc is None:
+        raise ProbeFailed(PYODBC_ERROR)
+    return pyodbc.connect(connection_string(), timeout=int(TIMEOUT_S))
+
+
+def probe_http(url):
+    with urllib.request.urlopen(url, timeout=TIMEOUT_S) as resp:
+        resp.read()
+        if resp.status != 200:
+            raise ProbeFailed(f"{url} -> HTTP {resp.status}")
+
+
+def probe_db():
+    with connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def probe_private_endpoint():
+    with socket.create_connection((SQL_SERVER, SQL_PORT), timeout=TIMEOUT_S):
+        pass
+
+
+def probe_dns_zone():
+    addresses = {info[4][0] for info in socket.getaddrinfo(SQL_SERVER, SQL_PORT, proto=socket.IPPROTO_TCP)}
+    if not addresses:
+        raise ProbeFailed(f"{SQL_SERVER} did not resolve")
+    public = [address for address in addresses if not ipaddress.ip_address(address).is_private]
+    if public:
+        raise ProbeFailed(f"{SQL_SERVER} resolved to public address {public[0]}")
+
+
+def read_web_url():
+    try:
+        with open(TARGET_FILE, encoding="utf-8") as handle:
+            return handle.read().strip().rstrip("/") or WEB_URL
+    except OSError:
+        return WEB_URL
+
+
+def build_probes(web_url):
+    probes = [("app-tier", lambda: probe_http(APP_URL))]
+    if web_url:
+        probes.insert(0, ("web-tier", lambda: probe_http(f"{web_url}/health")))
+    if SQL_SERVER:
+        probes += [
+            ("db-tier", probe_db),
+            ("private-endpoint", probe_private_endpoint),
+            ("dns-zone", probe_dns_zone),
+        ]
+    return probes
+
+
+def run_probe(name, func):
+    checked_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = time.perf_counter()
+    try:
+        func()
+        status = "OK"
+    except Exception as exc:
+        status = "FAIL"
+        print(f"probe {name} failed: {exc}", flush=True)
+    return (name, status, checked_at, round((time.perf_counter() - start) * 1000, 2))
+
+
+class ResultBuffer:
+    def __init__(self, size):
+        self.items = collections.deque(maxlen=size)
+        self.dropped = 0
+
+    def add(self, rows):
+        self.dropped += max(len(self.items) + len(rows) - self.items.maxlen, 0)
+        self.items.extend(rows)
+
+    def take(self, count):
+        return [self.items.popleft() for _ in range(min(count, len(self.items)))]
+
+    def restore(self, rows):
+        room = self.items.maxlen - len(self.items)
+        if room < len(rows):
+            self.dropped += len(rows) - room
+            rows = rows[len(rows) - room:]
+        self.items.extendleft(reversed(rows))
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Writer:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.schema_ready = False
+
+    def flush(self):
+        if not len(self.buffer):
+            return 0
+        written = 0
+        try:
+            with connect() as conn:
+                cursor = conn.cursor()
+                if not self.schema_ready:
+                    cursor.execute(SCHEMA_SQL)
+                    conn.commit()
+                    self.schema_ready = True
+                cursor.fast_executemany = True
+                while True:
+                    rows = self.buffer.take(BATCH_SIZE)
+                    if not rows:
+                        break
+                    try:
+                        cursor.executemany(INSERT_SQL, rows)
+                        conn.commit()
+                    except Exception:
+                        self.buffer.restore(rows)
+                        raise
+                    written += len(rows)
+        except Exception as exc:
+            print(f"flush failed ({len(self.buffer)} buffered, {self.buffer.dropped} dropped): {exc}", flush=True)
+        return written
+
+
+def main():
+    buffer = ResultBuffer(BUFFER_SIZE)
+    writer = Writer(buffer)
+    announced = None
+    next_flush = time.monotonic() + FLUSH_S
+    while True:
+        cycle_start = time.monotonic()
+        web_url = read_web_url()
+        probes = build_probes(web_url)
+        if web_url != announced:
+            print(f"probing {', '.join(name for name, _ in probes)} every {INTERVAL_S:.0f}s", flush=True)
+            announced = web_url
+        buffer.add([run_probe(name, func) for name, func in probes])
+        if len(buffer) >= BATCH_SIZE or time.monotonic() >= next_flush:
+            writer.flush()
+            next_flush = time.monotonic() + FLUSH_S
+        delay = INTERVAL_S + random.uniform(-JITTER_S, JITTER_S) - (time.monotonic() - cycle_start)
+        time.sleep(max(delay, 1.0))
+
+
+if __name__ == "__main__":
+    main()
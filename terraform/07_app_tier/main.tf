@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the app tier."
+  default     = null
 }
 
 variable "location" {
@@ -31,6 +32,7 @@ variable "location" {
 variable "subnet_id" {
   type        = string
   description = "Subnet ID for the app tier."
+  default     = null
 }
 
 variable "app_port" {
@@ -45,6 +47,56 @@ variable "probe_path" {
   default     = "/health"
 }
 
+variable "lb_probe_interval_in_seconds" {
+  type        = number
+  description = "Seconds between health probes. Lower values detect failed instances sooner."
+  default     = 15
+
+  validation {
+    condition     = var.lb_probe_interval_in_seconds >= 5
+    error_message = "lb_probe_interval_in_seconds must be at least 5."
+  }
+}
+
+variable "lb_probe_threshold" {
+  type        = number
+  description = "Consecutive failed probes before an instance is taken out of rotation."
+  default     = 1
+
+  validation {
+    condition     = var.lb_probe_threshold >= 1 && var.lb_probe_threshold <= 100
+    error_message = "lb_probe_threshold must be between 1 and 100."
+  }
+}
+
+variable "lb_idle_timeout_in_minutes" {
+  type        = number
+  description = "TCP idle timeout for the load balancing rule."
+  default     = 4
+
+  validation {
+    condition     = var.lb_idle_timeout_in_minutes >= 4 && var.lb_idle_timeout_in_minutes <= 30
+    error_message = "lb_idle_timeout_in_minutes must be between 4 and 30."
+  }
+}
+
+variable "lb_enable_tcp_reset" {
+  type        = bool
+  description = "Send TCP resets to both ends when an idle connection times out (Standard SKU only)."
+  default     = false
+}
+
+variable "lb_load_distribution" {
+  type        = string
+  description = "Session affinity mode: Default (5-tuple), SourceIP (2-tuple) or SourceIPProtocol (3-tuple)."
+  default     = "Default"
+
+  validation {
+    condition     = contains(["Default", "SourceIP", "SourceIPProtocol"], var.lb_load_distribution)
+    error_message = "lb_load_distribution must be Default, SourceIP or SourceIPProtocol."
+  }
+}
+
 variable "lb_name" {
   type        = string
   description = "Explicit internal load balancer name. When null, a random suffix is added to the prefix."
@@ -124,6 +176,85 @@ variable "sql_admin_password" {
   default     = null
 }
 
+variable "trace_exporter" {
+  type        = string
+  description = "Span exporter for the app service (none, jsonl, stdout, or module:factory)."
+  default     = "jsonl"
+}
+
+variable "trace_sample_rate" {
+  type        = number
+  description = "Fraction of new traces sampled by the app service (0-1)."
+  default     = 0.1
+}
+
+variable "probe_interval_seconds" {
+  type        = number
+  description = "Seconds between monitoring probe rounds (jittered by up to 5 seconds)."
+  default     = 30
+}
+
+variable "dns_cache_ttl_seconds" {
+  type        = number
+  description = "Seconds the app service reuses its resolution of the SQL private endpoint name before resolving again. A failed connection always re-resolves."
+  default     = 30
+}
+
+variable "single_flight_max_wait_seconds" {
+  type        = number
+  description = "Seconds a request waits for an identical upstream call already in flight before giving up with the fallback data."
+  default     = 5
+
+  validation {
+    condition     = var.single_flight_max_wait_seconds > 0 && var.single_flight_max_wait_seconds <= 60
+    error_message = "single_flight_max_wait_seconds must be greater than 0 and at most 60."
+  }
+}
+
+variable "admission_max_concurrency" {
+  type        = number
+  description = "Upper bound of concurrent requests admitted per route. The live limit adapts below it from observed latency; excess requests get a 503 with Retry-After."
+  default     = 32
+
+  validation {
+    condition     = var.admission_max_concurrency >= 1 && var.admission_max_concurrency <= 1000
+    error_message = "admission_max_concurrency must be between 1 and 1000."
+  }
+}
+
+variable "admission_target_latency_ms" {
+  type        = number
+  description = "Smoothed per-route latency above which the admission limit shrinks."
+  default     = 1000
+
+  validation {
+    condition     = var.admission_target_latency_ms >= 10 && var.admission_target_latency_ms <= 60000
+    error_message = "admission_target_latency_ms must be between 10 and 60000."
+  }
+}
+
+variable "changes_poll_interval_seconds" {
+  type        = number
+  description = "Seconds between the app service's row_version polls that feed the /changes endpoint."
+  default     = 2
+
+  validation {
+    condition     = var.changes_poll_interval_seconds >= 1 && var.changes_poll_interval_seconds <= 300
+    error_message = "changes_poll_interval_seconds must be between 1 and 300."
+  }
+}
+
+variable "search_refresh_seconds" {
+  type        = number
+  description = "Seconds between the app service's incremental row_version refreshes of its in-memory customer search index."
+  default     = 5
+
+  validation {
+    condition     = var.search_refresh_seconds >= 1 && var.search_refresh_seconds <= 3600
+    error_message = "search_refresh_seconds must be between 1 and 3600."
+  }
+}
+
 variable "tags" {
   type        = map(string)
   description = "Tags applied to the app tier resources."
@@ -134,6 +265,105 @@ variable "tags" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+variable "accelerated_networking_enabled" {
+  type        = bool
+  description = "Enable accelerated networking on the NIC. The VM size must support it."
+  default     = false
+}
+
+variable "zone" {
+  type        = string
+  description = "Availability zone (1, 2 or 3) for the app VM. Null lets Azure place it."
+  default     = null
+
+  validation {
+    condition     = var.zone == null ? true : contains(["1", "2", "3"], var.zone)
+    error_message = "zone must be 1, 2, 3 or null."
+  }
+}
+
+variable "proximity_placement_group_enabled" {
+  type        = bool
+  description = "Create a proximity placement group for the app VM. The web tier can join it through remote state."
+  default     = false
+}
+
+variable "proximity_placement_group_name_prefix" {
+  type        = string
+  description = "Prefix used to build the proximity placement group name."
+  default     = "ppg-vnet"
+}
+
+variable "subnet_key" {
+  type        = string
+  description = "Key in the subnet stack's subnet_ids_by_key output used when subnet_id is not set."
+  default     = "app"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  subnet_id           = var.subnet_id != null ? var.subnet_id : try(data.terraform_remote_state.subnets.outputs.subnet_ids_by_key[var.subnet_key], null)
+  sql_server_fqdn     = var.sql_server_fqdn != null ? var.sql_server_fqdn : try(data.terraform_remote_state.sql.outputs.sql_server_fqdn, "")
+  sql_database_name   = var.sql_database_name != null ? var.sql_database_name : try(data.terraform_remote_state.sql.outputs.sql_database_name, "")
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "subnets" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/03_subnets/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/03_subnets/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.subnet_id != null || can(self.outputs.subnet_ids_by_key[var.subnet_key])
+      error_message = "Subnet ID for subnet_key not found: apply 03_subnets first or set subnet_id."
+    }
+  }
+}
+
+data "terraform_remote_state" "sql" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/05_private_sql/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/05_private_sql/terraform.tfstate.d"
+  }
+}
+
 resource "random_pet" "app" {
   length    = 2
   separator = "-"
@@ -153,13 +383,13 @@ locals {
 resource "azurerm_lb" "internal" {
   name                = local.lb_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   sku                 = var.lb_sku
   tags                = var.tags
 
   frontend_ip_configuration {
     name                          = local.frontend_name
-    subnet_id                     = var.subnet_id
+    subnet_id                     = local.subnet_id
     private_ip_address_allocation = "Dynamic"
   }
 }
@@ -170,11 +400,13 @@ resource "azurerm_lb_backend_address_pool" "main" {
 }
 
 resource "azurerm_lb_probe" "main" {
-  name            = local.probe_name
-  loadbalancer_id = azurerm_lb.internal.id
-  protocol        = "Http"
-  port            = var.app_port
-  request_path    = var.probe_path
+  name                = local.probe_name
+  loadbalancer_id     = azurerm_lb.internal.id
+  protocol            = "Http"
+  port                = var.app_port
+  request_path        = var.probe_path
+  interval_in_seconds = var.lb_probe_interval_in_seconds
+  probe_threshold     = var.lb_probe_threshold
 }
 
 resource "azurerm_lb_rule" "main" {
@@ -186,17 +418,37 @@ resource "azurerm_lb_rule" "main" {
   frontend_ip_configuration_name = local.frontend_name
   backend_address_pool_ids       = [azurerm_lb_backend_address_pool.main.id]
   probe_id                       = azurerm_lb_probe.main.id
+  idle_timeout_in_minutes        = var.lb_idle_timeout_in_minutes
+  enable_tcp_reset               = var.lb_enable_tcp_reset
+  load_distribution              = var.lb_load_distribution
+
+  lifecycle {
+    precondition {
+      condition     = !var.lb_enable_tcp_reset || var.lb_sku == "Standard"
+      error_message = "lb_enable_tcp_reset needs lb_sku = \"Standard\": Basic load balancers do not support TCP reset on idle."
+    }
+  }
+}
+
+resource "azurerm_proximity_placement_group" "main" {
+  count               = var.proximity_placement_group_enabled ? 1 : 0
+  name                = "${var.proximity_placement_group_name_prefix}-${random_pet.app.id}"
+  location            = var.location
+  resource_group_name = local.resource_group_name
+  tags                = var.tags
 }
 
 resource "azurerm_network_interface" "main" {
   name                = local.nic_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   tags                = var.tags
 
+  enable_accelerated_networking = var.accelerated_networking_enabled
+
   ip_configuration {
     name                          = "ipconfig1"
-    subnet_id                     = var.subnet_id
+    subnet_id                     = local.subnet_id
     private_ip_address_allocation = "Dynamic"
   }
 }
@@ -209,7 +461,7 @@ resource "azurerm_network_interface_backend_address_pool_association" "main" {
 
 resource "azurerm_linux_virtual_machine" "main" {
   name                            = local.vm_name
-  resource_group_name             = var.resource_group_name
+  resource_group_name             = local.resource_group_name
   location                        = var.location
   size                            = var.vm_size
   admin_username                  = var.admin_username
@@ -217,12 +469,28 @@ resource "azurerm_linux_virtual_machine" "main" {
   disable_password_authentication = false
   network_interface_ids           = [azurerm_network_interface.main.id]
   computer_name                   = local.computer_name
+  zone                            = var.zone
+  proximity_placement_group_id    = try(azurerm_proximity_placement_group.main[0].id, null)
   custom_data = base64encode(templatefile("${path.module}/cloud-init.yaml.tftpl", {
-    app_port           = var.app_port
-    sql_server_fqdn    = var.sql_server_fqdn != null ? var.sql_server_fqdn : ""
-    sql_database_name  = var.sql_database_name != null ? var.sql_database_name : ""
-    sql_admin_login    = var.sql_admin_login != null ? var.sql_admin_login : ""
-    sql_admin_password = var.sql_admin_password != null ? var.sql_admin_password : ""
+    app_port                    = var.app_port
+    sql_server_fqdn             = local.sql_server_fqdn
+    sql_database_name           = local.sql_database_name
+    sql_admin_login             = var.sql_admin_login != null ? var.sql_admin_login : ""
+    sql_admin_password          = var.sql_admin_password != null ? var.sql_admin_password : ""
+    trace_exporter              = var.trace_exporter
+    trace_sample_rate           = var.trace_sample_rate
+    probe_interval              = var.probe_interval_seconds
+    dns_cache_ttl               = var.dns_cache_ttl_seconds
+    single_flight_max_wait      = var.single_flight_max_wait_seconds
+    admission_max_concurrency   = var.admission_max_concurrency
+    admission_target_latency_ms = var.admission_target_latency_ms
+    changes_poll_interval       = var.changes_poll_interval_seconds
+    search_refresh              = var.search_refresh_seconds
+    app_py                      = base64gzip(file("${path.module}/app/app.py"))
+    tracing_py                  = base64gzip(file("${path.module}/../shared/app/tracing.py"))
+    resilience_py               = base64gzip(file("${path.module}/../shared/app/resilience.py"))
+    customer_index_py           = base64gzip(file("${path.module}/app/customer_index.py"))
+    probe_daemon_py             = base64gzip(file("${path.module}/app/probe_daemon.py"))
   }))
   tags                            = var.tags
 
@@ -25,3 +25,11 @@ output "app_vm_name" {
 output "app_private_ip" {
   value = azurerm_network_interface.main.private_ip_address
 }
+
+output "app_vm_zone" {
+  value = azurerm_linux_virtual_machine.main.zone
+}
+
+output "proximity_placement_group_id" {
+  value = try(azurerm_proximity_placement_group.main[0].id, null)
+}
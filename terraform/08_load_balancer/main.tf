@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the load balancer."
+  default     = null
 }
 
 variable "location" {
@@ -82,6 +83,84 @@ variable "probe_path" {
   default     = "/health"
 }
 
+variable "lb_probe_interval_in_seconds" {
+  type        = number
+  description = "Seconds between health probes. Lower values detect failed instances sooner."
+  default     = 15
+
+  validation {
+    condition     = var.lb_probe_interval_in_seconds >= 5
+    error_message = "lb_probe_interval_in_seconds must be at least 5."
+  }
+}
+
+variable "lb_probe_threshold" {
+  type        = number
+  description = "Consecutive failed probes before an instance is taken out of rotation."
+  default     = 1
+
+  validation {
+    condition     = var.lb_probe_threshold >= 1 && var.lb_probe_threshold <= 100
+    error_message = "lb_probe_threshold must be between 1 and 100."
+  }
+}
+
+variable "lb_idle_timeout_in_minutes" {
+  type        = number
+  description = "TCP idle timeout for the load balancing rule."
+  default     = 4
+
+  validation {
+    condition     = var.lb_idle_timeout_in_minutes >= 4 && var.lb_idle_timeout_in_minutes <= 30
+    error_message = "lb_idle_timeout_in_minutes must be between 4 and 30."
+  }
+}
+
+variable "lb_enable_tcp_reset" {
+  type        = bool
+  description = "Send TCP resets to both ends when an idle connection times out (Standard SKU only)."
+  default     = false
+}
+
+variable "lb_load_distribution" {
+  type        = string
+  description = "Session affinity mode: Default (5-tuple), SourceIP (2-tuple) or SourceIPProtocol (3-tuple)."
+  default     = "Default"
+
+  validation {
+    condition     = contains(["Default", "SourceIP", "SourceIPProtocol"], var.lb_load_distribution)
+    error_message = "lb_load_distribution must be Default, SourceIP or SourceIPProtocol."
+  }
+}
+
+variable "outbound_rule_enabled" {
+  type        = bool
+  description = "Create an explicit outbound rule for the backend pool and disable implicit SNAT on the load balancing rule. A NAT gateway on the backend subnet still takes precedence."
+  default     = false
+}
+
+variable "outbound_ports_per_instance" {
+  type        = number
+  description = "SNAT ports allocated to each backend instance by the outbound rule (multiple of 8)."
+  default     = 1024
+
+  validation {
+    condition     = var.outbound_ports_per_instance >= 0 && var.outbound_ports_per_instance <= 64000 && var.outbound_ports_per_instance % 8 == 0
+    error_message = "outbound_ports_per_instance must be a multiple of 8 between 0 and 64000."
+  }
+}
+
+variable "outbound_idle_timeout_in_minutes" {
+  type        = number
+  description = "TCP idle timeout for the outbound rule."
+  default     = 4
+
+  validation {
+    condition     = var.outbound_idle_timeout_in_minutes >= 4 && var.outbound_idle_timeout_in_minutes <= 120
+    error_message = "outbound_idle_timeout_in_minutes must be between 4 and 120."
+  }
+}
+
 variable "tags" {
   type        = map(string)
   description = "Tags applied to the load balancer resources."
@@ -92,6 +171,40 @@ variable "tags" {
   }
 }
 
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
 resource "random_pet" "lb" {
   length    = 2
   separator = "-"
@@ -109,7 +222,7 @@ locals {
 resource "azurerm_public_ip" "main" {
   name                = local.public_ip_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   allocation_method   = "Static"
   sku                 = var.public_ip_sku
   tags                = var.tags
@@ -118,7 +231,7 @@ resource "azurerm_public_ip" "main" {
 resource "azurerm_lb" "main" {
   name                = local.lb_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   sku                 = var.lb_sku
   tags                = var.tags
 
@@ -134,11 +247,13 @@ resource "azurerm_lb_backend_address_pool" "main" {
 }
 
 resource "azurerm_lb_probe" "main" {
-  name            = local.probe_name
-  loadbalancer_id = azurerm_lb.main.id
-  protocol        = "Http"
-  port            = var.backend_port
-  request_path    = var.probe_path
+  name                = local.probe_name
+  loadbalancer_id     = azurerm_lb.main.id
+  protocol            = "Http"
+  port                = var.backend_port
+  request_path        = var.probe_path
+  interval_in_seconds = var.lb_probe_interval_in_seconds
+  probe_threshold     = var.lb_probe_threshold
 }
 
 resource "azurerm_lb_rule" "main" {
@@ -150,4 +265,37 @@ resource "azurerm_lb_rule" "main" {
   frontend_ip_configuration_name = local.frontend_name
   backend_address_pool_ids       = [azurerm_lb_backend_address_pool.main.id]
   probe_id                       = azurerm_lb_probe.main.id
+  idle_timeout_in_minutes        = var.lb_idle_timeout_in_minutes
+  enable_tcp_reset               = var.lb_enable_tcp_reset
+  load_distribution              = var.lb_load_distribution
+  disable_outbound_snat          = var.outbound_rule_enabled
+
+  lifecycle {
+    precondition {
+      condition     = !var.lb_enable_tcp_reset || var.lb_sku == "Standard"
+      error_message = "lb_enable_tcp_reset needs lb_sku = \"Standard\": Basic load balancers do not support TCP reset on idle."
+    }
+  }
+}
+
+resource "azurerm_lb_outbound_rule" "main" {
+  count                    = var.outbound_rule_enabled ? 1 : 0
+  name                     = "outbound-${random_pet.lb.id}"
+  loadbalancer_id          = azurerm_lb.main.id
+  protocol                 = "All"
+  backend_address_pool_id  = azurerm_lb_backend_address_pool.main.id
+  allocated_outbound_ports = var.outbound_ports_per_instance
+  idle_timeout_in_minutes  = var.outbound_idle_timeout_in_minutes
+  enable_tcp_reset         = var.lb_enable_tcp_reset
+
+  frontend_ip_configuration {
+    name = local.frontend_name
+  }
+
+  lifecycle {
+    precondition {
+      condition     = var.lb_sku == "Standard"
+      error_message = "outbound_rule_enabled needs lb_sku = \"Standard\": Basic load balancers do not support outbound rules."
+    }
+  }
 }
@@ -0,0 +1,572 @@
+from flask import Flask, Response, g, jsonify, request
+import html
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+import zlib
+
+import tracing
+from resilience import AdmissionControl, SingleFlight, Snapshot
+
+app = Flask(__name__)
+tracer = tracing.tracer_from_env("simpleapp")
+tracing.init_app(app, tracer)
+APP_TIER_URL = os.environ.get("APP_TIER_URL", "").rstrip("/")
+APP_TIER_ACCEPT = "application/vnd.customers.columnar+json, application/json;q=0.9"
+APP_TIER_READ_CHUNK = 65536
+SINGLE_FLIGHT_MAX_WAIT_S = float(os.environ.get("SINGLE_FLIGHT_MAX_WAIT_SECONDS", "5"))
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_TARGET_LATENCY_MS = float(os.environ.get("ADMISSION_TARGET_LATENCY_MS", "1000"))
+ADMISSION_PROBE_CONCURRENCY = int(os.environ.get("ADMISSION_PROBE_CONCURRENCY", "4"))
+ADMISSION_RETRY_AFTER_S = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+PROBE_ROUTES = {"/health", "/ready"}
+STREAM_ROUTES = {"/events"}
+EVENTS_POLL_INTERVAL_S = float(os.environ.get("EVENTS_POLL_INTERVAL_SECONDS", "5"))
+EVENTS_MAX_CLIENTS = int(os.environ.get("EVENTS_MAX_CLIENTS", "100"))
+EVENTS_QUEUE_SIZE = 16
+EVENTS_KEEPALIVE_S = 15
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", "/var/lib/simpleapp/snapshot.json")
+DEGRADED_SOURCES = {"unreachable", "timeout", "error", "fallback"}
+
+CUSTOMERS_FALLBACK = [
+    {"id": 1, "name": "Ada Lovelace", "segment": "Analytics"},
+    {"id": 2, "name": "Alan Turing", "segment": "Engineering"},
+    {"id": 3, "name": "Katherine Johnson", "segment": "Operations"},
+]
+
+class Broadcaster:
+    def __init__(self, interval, max_clients):
+        self.interval = interval
+        self.max_clients = max_clients
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.latest = {}
+        self.event_id = 0
+        self.thread = None
+        self.polls = 0
+        self.dropped = 0
+        self.error = ""
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="events-poller", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.publish("status", shared_app_status())
+                self.publish("customers", shared_app_customers())
+                self.error = ""
+            except Exception as exc:
+                self.error = str(exc)
+            with self.lock:
+                self.polls += 1
+            time.sleep(self.interval)
+
+    def publish(self, kind, payload):
+        data = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        with self.lock:
+            current = self.latest.get(kind)
+            if current and current["data"] == data:
+                return
+            self.event_id += 1
+            self.latest[kind] = {"id": self.event_id, "data": data, "payload": payload}
+            message = f"id: {self.event_id}\nevent: {kind}\ndata: {data}\n\n"
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(message)
+                except queue.Full:
+                    self.subscribers.discard(subscriber)
+                    self.dropped += 1
+
+    def snapshot(self, kind):
+        with self.lock:
+            current = self.latest.get(kind)
+            return current["payload"] if current else None
+
+    def subscribe(self):
+        self.start()
+        with self.lock:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+            subscriber = queue.Queue(maxsize=EVENTS_QUEUE_SIZE)
+            for kind, current in sorted(self.latest.items(), key=lambda item: item[1]["id"]):
+                subscriber.put_nowait(f"id: {current['id']}\nevent: {kind}\ndata: {current['data']}\n\n")
+            self.subscribers.add(subscriber)
+            return subscriber
+
+    def stream(self, subscriber):
+        try:
+            yield f"retry: {int(self.interval * 1000)}\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=EVENTS_KEEPALIVE_S)
+                except queue.Empty:
+                    message = ": keepalive\n\n"
+                with self.lock:
+                    if subscriber not in self.subscribers:
+                        return
+                yield message
+        finally:
+            with self.lock:
+                self.subscribers.discard(subscriber)
+
+    def status(self):
+        with self.lock:
+            return {
+                "poll_interval_s": self.interval,
+                "clients": len(self.subscribers),
+                "max_clients": self.max_clients,
+                "polls": self.polls,
+                "events": self.event_id,
+                "dropped_clients": self.dropped,
+                "error": self.error,
+            }
+
+single_flight = SingleFlight(SINGLE_FLIGHT_MAX_WAIT_S, tracer)
+admission = AdmissionControl(
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_TARGET_LATENCY_MS,
+    ADMISSION_PROBE_CONCURRENCY,
+    ADMISSION_RETRY_AFTER_S,
+    PROBE_ROUTES,
+)
+events = Broadcaster(EVENTS_POLL_INTERVAL_S, EVENTS_MAX_CLIENTS)
+snapshot = Snapshot(SNAPSHOT_FILE)
+
+def app_tier_get(path):
+    with tracer.span("http.get", url=f"{APP_TIER_URL}{path}") as span:
+        headers = {"traceparent": tracer.traceparent(), "Accept": APP_TIER_ACCEPT, "Accept-Encoding": "gzip"}
+        request = urllib.request.Request(f"{APP_TIER_URL}{path}", headers=headers)
+        with urllib.request.urlopen(request, timeout=3) as resp:
+            span["attrs"]["http_status"] = resp.status
+            gzipped = resp.headers.get("Content-Encoding") == "gzip"
+            inflater = zlib.decompressobj(wbits=31) if gzipped else None
+            body = bytearray()
+            wire_bytes = 0
+            while chunk := resp.read(APP_TIER_READ_CHUNK):
+                wire_bytes += len(chunk)
+                body += inflater.decompress(chunk) if inflater else chunk
+            if inflater:
+                body += inflater.flush()
+            span["attrs"]["wire_bytes"] = wire_bytes
+            span["attrs"]["body_bytes"] = len(body)
+            data = json.loads(body)
+    if isinstance(data, dict) and "columns" in data:
+        fields = data.pop("fields")
+        data["items"] = [dict(zip(fields, values)) for values in zip(*data.pop("columns"))]
+    return data
+
+def fetch_app_status():
+    if not APP_TIER_URL:
+        return {
+            "status": "not-configured",
+            "detail": "APP_TIER_URL not set",
+            "db_status": "not-configured",
+            "db_detail": "APP_TIER_URL not set",
+        }
+    try:
+        data = app_tier_get("/status")
+        return {
+            "status": data.get("status", "ok"),
+            "detail": "reachable",
+            "db_status": data.get("db_status", "unknown"),
+            "db_detail": data.get("db_detail", ""),
+        }
+    except Exception as exc:
+        return {
+            "status": "unreachable",
+            "detail": str(exc),
+            "db_status": "unknown",
+            "db_detail": "",
+        }
+
+def fetch_app_customers():
+    if not APP_TIER_URL:
+        return {"source": "not-configured", "items": CUSTOMERS_FALLBACK, "detail": "APP_TIER_URL not set"}
+    try:
+        data = app_tier_get("/customers")
+        if isinstance(data, list):
+            return {"source": "sql", "items": data, "detail": "legacy"}
+        items = data.get("items") or []
+        source = data.get("source", "unknown")
+        detail = data.get("detail", "")
+        if not items:
+            items = CUSTOMERS_FALLBACK
+        return {"source": source, "items": items, "detail": detail}
+    except Exception as exc:
+        return {"source": "unreachable", "items": CUSTOMERS_FALLBACK, "detail": str(exc)}
+
+def shared_app_status():
+    try:
+        return single_flight.do("status", fetch_app_status)
+    except TimeoutError as exc:
+        return {"status": "timeout", "detail": str(exc), "db_status": "unknown", "db_detail": ""}
+
+def shared_app_customers():
+    try:
+        payload = single_flight.do("customers", fetch_app_customers)
+    except TimeoutError as exc:
+        payload = {"source": "timeout", "items": CUSTOMERS_FALLBACK, "detail": str(exc)}
+    if payload["source"] == "sql":
+        snapshot.save("customers", payload["items"])
+    elif payload["source"] in DEGRADED_SOURCES:
+        return degraded_customers(payload) or payload
+    return payload
+
+def degraded_customers(payload):
+    saved = snapshot.get("customers")
+    if not saved:
+        return None
+    detail = f"{payload['detail']} (last good data from {saved['age_s']}s ago)"
+    return {"source": "snapshot", "items": saved["payload"], "detail": detail}
+
+def render_customer_row(customer):
+    name = html.escape(str(customer.get("name", "")))
+    cust_id = html.escape(str(customer.get("id", "")))
+    segment = customer.get("segment")
+    segment_html = ""
+    if segment:
+        segment_html = f" <span class='muted'>- {html.escape(str(segment))}</span>"
+    return f"<li data-key='{cust_id}'><strong>{name}</strong> <span class='muted'>(id {cust_id})</span>{segment_html}</li>"
+
+LIVE_SCRIPT = """<script>
+  const pillClass = (status) => status === "ok" ? "ok" : status === "not-configured" ? "warn" : "down";
+  const label = (value) => String(value || "unknown").replace(/-/g, " ").toUpperCase();
+  const setText = (id, text) => {
+    const node = document.getElementById(id);
+    if (node.textContent !== text) node.textContent = text;
+  };
+  const customerRow = (customer) => {
+    const row = document.createElement("li");
+    row.dataset.key = String(customer.id);
+    row.dataset.sig = JSON.stringify(customer);
+    const name = document.createElement("strong");
+    name.textContent = customer.name || "";
+    const id = document.createElement("span");
+    id.className = "muted";
+    id.textContent = `(id ${customer.id})`;
+    row.append(name, " ", id);
+    if (customer.segment) {
+      const segment = document.createElement("span");
+      segment.className = "muted";
+      segment.textContent = `- ${customer.segment}`;
+      row.append(" ", segment);
+    }
+    return row;
+  };
+  const renderCustomers = (items) => {
+    const list = document.getElementById("customers");
+    const existing = new Map(Array.from(list.children, (row) => [row.dataset.key, row]));
+    items.forEach((customer, index) => {
+      const key = String(customer.id);
+      let row = existing.get(key);
+      if (!row || row.dataset.sig !== JSON.stringify(customer)) {
+        const fresh = customerRow(customer);
+        if (row) row.replaceWith(fresh);
+        row = fresh;
+      }
+      existing.delete(key);
+      if (list.children[index] !== row) list.insertBefore(row, list.children[index] || null);
+    });
+    existing.forEach((row) => row.remove());
+  };
+  const events = new EventSource("/events");
+  events.addEventListener("status", (event) => {
+    const data = JSON.parse(event.data);
+    const pill = document.getElementById("app-pill");
+    pill.className = `pill ${pillClass(data.status)}`;
+    setText("app-pill", `app tier: ${label(data.status)}`);
+    setText("app-detail", `App status: ${data.detail || ""}`);
+    setText("db-status", `DB status: ${data.db_status || "unknown"} - ${data.db_detail || ""}`);
+  });
+  events.addEventListener("customers", (event) => {
+    const data = JSON.parse(event.data);
+    renderCustomers(data.items || []);
+    setText("data-source", `Data source: ${label(data.source)} - ${data.detail || ""}`);
+  });
+  events.onopen = () => setText("live", "live");
+  events.onerror = () => setText("live", "reconnecting");
+</script>"""
+
+def render_index():
+    with tracer.span("render_index"):
+        return render_index_html()
+
+def render_index_html():
+    app_status = events.snapshot("status") or shared_app_status()
+    status = app_status.get("status", "unknown")
+    detail = app_status.get("detail", "")
+    db_status = app_status.get("db_status", "unknown")
+    db_detail = app_status.get("db_detail", "")
+    pill_class = "ok" if status == "ok" else "warn" if status == "not-configured" else "down"
+    status_label = status.replace("-", " ").upper()
+    customers_payload = events.snapshot("customers") or shared_app_customers()
+    data_source = customers_payload.get("source", "unknown")
+    data_detail = customers_payload.get("detail", "")
+    rows = "\n".join(
+        render_customer_row(customer)
+        for customer in customers_payload.get("items", [])
+    )
+    app_url = APP_TIER_URL if APP_TIER_URL else "not configured"
+    app_url = html.escape(app_url)
+    detail = html.escape(detail)
+    db_detail = html.escape(str(db_detail))
+    data_detail = html.escape(str(data_detail))
+    data_source_label = html.escape(data_source.replace("-", " ").upper())
+    db_status = html.escape(str(db_status))
+    return f"""<!doctype html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <meta name="viewport" content="width=device-width, initial-scale=1" />
+  <title>VNet Demo</title>
+  <style>
+    @import url("https://fonts.googleapis.com/css2?family=DM+Serif+Display&family=Space+Grotesk:wght@400;500;600&display=swap");
+    :root {{
+      --bg: #0b1016;
+      --ink: #f5f3f0;
+      --muted: #97a3b6;
+      --accent: #4fd1c5;
+      --accent-2: #f0b86b;
+      --panel: rgba(18, 26, 36, 0.82);
+      --panel-border: #1f2a38;
+      --ok: #60d394;
+      --warn: #f0b86b;
+      --down: #ff6b6b;
+    }}
+    * {{
+      box-sizing: border-box;
+    }}
+    body {{
+      margin: 0;
+      font-family: "Space Grotesk", "Segoe UI", "Helvetica", sans-serif;
+      background:
+        radial-gradient(1100px circle at 10% 10%, rgba(79, 209, 197, 0.18), transparent 50%),
+        radial-gradient(900px circle at 92% 18%, rgba(240, 184, 107, 0.14), transparent 45%),
+        linear-gradient(160deg, #0b1016 0%, #0d141d 45%, #0a0f15 100%);
+      color: var(--ink);
+      min-height: 100vh;
+      position: relative;
+    }}
+    body::before {{
+      content: "";
+      position: fixed;
+      inset: 0;
+      background-image:
+        linear-gradient(rgba(255, 255, 255, 0.04) 1px, transparent 1px),
+        linear-gradient(90deg, rgba(255, 255, 255, 0.04) 1px, transparent 1px);
+      background-size: 48px 48px;
+      opacity: 0.25;
+      pointer-events: none;
+    }}
+    .wrap {{
+      max-width: 1040px;
+      margin: 0 auto;
+      padding: 40px 24px 64px;
+      position: relative;
+      z-index: 1;
+    }}
+    .hero {{
+      display: flex;
+      flex-wrap: wrap;
+      align-items: center;
+      justify-content: space-between;
+      gap: 20px;
+      animation: fadeIn 0.7s ease both;
+    }}
+    .hero h1 {{
+      font-family: "DM Serif Display", "Times New Roman", serif;
+      font-size: 46px;
+      margin: 0 0 10px;
+      letter-spacing: 0.01em;
+    }}
+    .tagline {{
+      margin: 0;
+      color: var(--muted);
+      max-width: 520px;
+      font-size: 16px;
+    }}
+    .pill {{
+      padding: 10px 16px;
+      border-radius: 999px;
+      font-size: 13px;
+      text-transform: uppercase;
+      letter-spacing: 0.1em;
+      background: rgba(10, 15, 22, 0.8);
+      border: 1px solid var(--panel-border);
+      box-shadow: 0 6px 18px rgba(0, 0, 0, 0.35);
+    }}
+    .pill.ok {{ color: var(--ok); }}
+    .pill.warn {{ color: var(--warn); }}
+    .pill.down {{ color: var(--down); }}
+    .grid {{
+      display: grid;
+      grid-template-columns: repeat(auto-fit, minmax(260px, 1fr));
+      gap: 20px;
+      margin-top: 28px;
+    }}
+    .card {{
+      background: var(--panel);
+      border: 1px solid var(--panel-border);
+      border-radius: 18px;
+      padding: 20px;
+      box-shadow: 0 18px 34px rgba(4, 8, 14, 0.55);
+      backdrop-filter: blur(10px);
+      animation: rise 0.7s ease both;
+    }}
+    .card h2 {{
+      margin: 0 0 12px;
+      font-size: 20px;
+      letter-spacing: 0.02em;
+    }}
+    .muted {{
+      color: var(--muted);
+      font-size: 14px;
+    }}
+    ul {{
+      margin: 0;
+      padding-left: 18px;
+    }}
+    a {{
+      color: var(--accent);
+      text-decoration: none;
+    }}
+    a:hover {{
+      text-decoration: underline;
+    }}
+    .meta {{
+      margin-top: 10px;
+      font-size: 13px;
+      color: var(--muted);
+    }}
+    .footer {{
+      margin-top: 28px;
+      color: var(--muted);
+      font-size: 13px;
+    }}
+    .card:nth-child(1) {{ animation-delay: 0.15s; }}
+    .card:nth-child(2) {{ animation-delay: 0.25s; }}
+    @keyframes fadeIn {{
+      from {{ opacity: 0; transform: translateY(10px); }}
+      to {{ opacity: 1; transform: translateY(0); }}
+    }}
+    @keyframes rise {{
+      from {{ opacity: 0; transform: translateY(16px); }}
+      to {{ opacity: 1; transform: translateY(0); }}
+    }}
+    @media (max-width: 720px) {{
+      .hero h1 {{ font-size: 36px; }}
+      .pill {{ align-self: flex-start; }}
+    }}
+  </style>
+</head>
+<body>
+  <div class="wrap">
+    <section class="hero">
+      <div>
+        <h1>VNet Demo</h1>
+        <p class="tagline">Public web tier fronting a private app tier inside the VNet.</p>
+      </div>
+      <div id="app-pill" class="pill {pill_class}">app tier: {status_label}</div>
+    </section>
+    <section class="grid">
+      <div class="card">
+        <h2>Customers</h2>
+        <ul id="customers">
+          {rows}
+        </ul>
+        <p id="data-source" class="meta">Data source: {data_source_label} - {data_detail}</p>
+      </div>
+      <div class="card">
+        <h2>Live Endpoints</h2>
+        <ul>
+          <li><a href="/health">/health</a></li>
+          <li><a href="/customers">/customers</a></li>
+          <li><a href="/app-status">/app-status</a></li>
+          <li><a href="/events">/events</a></li>
+        </ul>
+        <p class="muted">App tier URL (private): {app_url}</p>
+        <p id="app-detail" class="muted">App status: {detail}</p>
+        <p id="db-status" class="muted">DB status: {db_status} - {db_detail}</p>
+        <p class="meta">App tier is only reachable inside the VNet.</p>
+      </div>
+    </section>
+    <div class="footer">Azure VNets & Subnets demo - Web VM - <span id="live">static</span></div>
+  </div>
+  {LIVE_SCRIPT}
+</body>
+</html>"""
+
+def shed(route):
+    response = jsonify({"error": "overloaded", "route": route})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(admission.retry_after)
+    return response
+
+@app.before_request
+def admit():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if route in STREAM_ROUTES:
+        return
+    if not admission.acquire(route):
+        return shed(route)
+    g.admission = (route, time.perf_counter())
+
+@app.teardown_request
+def release(exc):
+    admitted = g.pop("admission", None)
+    if admitted:
+        route, start = admitted
+        admission.release(route, (time.perf_counter() - start) * 1000)
+
+@app.get("/")
+def index():
+    return Response(render_index(), mimetype="text/html")
+
+@app.get("/app-status")
+def app_status():
+    return jsonify(
+        dict(
+            shared_app_status(),
+            single_flight=single_flight.status(),
+            admission=admission.status(),
+            events=events.status(),
+            snapshot=snapshot.status(),
+        )
+    )
+
+@app.get("/health")
+def health():
+    return "ok", 200
+
+@app.get("/ready")
+def ready():
+    saturated = admission.saturated()
+    return jsonify({"status": "busy" if saturated else "ready", "saturated": saturated}), 503 if saturated else 200
+
+@app.get("/events")
+def event_stream():
+    subscriber = events.subscribe()
+    if subscriber is None:
+        return shed("/events")
+    return Response(
+        events.stream(subscriber),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/customers")
+def customers():
+    return jsonify(shared_app_customers().get("items", CUSTOMERS_FALLBACK))
+
+if __name__ == "__main__":
+    if snapshot.get("customers"):
+        events.publish("customers", degraded_customers({"detail": "warm start"}))
+    events.start()
+    app.run(host="0.0.0.0", port=int(os.environ.get("WEB_PORT", "80")))
@@ -20,6 +20,7 @@ provider "azurerm" {
 variable "resource_group_name" {
   type        = string
   description = "Resource group name for the VM."
+  default     = null
 }
 
 variable "location" {
@@ -31,11 +32,13 @@ variable "location" {
 variable "subnet_id" {
   type        = string
   description = "Subnet ID for the web VM."
+  default     = null
 }
 
 variable "lb_backend_pool_id" {
   type        = string
   description = "Load balancer backend pool ID."
+  default     = null
 }
 
 variable "vm_name" {
@@ -90,6 +93,191 @@ variable "app_tier_url" {
   default     = null
 }
 
+variable "trace_exporter" {
+  type        = string
+  description = "Span exporter for the web app (none, jsonl, stdout, or module:factory)."
+  default     = "jsonl"
+}
+
+variable "trace_sample_rate" {
+  type        = number
+  description = "Fraction of new traces sampled by the web app (0-1)."
+  default     = 0.1
+}
+
+variable "single_flight_max_wait_seconds" {
+  type        = number
+  description = "Seconds a request waits for an identical upstream call already in flight before giving up with the fallback data."
+  default     = 5
+
+  validation {
+    condition     = var.single_flight_max_wait_seconds > 0 && var.single_flight_max_wait_seconds <= 60
+    error_message = "single_flight_max_wait_seconds must be greater than 0 and at most 60."
+  }
+}
+
+variable "admission_max_concurrency" {
+  type        = number
+  description = "Upper bound of concurrent requests admitted per route. The live limit adapts below it from observed latency; excess requests get a 503 with Retry-After."
+  default     = 32
+
+  validation {
+    condition     = var.admission_max_concurrency >= 1 && var.admission_max_concurrency <= 1000
+    error_message = "admission_max_concurrency must be between 1 and 1000."
+  }
+}
+
+variable "admission_target_latency_ms" {
+  type        = number
+  description = "Smoothed per-route latency above which the admission limit shrinks."
+  default     = 1000
+
+  validation {
+    condition     = var.admission_target_latency_ms >= 10 && var.admission_target_latency_ms <= 60000
+    error_message = "admission_target_latency_ms must be between 10 and 60000."
+  }
+}
+
+variable "events_poll_interval_seconds" {
+  type        = number
+  description = "Seconds between the web instance's app-tier polls that feed the /events stream."
+  default     = 5
+
+  validation {
+    condition     = var.events_poll_interval_seconds >= 1 && var.events_poll_interval_seconds <= 300
+    error_message = "events_poll_interval_seconds must be between 1 and 300."
+  }
+}
+
+variable "events_max_clients" {
+  type        = number
+  description = "Maximum concurrent /events subscribers per web instance; further clients get a 503 with Retry-After."
+  default     = 100
+
+  validation {
+    condition     = var.events_max_clients >= 1 && var.events_max_clients <= 10000
+    error_message = "events_max_clients must be between 1 and 10000."
+  }
+}
+
+variable "remote_state_root" {
+  type        = string
+  description = "Directory holding the upstream stack directories whose local state is read. Defaults to the parent of this stack."
+  default     = null
+}
+
+variable "remote_state_workspace" {
+  type        = string
+  description = "Workspace of the upstream stacks' local state."
+  default     = "default"
+}
+
+variable "accelerated_networking_enabled" {
+  type        = bool
+  description = "Enable accelerated networking on the NIC. The VM size must support it."
+  default     = false
+}
+
+variable "zone" {
+  type        = string
+  description = "Availability zone (1, 2 or 3) for the web VM. Null follows the app tier VM's zone, or lets Azure place it."
+  default     = null
+
+  validation {
+    condition     = var.zone == null ? true : contains(["1", "2", "3"], var.zone)
+    error_message = "zone must be 1, 2, 3 or null."
+  }
+}
+
+variable "proximity_placement_group_id" {
+  type        = string
+  description = "Explicit proximity placement group ID for the web VM."
+  default     = null
+}
+
+variable "join_app_proximity_placement_group" {
+  type        = bool
+  description = "Place the web VM in the app tier's proximity placement group when proximity_placement_group_id is not set."
+  default     = false
+}
+
+variable "subnet_key" {
+  type        = string
+  description = "Key in the subnet stack's subnet_ids_by_key output used when subnet_id is not set."
+  default     = "web"
+}
+
+locals {
+  remote_state_root   = var.remote_state_root != null ? var.remote_state_root : abspath("${path.module}/..")
+  resource_group_name = var.resource_group_name != null ? var.resource_group_name : try(data.terraform_remote_state.resource_group.outputs.resource_group_name, null)
+  subnet_id           = var.subnet_id != null ? var.subnet_id : try(data.terraform_remote_state.subnets.outputs.subnet_ids_by_key[var.subnet_key], null)
+  lb_backend_pool_id  = var.lb_backend_pool_id != null ? var.lb_backend_pool_id : try(data.terraform_remote_state.load_balancer.outputs.lb_backend_pool_id, null)
+  app_tier_url        = var.app_tier_url != null ? var.app_tier_url : try("http://${data.terraform_remote_state.app_tier.outputs.app_lb_private_ip}:8080", "")
+  zone                = var.zone != null ? var.zone : try(data.terraform_remote_state.app_tier.outputs.app_vm_zone, null)
+  ppg_id              = var.proximity_placement_group_id != null ? var.proximity_placement_group_id : var.join_app_proximity_placement_group ? try(data.terraform_remote_state.app_tier.outputs.proximity_placement_group_id, null) : null
+}
+
+data "terraform_remote_state" "resource_group" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/01_resource_group/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/01_resource_group/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.resource_group_name != null || can(self.outputs.resource_group_name)
+      error_message = "Resource group name not found: apply 01_resource_group first or set resource_group_name."
+    }
+  }
+}
+
+data "terraform_remote_state" "subnets" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/03_subnets/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/03_subnets/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.subnet_id != null || can(self.outputs.subnet_ids_by_key[var.subnet_key])
+      error_message = "Subnet ID for subnet_key not found: apply 03_subnets first or set subnet_id."
+    }
+  }
+}
+
+data "terraform_remote_state" "load_balancer" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/08_load_balancer/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/08_load_balancer/terraform.tfstate.d"
+  }
+
+  lifecycle {
+    postcondition {
+      condition     = var.lb_backend_pool_id != null || can(self.outputs.lb_backend_pool_id)
+      error_message = "Load balancer backend pool ID not found: apply 08_load_balancer first or set lb_backend_pool_id."
+    }
+  }
+}
+
+data "terraform_remote_state" "app_tier" {
+  backend   = "local"
+  workspace = var.remote_state_workspace
+
+  config = {
+    path          = "${local.remote_state_root}/07_app_tier/terraform.tfstate"
+    workspace_dir = "${local.remote_state_root}/07_app_tier/terraform.tfstate.d"
+  }
+}
+
 resource "random_pet" "vm" {
   length    = 2
   separator = "-"
@@ -104,12 +292,14 @@ locals {
 resource "azurerm_network_interface" "main" {
   name                = local.nic_name
   location            = var.location
-  resource_group_name = var.resource_group_name
+  resource_group_name = local.resource_group_name
   tags                = var.tags
 
+  enable_accelerated_networking = var.accelerated_networking_enabled
+
   ip_configuration {
     name                          = "ipconfig1"
-    subnet_id                     = var.subnet_id
+    subnet_id                     = local.subnet_id
     private_ip_address_allocation = "Dynamic"
   }
 }
@@ -117,12 +307,12 @@ resource "azurerm_network_interface" "main" {
 resource "azurerm_network_interface_backend_address_pool_association" "main" {
   network_interface_id    = azurerm_network_interface.main.id
   ip_configuration_name   = "ipconfig1"
-  backend_address_pool_id = var.lb_backend_pool_id
+  backend_address_pool_id = local.lb_backend_pool_id
 }
 
 resource "azurerm_linux_virtual_machine" "main" {
   name                            = local.vm_name
-  resource_group_name             = var.resource_group_name
+  resource_group_name             = local.resource_group_name
   location                        = var.location
   size                            = var.vm_size
   admin_username                  = var.admin_username
@@ -130,8 +320,20 @@ resource "azurerm_linux_virtual_machine" "main" {
   disable_password_authentication = false
   network_interface_ids           = [azurerm_network_interface.main.id]
   computer_name                   = local.computer_name
+  zone                            = local.zone
+  proximity_placement_group_id    = local.ppg_id
   custom_data = base64encode(templatefile("${path.module}/cloud-init.yaml", {
-    app_tier_url = var.app_tier_url != null ? var.app_tier_url : ""
+    app_tier_url                = local.app_tier_url
+    trace_exporter              = var.trace_exporter
+    trace_sample_rate           = var.trace_sample_rate
+    single_flight_max_wait      = var.single_flight_max_wait_seconds
+    admission_max_concurrency   = var.admission_max_concurrency
+    admission_target_latency_ms = var.admission_target_latency_ms
+    events_poll_interval        = var.events_poll_interval_seconds
+    events_max_clients          = var.events_max_clients
+    app_py                      = base64gzip(file("${path.module}/app/app.py"))
+    tracing_py                  = base64gzip(file("${path.module}/../shared/app/tracing.py"))
+    resilience_py               = base64gzip(file("${path.module}/../shared/app/resilience.py"))
   }))
   tags                            = var.tags
 
@@ -0,0 +1,214 @@
+import json
+import mmap
+import os
+import threading
+import time
+
+
+class SingleFlight:
+    def __init__(self, max_wait, tracer):
+        self.max_wait = max_wait
+        self.tracer = tracer
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.max_waiters = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None, "waiters": 0}
+                self.calls[key] = call
+                self.leaders += 1
+            else:
+                call["waiters"] += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, call["waiters"])
+        with self.tracer.span("singleflight", key=key, role="leader" if leader else "follower"):
+            if leader:
+                try:
+                    call["result"] = fn()
+                except Exception as exc:
+                    call["error"] = exc
+                    with self.lock:
+                        self.errors += 1
+                finally:
+                    with self.lock:
+                        del self.calls[key]
+                    call["done"].set()
+            elif not call["done"].wait(self.max_wait):
+                with self.lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"no shared result for {key} after {self.max_wait:g}s")
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    def status(self):
+        with self.lock:
+            return {
+                "max_wait_s": self.max_wait,
+                "in_flight": sorted(self.calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "max_waiters": self.max_waiters,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+            }
+
+
+class AdmissionControl:
+    def __init__(self, max_limit, target_ms, probe_limit, retry_after, probe_routes):
+        self.max_limit = max_limit
+        self.target_ms = target_ms
+        self.probe_limit = probe_limit
+        self.retry_after = retry_after
+        self.probe_routes = probe_routes
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def route(self, name):
+        state = self.routes.get(name)
+        if state is None:
+            probe = name in self.probe_routes
+            state = {
+                "probe": probe,
+                "limit": float(self.probe_limit if probe else self.max_limit),
+                "in_flight": 0,
+                "admitted": 0,
+                "shed": 0,
+                "latency_ms": None,
+            }
+            self.routes[name] = state
+        return state
+
+    def acquire(self, name):
+        with self.lock:
+            state = self.route(name)
+            if state["in_flight"] >= int(state["limit"]):
+                state["shed"] += 1
+                return False
+            state["in_flight"] += 1
+            state["admitted"] += 1
+            return True
+
+    def release(self, name, elapsed_ms):
+        with self.lock:
+            state = self.routes[name]
+            state["in_flight"] -= 1
+            previous = state["latency_ms"]
+            state["latency_ms"] = elapsed_ms if previous is None else previous * 0.8 + elapsed_ms * 0.2
+            if state["probe"]:
+                return
+            if state["latency_ms"] > self.target_ms:
+                state["limit"] = max(1.0, state["limit"] * 0.9)
+            else:
+                state["limit"] = min(float(self.max_limit), state["limit"] + 1 / state["limit"])
+
+    def saturated(self):
+        with self.lock:
+            return [
+                name
+                for name, state in self.routes.items()
+                if not state["probe"] and state["in_flight"] >= int(state["limit"])
+            ]
+
+    def status(self):
+        with self.lock:
+            return {
+                "max_concurrency": self.max_limit,
+                "target_latency_ms": self.target_ms,
+                "probe_concurrency": self.probe_limit,
+                "routes": {
+                    name: {
+                        "limit": int(state["limit"]),
+                        "in_flight": state["in_flight"],
+                        "admitted": state["admitted"],
+                        "shed": state["shed"],
+                        "latency_ms": round(state["latency_ms"], 1) if state["latency_ms"] is not None else None,
+                    }
+                    for name, state in sorted(self.routes.items())
+                },
+            }
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.entries = {}
+        self.encoded = {}
+        self.pending = {}
+        self.writes = 0
+        self.error = ""
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as handle:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    entries = json.loads(view[:])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            self.error = f"load: {exc}"
+            return
+        self.entries = {kind: entry for kind, entry in entries.items() if isinstance(entry, dict) and "payload" in entry}
+
+    def save(self, kind, payload):
+        if not self.path:
+            return
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        with self.lock:
+            if kind not in self.pending and self.encoded.get(kind) == encoded:
+                self.entries[kind]["saved_at"] = time.time()
+                return
+            self.entries[kind] = {"saved_at": time.time(), "payload": payload}
+            self.pending[kind] = encoded
+        with self.write_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                pending, self.pending = self.pending, {}
+                entries = {name: dict(entry) for name, entry in self.entries.items()}
+            temp_path = f"{self.path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(temp_path, "w", encoding="utf-8") as handle:
+                    json.dump(entries, handle, separators=(",", ":"))
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as exc:
+                with self.lock:
+                    for name, value in pending.items():
+                        self.pending.setdefault(name, value)
+                    self.error = f"save: {exc}"
+                return
+            with self.lock:
+                self.encoded.update(pending)
+                self.writes += 1
+                self.error = ""
+
+    def get(self, kind):
+        with self.lock:
+            entry = self.entries.get(kind)
+            if entry is None:
+                return None
+            return {"payload": entry["payload"], "age_s": round(time.time() - entry.get("saved_at", 0), 1)}
+
+    def status(self):
+        with self.lock:
+            return {
+                "path": self.path or None,
+                "writes": self.writes,
+                "error": self.error,
+                "age_s": {kind: round(time.time() - entry.get("saved_at", 0), 1) for kind, entry in sorted(self.entries.items())},
+            }
@@ -0,0 +1,190 @@
+import importlib
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_local = threading.local()
+
+
+class NoopExporter:
+    def export(self, span):
+        pass
+
+
+class StdoutExporter:
+    def export(self, span):
+        print(json.dumps(span, separators=(",", ":")), flush=True)
+
+
+class JsonlExporter:
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, max_queue=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        worker = threading.Thread(target=self._drain, name="trace-exporter", daemon=True)
+        worker.start()
+
+    def export(self, span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = "".join(json.dumps(span, separators=(",", ":")) + "\n" for span in batch)
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as handle:
+                    handle.write(lines)
+            except OSError:
+                self.dropped += len(batch)
+
+
+def load_exporter(name, path):
+    name = (name or "none").strip()
+    if name in ("jsonl", "file"):
+        return JsonlExporter(path)
+    if name == "stdout":
+        return StdoutExporter()
+    if ":" in name:
+        module_name, attr = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), attr)()
+    return NoopExporter()
+
+
+def parse_rate(value, fallback):
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        return fallback
+    return min(max(rate, 0.0), 1.0)
+
+
+class Tracer:
+    def __init__(self, service, exporter, sample_rate):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def _stack(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = []
+            _local.stack = stack
+        return stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def begin(self, name, traceparent=None, **attrs):
+        parent = self.current()
+        if parent is not None:
+            trace_id, parent_id, sampled = parent["trace_id"], parent["span_id"], parent["sampled"]
+        else:
+            match = TRACEPARENT_RE.match((traceparent or "").strip().lower())
+            if match and match.group(1) != "0" * 32:
+                trace_id, parent_id = match.group(1), match.group(2)
+                sampled = bool(int(match.group(3), 16) & 1)
+            else:
+                trace_id, parent_id = "%032x" % random.getrandbits(128), None
+                sampled = random.random() < self.sample_rate
+        span = {
+            "trace_id": trace_id,
+            "span_id": "%016x" % random.getrandbits(64),
+            "parent_id": parent_id,
+            "name": name,
+            "service": self.service,
+            "sampled": sampled,
+            "start": time.time(),
+            "_t0": time.perf_counter(),
+            "attrs": attrs,
+        }
+        self._stack().append(span)
+        return span
+
+    def end(self, span, error=None):
+        stack = self._stack()
+        if span in stack:
+            del stack[stack.index(span):]
+        if not span["sampled"]:
+            return
+        record = {key: value for key, value in span.items() if not key.startswith("_") and key != "sampled"}
+        record["duration_ms"] = round((time.perf_counter() - span["_t0"]) * 1000, 3)
+        record["status"] = "error" if error else "ok"
+        if error:
+            record["error"] = str(error) or type(error).__name__
+        self.exporter.export(record)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = self.begin(name, **attrs)
+        error = None
+        try:
+            yield span
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self.end(span, error)
+
+    def traceparent(self):
+        span = self.current()
+        if span is None:
+            return None
+        flags = "01" if span["sampled"] else "00"
+        return f"00-{span['trace_id']}-{span['span_id']}-{flags}"
+
+
+def tracer_from_env(service):
+    exporter = load_exporter(
+        os.environ.get("TRACE_EXPORTER", "jsonl"),
+        os.environ.get("TRACE_FILE", f"/var/log/{service}/traces.jsonl"),
+    )
+    return Tracer(service, exporter, parse_rate(os.environ.get("TRACE_SAMPLE_RATE"), 0.1))
+
+
+def init_app(app, tracer):
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        g.trace_span = tracer.begin(
+            f"{request.method} {request.path}",
+            traceparent=request.headers.get("traceparent"),
+            route=request.path,
+        )
+
+    @app.after_request
+    def _propagate_trace(response):
+        span = getattr(g, "trace_span", None)
+        if span is not None:
+            span["attrs"]["http_status"] = response.status_code
+            response.headers["traceparent"] = tracer.traceparent()
+            response.headers["X-Trace-Id"] = span["trace_id"]
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        span = getattr(g, "trace_span", None)
+        if span is not None:
+            tracer.end(span, exc)
@@ -0,0 +1,29 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import health_check
+
+
+def test_run_checks_returns_at_the_deadline(monkeypatch):
+    monkeypatch.setattr(health_check, "CHECK_GRACE_S", 0.2)
+    release = threading.Event()
+
+    def stuck(outputs, timeout):
+        release.wait(10)
+        return "finished late"
+
+    checks = [("fast", lambda outputs, timeout: "ok"), ("stuck", stuck)]
+    start = time.perf_counter()
+    try:
+        results = health_check.run_checks({}, checks, 0.1)
+    finally:
+        release.set()
+    assert time.perf_counter() - start < 2
+    assert [(result["name"], result["status"], result["detail"]) for result in results] == [
+        ("fast", "ok", "ok"),
+        ("stuck", "failed", "timed out"),
+    ]
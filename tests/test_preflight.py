@@ -0,0 +1,27 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import preflight
+import runner
+
+
+@pytest.fixture
+def no_az(tmp_path, monkeypatch):
+    monkeypatch.setenv("AZ_BIN", str(tmp_path / "missing-az"))
+    monkeypatch.setattr(preflight, "VM_CAPABILITIES", {})
+    monkeypatch.setattr(runner, "TIMING", dict(runner.TIMING, phases=[], commands=[]))
+
+
+def test_optional_capture_returns_none_when_the_cli_is_missing(no_az):
+    assert runner.run_capture_optional([runner.get_az_exe(), "account", "show"]) is None
+
+
+def test_vm_size_check_falls_back_without_az(no_az):
+    values = {"vm_size": "Standard_B2s", "location": "eastus2", "accelerated_networking_enabled": True}
+    assert preflight.vm_capabilities("eastus2", "Standard_B2s") is None
+    assert preflight.check_vm_size(values) == ["vm_size Standard_B2s does not support accelerated networking"]
+    assert preflight.check_vm_size(dict(values, vm_size="Standard_D2s_v5", zone="1")) == []
@@ -0,0 +1,62 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "terraform" / "shared" / "app"))
+
+import resilience
+
+
+def test_snapshot_skips_unchanged_payloads(tmp_path):
+    snapshot = resilience.Snapshot(str(tmp_path / "snapshot.json"))
+    snapshot.save("customers", [{"id": 1}])
+    snapshot.save("customers", [{"id": 1}])
+    assert snapshot.writes == 1
+    assert json.loads((tmp_path / "snapshot.json").read_text())["customers"]["payload"] == [{"id": 1}]
+    assert resilience.Snapshot(str(tmp_path / "snapshot.json")).get("customers")["payload"] == [{"id": 1}]
+
+
+def test_snapshot_retries_a_failed_write(tmp_path, monkeypatch):
+    snapshot = resilience.Snapshot(str(tmp_path / "snapshot.json"))
+    real_replace = resilience.os.replace
+
+    def failing_replace(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(resilience.os, "replace", failing_replace)
+    snapshot.save("customers", [{"id": 1}])
+    assert snapshot.writes == 0
+    assert snapshot.error == "save: disk full"
+    assert snapshot.get("customers")["payload"] == [{"id": 1}]
+
+    monkeypatch.setattr(resilience.os, "replace", real_replace)
+    snapshot.save("customers", [{"id": 1}])
+    assert snapshot.writes == 1
+    assert snapshot.error == ""
+    assert json.loads((tmp_path / "snapshot.json").read_text())["customers"]["payload"] == [{"id": 1}]
+
+
+def test_snapshot_keeps_the_newest_payload_after_a_failed_write(tmp_path, monkeypatch):
+    snapshot = resilience.Snapshot(str(tmp_path / "snapshot.json"))
+    snapshot.save("customers", [{"id": 1}])
+    real_replace = resilience.os.replace
+
+    def failing_replace(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(resilience.os, "replace", failing_replace)
+    snapshot.save("customers", [{"id": 2}])
+    monkeypatch.setattr(resilience.os, "replace", real_replace)
+    snapshot.save("customers", [{"id": 1}])
+    assert snapshot.get("customers")["payload"] == [{"id": 1}]
+    assert snapshot.writes == 2
+
+
+def test_admission_control_keeps_probe_routes_at_their_own_limit():
+    admission = resilience.AdmissionControl(8, 100, 2, 1, {"/health"})
+    assert [admission.acquire("/health") for _ in range(3)] == [True, True, False]
+    admission.release("/health", 5000)
+    assert admission.status()["routes"]["/health"]["limit"] == 2
+    admission.acquire("/customers")
+    admission.release("/customers", 5000)
+    assert admission.status()["routes"]["/customers"]["limit"] == 7
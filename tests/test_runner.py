@@ -0,0 +1,198 @@
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+import runner
+
+THROTTLED = {"exit_code": 1, "stderr": "Error: StatusCode=429 Code=\"TooManyRequests\""}
+RETRYABLE = {"exit_code": 1, "stderr": "Error: RetryableError: the operation can be retried"}
+FATAL = {"exit_code": 1, "stderr": "Error: Unsupported argument \"bogus\""}
+SUCCESS = {"exit_code": 0, "stdout": "applied"}
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    log_path = tmp_path / "calls.jsonl"
+    fixture_path = tmp_path / "fixture.json"
+    monkeypatch.setenv("TERRAFORM_BIN", str(SCRIPTS_DIR / "stub_cli.py"))
+    monkeypatch.setenv("STUB_CLI_FIXTURE", str(fixture_path))
+    monkeypatch.setenv("STUB_CLI_STATE", str(tmp_path / "fixture.state"))
+    monkeypatch.setenv("STUB_CLI_LOG", str(log_path))
+    monkeypatch.setattr(runner, "RETRY", dict(runner.RETRY, attempts=4, budget=6, base_s=0.0, used={}))
+    monkeypatch.setattr(runner, "TIMING", dict(runner.TIMING, phases=[], commands=[]))
+
+    def configure(*commands):
+        fixture = {"commands": [{"match": match, "responses": responses} for match, responses in commands]}
+        fixture_path.write_text(json.dumps(fixture), encoding="utf-8")
+
+    def calls(stack=None):
+        if not log_path.exists():
+            return 0
+        entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+        return sum(1 for entry in entries if stack is None or any(stack in arg for arg in entry["argv"]))
+
+    configure.calls = calls
+    return configure
+
+
+def apply_cmd(stack):
+    return [runner.get_terraform_exe(), f"-chdir=terraform/{stack}", "apply", "-auto-approve"]
+
+
+@pytest.mark.parametrize(
+    "returncode, stderr, expected",
+    [
+        (1, THROTTLED["stderr"], "throttled"),
+        (1, RETRYABLE["stderr"], "retryable"),
+        (1, "Error: ReferencedResourceNotProvisioned: subnet is in Updating state", "provisioning"),
+        (1, "Error: StatusCode=503 ServiceUnavailable", "server"),
+        (1, "read tcp: connection reset by peer", "network"),
+        (1, FATAL["stderr"], None),
+        (130, THROTTLED["stderr"], None),
+        (None, THROTTLED["stderr"], None),
+    ],
+)
+def test_classify_failure(returncode, stderr, expected):
+    assert runner.classify_failure(returncode, stderr) == expected
+
+
+def test_backoff_delay_grows_with_jitter_and_is_capped(monkeypatch):
+    monkeypatch.setattr(runner, "RETRY", dict(runner.RETRY, base_s=2.0, max_s=10.0))
+    for attempt, ceiling in ((1, 2.0), (2, 4.0), (3, 8.0), (4, 10.0), (8, 10.0)):
+        for _ in range(20):
+            assert ceiling / 2 <= runner.backoff_delay(attempt) <= ceiling
+
+
+def test_transient_failures_are_retried_until_success(stub):
+    stub((["apply"], [THROTTLED, RETRYABLE, SUCCESS]))
+    returncode, stdout = runner.timed_call(apply_cmd("06_nat_gateway"), capture=True)
+    assert (returncode, stdout.strip()) == (0, "applied")
+    assert stub.calls() == 3
+    assert runner.RETRY["used"] == {"06_nat_gateway": 2}
+    assert [entry["attempt"] for entry in runner.TIMING["commands"]] == [1, 2, 3]
+    assert [entry.get("failure") for entry in runner.TIMING["commands"]] == ["throttled", "retryable", None]
+
+
+def test_fatal_failure_is_not_retried(stub):
+    stub((["apply"], [FATAL, SUCCESS]))
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        runner.timed_call(apply_cmd("07_app_tier"))
+    assert "Unsupported argument" in excinfo.value.stderr
+    assert stub.calls() == 1
+    assert runner.RETRY["used"] == {}
+
+
+def test_max_attempts_is_enforced(stub):
+    stub((["apply"], [THROTTLED]))
+    runner.configure_retries(attempts=2)
+    with pytest.raises(subprocess.CalledProcessError):
+        runner.timed_call(apply_cmd("06_nat_gateway"))
+    assert stub.calls() == 2
+
+
+def test_single_attempt_disables_retries(stub):
+    stub((["apply"], [THROTTLED, SUCCESS]))
+    runner.configure_retries(attempts=1)
+    with pytest.raises(subprocess.CalledProcessError):
+        runner.timed_call(apply_cmd("06_nat_gateway"))
+    assert stub.calls() == 1
+
+
+def test_retry_budget_is_shared_per_stack(stub):
+    stub((["06_nat_gateway", "apply"], [THROTTLED]), (["08_load_balancer", "apply"], [THROTTLED, SUCCESS]))
+    runner.configure_retries(attempts=10, budget=2)
+    with pytest.raises(subprocess.CalledProcessError):
+        runner.timed_call(apply_cmd("06_nat_gateway"))
+    assert stub.calls("06_nat_gateway") == 3
+    with pytest.raises(subprocess.CalledProcessError):
+        runner.timed_call(apply_cmd("06_nat_gateway"))
+    assert stub.calls("06_nat_gateway") == 4
+    runner.timed_call(apply_cmd("08_load_balancer"))
+    assert stub.calls("08_load_balancer") == 2
+    assert runner.RETRY["used"] == {"06_nat_gateway": 2, "08_load_balancer": 1}
+
+
+def test_retry_budget_holds_under_concurrent_failures(stub):
+    class SlowCounts(dict):
+        def get(self, key, default=None):
+            value = super().get(key, default)
+            time.sleep(0.02)
+            return value
+
+    stub((["apply"], [THROTTLED]))
+    runner.configure_retries(attempts=10, budget=3)
+    runner.RETRY["used"] = SlowCounts()
+
+    def attempt(_):
+        with pytest.raises(subprocess.CalledProcessError):
+            runner.timed_call(apply_cmd("06_nat_gateway"))
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(attempt, range(6)))
+    assert runner.RETRY["used"] == {"06_nat_gateway": 3}
+    assert stub.calls("06_nat_gateway") == 6 + 3
+
+def test_init_runs_one_stack_at_a_time(stub, tmp_path):
+    stub((["init"], [{"exit_code": 0, "delay_s": 0.2}]))
+    stacks = [tmp_path / name for name in ("01_resource_group", "02_vnet", "03_subnets")]
+    with ThreadPoolExecutor(max_workers=len(stacks)) as pool:
+        list(pool.map(lambda tf_dir: runner.init_stack(tf_dir, quiet=True), stacks))
+    intervals = sorted(
+        (entry["start_s"], entry["start_s"] + entry["duration_s"])
+        for entry in runner.TIMING["commands"]
+    )
+    assert len(intervals) == 3
+    assert all(end <= following[0] + 0.01 for (_, end), following in zip(intervals, intervals[1:]))
+
+
+def test_plan_files_are_kept_per_environment(tmp_path, monkeypatch):
+    tf_dir = tmp_path / "06_nat_gateway"
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", None)
+    default = runner.plan_path(tf_dir)
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", "staging")
+    staging = runner.plan_path(tf_dir)
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", "prod")
+    prod = runner.plan_path(tf_dir)
+    assert default == tf_dir / ".terraform" / "deploy.tfplan"
+    assert staging == tf_dir / ".terraform-env" / "staging" / "deploy.tfplan"
+    assert len({default, staging, prod}) == 3
+    assert all(path.is_absolute() for path in (default, staging, prod))
+
+
+def test_default_tfvars_stay_out_of_named_environments(tmp_path, monkeypatch):
+    from deploy import stack_fingerprint
+
+    tf_dir = tmp_path / "terraform" / "01_resource_group"
+    tf_dir.mkdir(parents=True)
+    (tf_dir / "main.tf").write_text("", encoding="utf-8")
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", None)
+    (tf_dir / runner.DEFAULT_TFVARS).write_text('{"location": "eastus2"}', encoding="utf-8")
+    assert runner.var_file_args(tf_dir) == [f"-var-file={(tf_dir / runner.DEFAULT_TFVARS).resolve()}"]
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", "staging")
+    assert runner.var_file_args(tf_dir) == []
+    before = stack_fingerprint(tf_dir)
+    (tf_dir / runner.DEFAULT_TFVARS).write_text('{"location": "westus3"}', encoding="utf-8")
+    assert stack_fingerprint(tf_dir) == before
+    (tf_dir / "main.tf").write_text("# changed", encoding="utf-8")
+    assert stack_fingerprint(tf_dir) != before
+
+
+def test_auto_loaded_tfvars_are_retired(tmp_path, monkeypatch, capsys):
+    import stacks
+
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", "staging")
+    monkeypatch.setattr(stacks, "MODEL", dict(stacks.MODEL, tfvars={}))
+    (tmp_path / runner.AUTO_TFVARS).write_text('{"location": "eastus2"}', encoding="utf-8")
+    assert stacks.load_tfvars(tmp_path) == {}
+    assert not (tmp_path / runner.AUTO_TFVARS).exists()
+    assert (tmp_path / runner.DEFAULT_TFVARS).read_text(encoding="utf-8") == '{"location": "eastus2"}'
+    monkeypatch.setitem(runner.ENVIRONMENT, "name", None)
+    assert stacks.load_tfvars(tmp_path) == {"location": "eastus2"}
@@ -0,0 +1,151 @@
+import json
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+import runner
+
+STACKS = sorted(path for path in (REPO_ROOT / "terraform").glob("0*") if path.is_dir())
+RESOURCE_REF = re.compile(r"(?<![\w.])((?:azurerm|random|terraform)_\w+)\.(\w+)(\[|\.)?")
+DATA_REF = re.compile(r"(?<![\w.])data\.(\w+)\.(\w+)")
+VAR_REF = re.compile(r"(?<![\w.])var\.(\w+)")
+LOCAL_REF = re.compile(r"(?<![\w.])local\.(\w+)")
+FILE_REF = re.compile(r'(?:file|templatefile)\("\$\{path\.module\}/([^"]+)"')
+
+
+def unquote(value):
+    return value.strip('"')
+
+
+def expressions(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key not in ("description", "error_message"):
+                yield from expressions(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from expressions(item)
+    elif isinstance(node, str) and "${" in node:
+        yield node
+
+
+def load_stack(tf_dir):
+    hcl2 = pytest.importorskip("hcl2")
+    blocks = {"variable": [], "locals": [], "resource": [], "data": [], "moved": [], "output": []}
+    for path in sorted(tf_dir.glob("*.tf")):
+        with open(path, encoding="utf-8") as handle:
+            parsed = hcl2.load(handle)
+        for kind in blocks:
+            blocks[kind] += parsed.get(kind, [])
+    return blocks
+
+
+def declared(blocks):
+    variables = {unquote(name) for block in blocks["variable"] for name in block}
+    local_names = {name for block in blocks["locals"] for name in block if name != "__is_block__"}
+    resources = {}
+    for block in blocks["resource"]:
+        for kind, named in block.items():
+            for name, body in named.items():
+                resources[(unquote(kind), unquote(name))] = "count" in body or "for_each" in body
+    data = {(unquote(kind), unquote(name)) for block in blocks["data"] for kind, named in block.items() for name in named}
+    return variables, local_names, resources, data
+
+
+@pytest.mark.parametrize("tf_dir", STACKS, ids=lambda path: path.name)
+def test_stack_references_resolve(tf_dir):
+    blocks = load_stack(tf_dir)
+    variables, local_names, resources, data = declared(blocks)
+    errors = []
+    for expression in expressions({kind: blocks[kind] for kind in ("locals", "resource", "data", "output")}):
+        errors += [f"undeclared var.{name}" for name in VAR_REF.findall(expression) if name not in variables]
+        errors += [f"undefined local.{name}" for name in LOCAL_REF.findall(expression) if name not in local_names]
+        errors += [f"unknown data.{kind}.{name}" for kind, name in DATA_REF.findall(expression) if (kind, name) not in data]
+        for kind, name, follow in RESOURCE_REF.findall(DATA_REF.sub("", expression)):
+            if (kind, name) not in resources:
+                errors.append(f"unknown resource {kind}.{name}")
+            elif resources[(kind, name)] and follow == ".":
+                errors.append(f"{kind}.{name} has count/for_each but is used without an index")
+    assert sorted(set(errors)) == []
+
+
+@pytest.mark.parametrize("tf_dir", STACKS, ids=lambda path: path.name)
+def test_moved_blocks_target_declared_resources(tf_dir):
+    blocks = load_stack(tf_dir)
+    _, _, resources, _ = declared(blocks)
+    for moved in blocks["moved"]:
+        source = re.fullmatch(r"\$\{(\w+)\.(\w+)(\[\d+\])?\}", moved["from"])
+        target = re.fullmatch(r"\$\{(\w+)\.(\w+)(\[\d+\])?\}", moved["to"])
+        assert source and target, moved
+        key = (target.group(1), target.group(2))
+        assert key in resources, f"moved target {moved['to']} is not declared"
+        assert bool(target.group(3)) == resources[key], f"moved target {moved['to']} does not match the resource's count"
+        assert (source.group(1), source.group(2)) == key or (source.group(1), source.group(2)) not in resources
+
+
+@pytest.mark.parametrize("tf_dir", STACKS, ids=lambda path: path.name)
+def test_file_references_exist(tf_dir):
+    missing = []
+    for path in sorted(tf_dir.glob("*.tf")):
+        for relative in FILE_REF.findall(path.read_text(encoding="utf-8")):
+            if not (tf_dir / relative).is_file():
+                missing.append(relative)
+    assert missing == []
+
+
+def terraform_version():
+    exe = shutil.which(runner.get_terraform_exe())
+    if not exe:
+        return None
+    try:
+        output = subprocess.run([exe, "version", "-json"], capture_output=True, text=True, timeout=30).stdout
+        return tuple(int(part) for part in json.loads(output)["terraform_version"].split(".")[:2])
+    except (OSError, ValueError, KeyError, subprocess.TimeoutExpired):
+        return None
+
+
+@pytest.mark.parametrize("tf_dir", STACKS, ids=lambda path: path.name)
+def test_terraform_validate(tf_dir):
+    version = terraform_version()
+    if version is None or version < (1, 5):
+        pytest.skip("terraform >= 1.5 is not available (set TERRAFORM_BIN)")
+    from preflight import validate_stack
+
+    assert validate_stack(tf_dir) == []
+
+
+def test_lb_outbound_rule_replaces_implicit_snat():
+    blocks = load_stack(REPO_ROOT / "terraform" / "08_load_balancer")
+    resources = {
+        (unquote(kind), unquote(name)): body
+        for block in blocks["resource"]
+        for kind, named in block.items()
+        for name, body in named.items()
+    }
+    rule = resources[("azurerm_lb_rule", "main")]
+    outbound = resources[("azurerm_lb_outbound_rule", "main")]
+    assert rule["disable_outbound_snat"] == "${var.outbound_rule_enabled}"
+    assert outbound["count"] == "${var.outbound_rule_enabled ? 1 : 0}"
+    assert outbound["frontend_ip_configuration"][0]["name"] == rule["frontend_ip_configuration_name"]
+    assert [outbound["backend_address_pool_id"]] == rule["backend_address_pool_ids"]
+    conditions = [check["condition"] for check in outbound["lifecycle"][0]["precondition"]]
+    assert '${var.lb_sku == "Standard"}' in conditions
+
+
+@pytest.mark.parametrize("stack", ["07_app_tier", "08_load_balancer"])
+def test_tcp_reset_requires_a_standard_lb(stack):
+    blocks = load_stack(REPO_ROOT / "terraform" / stack)
+    for block in blocks["resource"]:
+        for kind, named in block.items():
+            for name, body in named.items():
+                if body.get("enable_tcp_reset") != "${var.lb_enable_tcp_reset}":
+                    continue
+                conditions = [check["condition"] for lifecycle in body.get("lifecycle", []) for check in lifecycle["precondition"]]
+                assert any('var.lb_sku == "Standard"' in condition for condition in conditions), f"{kind}.{name}"